@@ -24,7 +24,7 @@ if %errorlevel% neq 0 (
 :: Run the main launcher directly
 echo 🚀 Starting PRO YouTube Downloader...
 echo.
-python "Source\launcher.py"
+python "Source\launcher.py" %*
 
 :: If application exits, pause to show any messages
 if %errorlevel% neq 0 (
@@ -17,7 +17,7 @@ fi
 
 echo "🚀 Starting PRO YouTube Downloader..."
 echo ""
-python3 "Source/launcher.py"
+python3 "Source/launcher.py" "$@"
 
 # If application exits, pause to show any messages
 if [ $? -ne 0 ]; then
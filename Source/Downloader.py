@@ -3,11 +3,20 @@ import sys
 import platform
 import threading
 import time
+import copy
+import errno
+import functools
 import json
+import random
+import re
+import argparse
+import socket
+import sqlite3
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from yt_dlp import YoutubeDL
 import shutil
 from pathlib import Path
+from urllib.parse import urlparse
 
 # Cross-platform base directory setup
 BASE_DIR = Path(__file__).parent
@@ -21,10 +30,19 @@ elif sys.platform == 'darwin':  # macOS
 else:  # Linux, Android, iOS, Termux
     DOWNLOAD_DIR = ROOT_DIR / "Downloads"
 
-DOWNLOAD_DIR.mkdir(exist_ok=True)
+# yt-dlp and FFmpeg are only needed once a download starts, so they are
+# imported/discovered lazily to keep the menu fast. Importing yt-dlp and
+# its extractors costs far more than everything else in this module.
 
 # Configuration file path stored inside Source folder
 CONFIG_FILE = BASE_DIR / "downloader_config.json"
+METADATA_CACHE_FILE = BASE_DIR / "metadata_cache.json"
+HISTORY_FILE = BASE_DIR / "download_history.jsonl"
+HISTORY_LOCK_FILE = BASE_DIR / "download_history.lock"
+LEGACY_HISTORY_FILE = BASE_DIR / "download_history.json"
+METRICS_FILE = BASE_DIR / "download_metrics.jsonl"
+ARCHIVE_FILE = BASE_DIR / "download_archive.sqlite3"
+JOBS_FILE = BASE_DIR / "download_jobs.sqlite3"
 
 # FFmpeg setup - using bundled FFmpeg
 def get_ffmpeg_path():
@@ -48,11 +66,17 @@ def get_ffmpeg_path():
         system_ffmpeg = shutil.which('ffmpeg')
         return system_ffmpeg
 
-FFMPEG_LOCATION = get_ffmpeg_path()
+_ffmpeg_location = None
 
-spinner_running = False
-spinner_thread = None
-download_completed_shown = False
+def get_ffmpeg_location():
+    """FFmpeg path for yt-dlp, discovered on first use and then remembered"""
+    global _ffmpeg_location
+    if _ffmpeg_location is None:
+        _ffmpeg_location = get_ffmpeg_path() or ""
+    return _ffmpeg_location
+
+# Serialises console output coming from concurrent download workers
+print_lock = threading.Lock()
 
 # Default configuration
 DEFAULT_CONFIG = {
@@ -61,7 +85,34 @@ DEFAULT_CONFIG = {
     "enable_logging": True,
     "auto_retry": True,
     "max_retries": 3,
+    "retry_backoff": 2,  # seconds before the first retry, doubled each attempt
+    "retry_backoff_max": 60,  # upper bound for a single retry delay
     "quiet_mode": False,
+    "progress_refresh_rate": 4,  # progress redraws per second
+    "enable_metrics": True,  # per-job phase timings in download_metrics.jsonl
+    "prometheus_file": "",  # optional path for Prometheus text-format totals
+    "history_limit": 50,  # entries kept when the history log is compacted
+    "metadata_cache": True,
+    "metadata_cache_ttl": 86400,  # seconds
+    "metadata_cache_size": 500,  # entries
+    "download_archive": True,  # skip videos already downloaded in the same mode
+    "job_store": True,  # keep queued jobs in download_jobs.sqlite3 so they resume after a crash
+    "sync_full_days": 7,  # playlist sync walks the whole playlist at least this often
+    "bandwidth_limit_mbps": 0,  # total download rate for all workers, 0 = unlimited
+    # Time-of-day overrides, e.g. [{"from": "08:00", "to": "18:00", "mbps": 20}]
+    "bandwidth_schedule": [],
+    "download_connections": 4,  # connections per file; 1 disables segmented downloads
+    "stream_mp3": True,  # MP3 mode encodes while downloading instead of converting a saved file
+    # Fast local folder (SSD, tmpfs) for .part files, merging and transcoding; "" = download in place
+    "staging_dir": "",
+    "publish_copies": 2,  # staged files copied to another filesystem at the same time
+    "disk_preflight": True,  # check expected sizes against free space before downloading
+    "disk_reserve_mb": 500,  # free space always left on the staging and download volumes
+    "preallocate": False,  # reserve whole .part files up front (segmented downloads)
+    "chunk_size_mb": 10,  # byte range fetched per connection request
+    "daemon_host": "127.0.0.1",  # daemon.py API address; keep it local
+    "daemon_port": 8770,
+    "daemon_token": "",  # if set, API clients must send "Authorization: Bearer <token>"
 }
 
 def load_config():
@@ -123,8 +174,12 @@ def print_settings_menu():
     print("2. 🔄 Auto-retry Failed Downloads")
     print("3. 📝 Enable/Disable Logging")
     print("4. 🔕 Toggle Quiet Mode")
-    print("5. 🧹 Clear Download History")
-    print("6. ↩️  Back to Main Menu")
+    print("5. ⚡ Max Parallel Downloads")
+    print("6. 🔀 Connections per Download")
+    print("7. 🚦 Bandwidth Limit")
+    print("8. 🧹 Clear Download History")
+    print("9. 🗃️  Clear Metadata Cache")
+    print("10. ↩️  Back to Main Menu")
     print("═" * 55)
 
 def mode_text(mode):
@@ -135,7 +190,70 @@ def mode_text(mode):
     }
     return modes.get(mode, "Unknown")
 
-def log_download(url, filename, mode, status="Success"):
+class HistoryLock:
+    """Advisory lock shared by every downloader process writing the history log"""
+
+    def __enter__(self):
+        self._file = open(HISTORY_LOCK_FILE, 'a+')
+        if os.name == 'nt':
+            import msvcrt
+            self._file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after ~10 seconds; keep waiting
+                    continue
+        else:
+            import fcntl
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+
+# The log is compacted once it holds roughly this many times history_limit entries
+HISTORY_COMPACT_FACTOR = 2
+
+def _migrate_legacy_history():
+    """Convert the old single-document download_history.json to JSON Lines"""
+    if not os.path.exists(LEGACY_HISTORY_FILE) or os.path.exists(HISTORY_FILE):
+        return
+    try:
+        with open(LEGACY_HISTORY_FILE, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+        with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
+            for entry in history:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.remove(LEGACY_HISTORY_FILE)
+    except Exception:
+        pass
+
+def compact_history(limit):
+    """Rewrite the history log keeping only the newest `limit` entries"""
+    with HistoryLock():
+        if not os.path.exists(HISTORY_FILE):
+            return
+        with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
+            lines = [line for line in f if line.strip()]
+        if len(lines) <= limit:
+            return
+        tmp_file = HISTORY_FILE.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.writelines(lines[-limit:])
+        os.replace(tmp_file, HISTORY_FILE)
+
+def log_download(url, filename, mode, status="Success", config=None):
     """Log download activity"""
     try:
         log_entry = {
@@ -145,39 +263,60 @@ def log_download(url, filename, mode, status="Success"):
             "mode": mode_text(mode),
             "status": status
         }
+        line = json.dumps(log_entry, ensure_ascii=False) + "\n"
         
-        log_file = BASE_DIR / "download_history.json"
-        history = []
-        
-        if os.path.exists(log_file):
-            try:
-                with open(log_file, 'r', encoding='utf-8') as f:
-                    history = json.load(f)
-            except:
-                history = []
-        
-        history.append(log_entry)
-        
-        # Keep only last 50 entries
-        if len(history) > 50:
-            history = history[-50:]
-        
-        with open(log_file, 'w', encoding='utf-8') as f:
-            json.dump(history, f, indent=2, ensure_ascii=False)
+        with HistoryLock():
+            _migrate_legacy_history()
+            with open(HISTORY_FILE, 'a', encoding='utf-8') as f:
+                f.write(line)
+                size = f.tell()
+
+        # Decided from the file itself, so short sessions compact too; the size
+        # is measured in entries the length of this one
+        limit = (config or DEFAULT_CONFIG).get('history_limit', 50)
+        if size > HISTORY_COMPACT_FACTOR * limit * len(line.encode('utf-8')):
+            compact_history(limit)
     except Exception:
         pass
 
+def read_history_tail(count):
+    """Return the last `count` history entries, reading the log from the end"""
+    with HistoryLock():
+        _migrate_legacy_history()
+    if not os.path.exists(HISTORY_FILE):
+        return []
+
+    block_size = 8192
+    with open(HISTORY_FILE, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b""
+        while position > 0 and data.count(b"\n") <= count:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size) + data
+
+    entries = []
+    for line in data.splitlines()[-count:]:
+        try:
+            entries.append(json.loads(line.decode('utf-8')))
+        except ValueError:
+            # Partial first line of the block or a torn write; skip it
+            continue
+    return entries
+
+def clear_history():
+    """Delete the history log"""
+    with HistoryLock():
+        for path in (HISTORY_FILE, LEGACY_HISTORY_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+
 def show_download_history():
     """Display download history"""
-    log_file = BASE_DIR / "download_history.json"
-    
-    if not os.path.exists(log_file):
-        print("\n❌ No download history found.")
-        return
-    
     try:
-        with open(log_file, 'r', encoding='utf-8') as f:
-            history = json.load(f)
+        history = read_history_tail(10)  # Show last 10 entries
         
         if not history:
             print("\n❌ No download history found.")
@@ -189,7 +328,7 @@ def show_download_history():
         print(f"{'Date/Time':<20} {'Type':<12} {'Status':<10} {'Filename'}")
         print("-" * 80)
         
-        for entry in reversed(history[-10:]):  # Show last 10 entries
+        for entry in reversed(history):
             filename = entry.get('filename', 'Unknown')
             if len(filename) > 35:
                 filename = filename[:32] + "..."
@@ -201,49 +340,748 @@ def show_download_history():
     except Exception as e:
         print(f"\n❌ Error loading history: {e}")
 
-def get_url_info(url, config):
-    """Get video/playlist information without downloading"""
+# Options that only shape one call; the rest pick the shared connection state
+JOB_PARAMS = frozenset({
+    "outtmpl", "format", "format_sort", "merge_output_format", "postprocessors",
+    "progress_hooks", "postprocessor_hooks", "match_filter", "bandwidth_consumer",
+})
+# Lazily built YoutubeDL attributes an HttpSession hands to every instance
+SESSION_STATE = ("cookiejar", "_request_director")
+SESSION_MAX_AGE = 1800  # seconds before shared connections are closed and rebuilt
+
+class HttpSession:
+    """Cookie jar and request director shared by YoutubeDL instances"""
+
+    def __init__(self, ydl):
+        self.cookiejar = ydl.cookiejar
+        self.director = ydl._request_director
+        self.created = time.time()
+        self.users = 0
+        self.retired = False
+
+    def attach(self, ydl):
+        vars(ydl).update(cookiejar=self.cookiejar, _request_director=self.director)
+
+    def detach(self, ydl):
+        # YoutubeDL.close() would otherwise close the director for everyone
+        if vars(ydl).get('_request_director') is self.director:
+            del vars(ydl)['_request_director']
+
+class SessionPool:
+    """HTTP state shared by consecutive and concurrent yt-dlp calls.
+
+    Every call gets its own YoutubeDL, so hooks, postprocessors and counters
+    never carry over from another caller. Instances whose options match
+    apart from JOB_PARAMS share one HttpSession: the cookie jar and the
+    request director with its handlers and open connections. Player JS and
+    signature code come from yt-dlp's on-disk cache either way. An instance
+    still needed after the call (lazily paged playlist entries) is detached
+    instead of released and builds its own director from then on.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}  # profile -> current HttpSession
+        self._users = {}  # YoutubeDL -> the HttpSession attached to it
+
+    @staticmethod
+    def profile(params):
+        return json.dumps({key: value for key, value in params.items() if key not in JOB_PARAMS},
+                          sort_keys=True, default=repr)
+
+    def acquire(self, params):
+        """YoutubeDL configured with params; hand it back with release()"""
+        from yt_dlp import YoutubeDL
+
+        ydl = YoutubeDL(dict(params))
+        if not all(isinstance(getattr(YoutubeDL, name, None), functools.cached_property)
+                   for name in SESSION_STATE):
+            # Unknown yt-dlp internals: the instance keeps its own connections
+            return ydl
+        profile = self.profile(params)
+        with self._lock:
+            session = self._current(profile)
+        if session is None:
+            # Cookies are loaded and handlers built outside the lock
+            created = HttpSession(ydl)
+            with self._lock:
+                session = self._current(profile) or self._sessions.setdefault(profile, created)
+            if session is not created:
+                created.detach(ydl)
+                self._close_director(created)
+        with self._lock:
+            session.users += 1
+            self._users[ydl] = session
+        session.attach(ydl)
+        return ydl
+
+    def _current(self, profile):
+        """Unexpired session for profile; the lock must be held"""
+        session = self._sessions.get(profile)
+        if session is not None and time.time() - session.created >= SESSION_MAX_AGE:
+            # Closed once its last user is done with it
+            del self._sessions[profile]
+            session.retired = True
+            if not session.users:
+                self._close_director(session)
+            session = None
+        return session
+
+    def _leave(self, ydl):
+        """Take ydl off its session, closing a retired one nobody uses any more"""
+        with self._lock:
+            session = self._users.pop(ydl, None)
+            if session is None:
+                return
+            session.users -= 1
+            done = session.retired and not session.users
+        session.detach(ydl)
+        if done:
+            self._close_director(session)
+
+    def release(self, ydl):
+        self._leave(ydl)
+        try:
+            ydl.close()
+        except Exception:
+            pass
+
+    def detach(self, ydl):
+        """Let the caller keep an acquired instance for good"""
+        self._leave(ydl)
+
+    def session(self, params):
+        """acquire()/release() as a with-statement"""
+        pool = self
+
+        class Session:
+            def __enter__(self):
+                self.ydl = pool.acquire(params)
+                return self.ydl
+
+            def __exit__(self, *args):
+                pool.release(self.ydl)
+
+        return Session()
+
+    @staticmethod
+    def _close_director(session):
+        try:
+            session.director.close()
+        except Exception:
+            pass
+
+ydl_sessions = SessionPool()
+
+# Metadata lookups; flat playlist entries are resolved by whoever downloads them
+INFO_PARAMS = {
+    'quiet': True,
+    'no_warnings': True,
+    'extract_flat': 'in_playlist',
+}
+
+def extract_url_info(url, config):
+    """Resolve the yt-dlp info dict for a URL without downloading.
+
+    The result is left unprocessed (no format selection) so the download
+    step can run process_ie_result() on it with its own format options.
+    Playlists get lazily paged, flat entries so large playlists are never
+    walked up front.
+    """
+    from yt_dlp.utils import LazyList
+
+    ydl = ydl_sessions.acquire(INFO_PARAMS)
     try:
-        # Use quiet mode to suppress warnings for info fetching
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
+        info = ydl.extract_info(url, download=False, process=False)
+        # Follow redirects to the extractor that actually handles the media
+        while info.get('_type') in ('url', 'url_transparent'):
+            info = ydl.extract_info(info['url'], download=False, process=False, ie_key=info.get('ie_key'))
+        if info.get('_type') == 'playlist':
+            entries = info.get('entries')
+            if entries is not None and not isinstance(entries, list):
+                # Later pages are fetched through this instance while the playlist
+                # is walked, so it leaves the pool instead of serving other callers
+                ydl_sessions.detach(ydl)
+                ydl = None
+                if not isinstance(entries, LazyList):
+                    info['entries'] = LazyList(entries)
+        return info
+    finally:
+        if ydl is not None:
+            ydl_sessions.release(ydl)
+
+def playlist_count(info):
+    """Number of entries in a playlist if known without walking it, else None"""
+    if info.get('playlist_count') is not None:
+        return info['playlist_count']
+    entries = info.get('entries')
+    if isinstance(entries, list) and not info.get('entries_partial'):
+        return len(entries)
+    return None
+
+def summarize_info(info):
+    """Reduce a yt-dlp info dict to the fields shown in previews and history"""
+    # Check if it's a playlist
+    if 'entries' in info:
+        # It's a playlist
+        playlist_info = {
+            'type': 'playlist',
+            'title': info.get('title', 'Unknown Playlist'),
+            'uploader': info.get('uploader', 'Unknown'),
+            'video_count': playlist_count(info),
+            'videos': []
         }
         
-        with YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            
-            # Check if it's a playlist
-            if 'entries' in info:
-                # It's a playlist
-                playlist_info = {
-                    'type': 'playlist',
-                    'title': info.get('title', 'Unknown Playlist'),
-                    'uploader': info.get('uploader', 'Unknown'),
-                    'video_count': len(info['entries']) if info.get('entries') else 0,
-                    'videos': []
-                }
-                
-                # Get first few video titles
-                for i, entry in enumerate(info['entries'][:5]):
-                    if entry:
-                        playlist_info['videos'].append(entry.get('title', f'Video {i+1}'))
-                
-                return playlist_info
-            else:
-                # It's a single video
-                return {
-                    'type': 'video',
-                    'title': info.get('title', 'Unknown'),
-                    'duration': info.get('duration', 0),
-                    'uploader': info.get('uploader', 'Unknown'),
-                    'view_count': info.get('view_count', 0),
-                    'upload_date': info.get('upload_date', 'Unknown')
-                }
+        # Get first few video titles
+        for i, entry in enumerate(info['entries'][:5]):
+            if entry:
+                playlist_info['videos'].append(entry.get('title', f'Video {i+1}'))
+        
+        return playlist_info
+    else:
+        # It's a single video
+        return {
+            'type': 'video',
+            'title': info.get('title', 'Unknown'),
+            'duration': info.get('duration', 0),
+            'uploader': info.get('uploader', 'Unknown'),
+            'view_count': info.get('view_count', 0),
+            'upload_date': info.get('upload_date', 'Unknown')
+        }
+
+def get_url_info(url, config, info=None):
+    """Get video/playlist information without downloading.
+
+    Pass an already extracted info dict to avoid another round trip.
+    """
+    try:
+        if info is None:
+            info = extract_url_info(url, config)
+        return summarize_info(info)
     except Exception as e:
         print(f"❌ Error fetching URL info: {e}")
         return None
 
+# Info dict fields that stay valid for days; signed format URLs, HTTP
+# headers and cookies expire within hours and are never cached
+CACHEABLE_FIELDS = (
+    'id', 'title', 'uploader', 'uploader_id', 'channel', 'channel_id',
+    'duration', 'view_count', 'upload_date', 'webpage_url', 'extractor_key',
+    'playlist_count',
+)
+CACHE_KEY_MEMO_SIZE = 4096  # URLs whose cache keys are remembered
+
+@functools.lru_cache(maxsize=CACHE_KEY_MEMO_SIZE)
+def cache_key_for_url(url):
+    """Derive a stable cache key (extractor + video/playlist ID) from a URL.
+
+    Whatever follows the ID in the path is kept, so channel tabs such as
+    /@name/videos and /@name/shorts get keys of their own. Finding the
+    extractor means trying every one yt-dlp has, so keys are memoized.
+    """
+    try:
+        from yt_dlp.extractor import gen_extractor_classes
+        for ie in gen_extractor_classes():
+            if ie.ie_key() != 'Generic' and ie.suitable(url):
+                video_id = ie.get_temp_id(url)
+                if video_id:
+                    segments = urlparse(url).path.strip('/').split('/')
+                    if video_id in segments:
+                        tab = segments[segments.index(video_id) + 1:]
+                        if tab:
+                            video_id = "/".join([video_id] + tab)
+                    return f"{ie.ie_key()}:{video_id}"
+                break
+    except Exception:
+        pass
+    return f"url:{url}"
+
+def sanitize_cached_info(info):
+    """Keep only the long-lived fields of an info dict"""
+    cached = {key: info[key] for key in CACHEABLE_FIELDS if info.get(key) is not None}
+    if 'entries' in info:
+        entries = info.get('entries') or []
+        if not isinstance(entries, list):
+            # Only keep what the preview already paged in; never walk the playlist
+            entries = entries[:5]
+            cached['entries_partial'] = True
+        cached['entries'] = [
+            {key: entry[key] for key in ('id', 'title', 'url') if entry.get(key) is not None}
+            for entry in entries if entry
+        ]
+    return cached
+
+class MetadataCache:
+    """Persistent cache of sanitized extract_info results with TTL and LRU eviction"""
+
+    def __init__(self, path, ttl=86400, max_entries=500):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max(1, int(max_entries))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        self._entries = {}
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self._entries = data.get('entries', {})
+                self.hits = data.get('hits', 0)
+                self.misses = data.get('misses', 0)
+        except Exception:
+            self._entries = {}
+
+    def _save(self):
+        try:
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'hits': self.hits, 'misses': self.misses,
+                           'entries': self._entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            pass
+
+    def get(self, url):
+        """Return the cached info for a URL, or None if missing or expired.
+
+        Hit/miss counts and LRU times are only written out with the next
+        store or eviction, so lookups don't rewrite the file.
+        """
+        key = cache_key_for_url(url)
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            now = time.time()
+            if entry and now - entry['stored'] <= self.ttl:
+                entry['used'] = now
+                self.hits += 1
+                return entry['info']
+            self.misses += 1
+            if entry:
+                del self._entries[key]
+                self._save()
+            return None
+
+    def put(self, url, info):
+        """Store the long-lived parts of an info dict, evicting least recently used"""
+        key = cache_key_for_url(url)
+        now = time.time()
+        with self._lock:
+            self._load()
+            self._entries[key] = {'stored': now, 'used': now,
+                                  'info': sanitize_cached_info(info)}
+            while len(self._entries) > self.max_entries:
+                oldest = min(self._entries, key=lambda k: self._entries[k]['used'])
+                del self._entries[oldest]
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self.hits = 0
+            self.misses = 0
+            self._save()
+
+    def stats(self):
+        with self._lock:
+            self._load()
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+_metadata_cache = None
+
+def get_metadata_cache(config):
+    """Return the shared metadata cache, or None when caching is disabled"""
+    global _metadata_cache
+    if not config.get('metadata_cache', True):
+        return None
+    if _metadata_cache is None:
+        _metadata_cache = MetadataCache(METADATA_CACHE_FILE)
+    _metadata_cache.ttl = config.get('metadata_cache_ttl', 86400)
+    _metadata_cache.max_entries = max(1, int(config.get('metadata_cache_size', 500)))
+    return _metadata_cache
+
+def archive_id(info):
+    """yt-dlp style archive ID ('youtube dQw4w9WgXcQ') of an info dict or flat entry"""
+    extractor = info.get('extractor_key') or info.get('ie_key')
+    if extractor and info.get('id'):
+        return f"{extractor.lower()} {info['id']}"
+    return None
+
+def archive_mode(job):
+    """Archive entries are per mode; manual formats also record the format string"""
+    if job.mode != "3":
+        return job.mode
+    return f"3:{job.fmt}" + (f" -S {','.join(job.format_sort)}" if job.format_sort else "")
+
+class DownloadArchive:
+    """SQLite index of finished downloads, keyed by archive ID and mode.
+
+    One connection is shared by all workers behind a lock; WAL mode lets
+    several downloader processes use the same file.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        created = not self.path.exists()
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS downloads (
+                archive_id TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                filename TEXT,
+                title TEXT,
+                completed_at TEXT,
+                PRIMARY KEY (archive_id, mode)
+            ) WITHOUT ROWID""")
+            # Playlist sync state: entries seen on earlier runs and their order
+            self._db.execute("""CREATE TABLE IF NOT EXISTS playlist_entries (
+                playlist TEXT NOT NULL,
+                entry TEXT NOT NULL,
+                position INTEGER,
+                PRIMARY KEY (playlist, entry)
+            ) WITHOUT ROWID""")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS playlists (
+                playlist TEXT PRIMARY KEY,
+                title TEXT,
+                newest_first INTEGER,
+                synced_at TEXT,
+                full_synced_at TEXT
+            )""")
+        self.created = created
+
+    def add(self, archive_id, mode, filename=None, title=None):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?)",
+                             (archive_id, mode, filename, title,
+                              datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+    def lookup(self, archive_id, mode):
+        """Recorded file path of a download, '' if none was recorded, None if absent"""
+        with self._lock:
+            row = self._db.execute("SELECT filename FROM downloads WHERE archive_id = ? AND mode = ?",
+                                   (archive_id, mode)).fetchone()
+        return None if row is None else (row[0] or '')
+
+    def entries(self, mode):
+        """{archive_id: filename} for one mode, for checking a whole playlist at once"""
+        with self._lock:
+            rows = self._db.execute("SELECT archive_id, filename FROM downloads WHERE mode = ?",
+                                    (mode,)).fetchall()
+        return {archive_id: filename or '' for archive_id, filename in rows}
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM downloads").fetchone()[0]
+
+    def playlist_state(self, playlist):
+        """({entry: position}, playlist row as a dict or None) from the last sync"""
+        with self._lock:
+            rows = self._db.execute("SELECT entry, position FROM playlist_entries WHERE playlist = ?",
+                                    (playlist,)).fetchall()
+            row = self._db.execute("SELECT title, newest_first, synced_at, full_synced_at "
+                                   "FROM playlists WHERE playlist = ?", (playlist,)).fetchone()
+        meta = None
+        if row:
+            meta = dict(zip(('title', 'newest_first', 'synced_at', 'full_synced_at'), row))
+        return dict(rows), meta
+
+    def save_playlist_sync(self, playlist, title, seen, removed, newest_first, full):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO playlist_entries VALUES (?, ?, ?)",
+                                 [(playlist, entry, position) for position, entry in enumerate(seen, 1)])
+            self._db.executemany("DELETE FROM playlist_entries WHERE playlist = ? AND entry = ?",
+                                 [(playlist, entry) for entry in removed])
+            self._db.execute("""INSERT INTO playlists VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(playlist) DO UPDATE SET title = excluded.title,
+                    newest_first = excluded.newest_first, synced_at = excluded.synced_at,
+                    full_synced_at = COALESCE(excluded.full_synced_at, playlists.full_synced_at)""",
+                             (playlist, title, newest_first, now, now if full else None))
+
+_download_archive = None
+_archive_lock = threading.Lock()
+
+def get_download_archive(config):
+    """Return the shared download archive, or None when it is disabled"""
+    global _download_archive
+    if not config.get('download_archive', True):
+        return None
+    with _archive_lock:
+        if _download_archive is None:
+            try:
+                _download_archive = DownloadArchive(ARCHIVE_FILE)
+            except sqlite3.Error:
+                return None
+            if _download_archive.created:
+                # First run: seed the archive from what is already on disk. Local
+                # work only, since every other worker waits on this lock;
+                # playlist files are matched by title when the playlist runs
+                import_download_archive(_download_archive, config)
+    return _download_archive
+
+def archived_file_exists(filename):
+    """Archive entries count only while their file is still there (if one was recorded)"""
+    return not filename or os.path.exists(filename)
+
+# File names yt-dlp writes with an "[%(id)s]" suffix
+ARCHIVE_ID_IN_NAME = re.compile(r"\[([0-9A-Za-z_-]{11})\]\.\w+$")
+
+def import_playlist_files(archive, url, mode, download_dir, config):
+    """Archive the files of a playlist's folder, matched to its entries by title.
+
+    Playlists are saved as "<playlist title>/<title>.<ext>" with no video ID
+    in the name, so the playlist is listed again (flat, one request per
+    page) and each entry's title is turned into a file name the way yt-dlp
+    does when it writes the file.
+    """
+    from yt_dlp.utils import sanitize_filename
+
+    info = extract_url_info(url, config)
+    title = info.get('title')
+    folder = download_dir / sanitize_filename(title or "")
+    if not title or not folder.is_dir():
+        return 0
+    files = {}
+    for filepath in folder.iterdir():
+        if filepath.is_file() and (filepath.suffix.lower() == ".mp3") == (mode == "2"):
+            files.setdefault(filepath.stem, filepath)
+    added = 0
+    for entry in info.get('entries') or []:
+        filepath = entry and files.get(sanitize_filename(entry.get('title') or ""))
+        if filepath and archive_id(entry):
+            archive.add(archive_id(entry), mode, str(filepath), entry.get('title'))
+            added += 1
+    return added
+
+def import_download_archive(archive, config, playlists=False):
+    """Record existing downloads from the history log and the download folder.
+
+    Single videos come from history entries with a video URL and a file
+    that still exists. Other files need the video ID in their name. With
+    playlists=True, playlists in the history are also listed again over
+    the network and their folder's files matched by title (see
+    import_playlist_files). Returns the number of entries added.
+    """
+    download_dir = Path(config.get('download_dir', DOWNLOAD_DIR))
+    modes = {"Video": "1", "MP3": "2"}
+    added = 0
+
+    with HistoryLock():
+        _migrate_legacy_history()
+    history = []
+    if os.path.exists(HISTORY_FILE):
+        with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    history.append(json.loads(line))
+                except ValueError:
+                    continue
+    playlist_runs = {}
+    for entry in history:
+        mode = modes.get(entry.get('mode'))
+        if mode and entry.get('url') and (entry.get('filename') or '').startswith("Playlist: "):
+            # Failed or cancelled runs may still have saved some entries
+            playlist_runs[(entry['url'], mode)] = True
+            continue
+        filepath = download_dir / (entry.get('filename') or '')
+        if entry.get('status') != "Success" or not mode or not filepath.is_file():
+            continue
+        key = cache_key_for_url(entry.get('url') or '')
+        if key.startswith("url:"):
+            continue
+        extractor, video_id = key.split(":", 1)
+        archive.add(f"{extractor.lower()} {video_id}", mode, str(filepath), filepath.stem)
+        added += 1
+
+    for url, mode in (playlist_runs if playlists else ()):
+        try:
+            added += import_playlist_files(archive, url, mode, download_dir, config)
+        except Exception as e:
+            print(f"⚠️  Skipped playlist {url}: {e}", file=sys.stderr)
+
+    if download_dir.is_dir():
+        for filepath in download_dir.rglob("*"):
+            match = ARCHIVE_ID_IN_NAME.search(filepath.name)
+            if match and filepath.is_file():
+                mode = "2" if filepath.suffix.lower() == ".mp3" else "1"
+                archive.add(f"youtube {match.group(1)}", mode, str(filepath), filepath.stem)
+                added += 1
+    return added
+
+# Finished jobs kept in the job store; older rows are deleted on startup
+JOB_STORE_KEEP = 1000
+
+class JobStore:
+    """SQLite record of every submitted job, so queued work survives a crash.
+
+    Jobs are inserted as 'queued', marked 'running' when a worker picks them
+    up and get their final status when they finish; playlist entries that
+    completed are stored per job. Each row names the process that owns it,
+    and jobs left unfinished by a process that is gone are handed back by
+    interrupted() on the next start. WAL mode with synchronous=NORMAL makes
+    each update a small append instead of a rewrite of the whole queue.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.host = socket.gethostname()
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                options TEXT NOT NULL,
+                status TEXT NOT NULL,
+                title TEXT,
+                filename TEXT,
+                error TEXT,
+                host TEXT,
+                pid INTEGER,
+                created_at TEXT,
+                updated_at TEXT,
+                finished_at TEXT
+            )""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS unfinished_jobs ON jobs (id) WHERE finished_at IS NULL")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS job_entries (
+                job_id INTEGER NOT NULL,
+                entry TEXT NOT NULL,
+                PRIMARY KEY (job_id, entry)
+            ) WITHOUT ROWID""")
+            self._db.execute("""DELETE FROM jobs WHERE finished_at IS NOT NULL AND id NOT IN (
+                SELECT id FROM jobs WHERE finished_at IS NOT NULL ORDER BY id DESC LIMIT ?)""",
+                             (JOB_STORE_KEEP,))
+            self._db.execute("DELETE FROM job_entries WHERE job_id NOT IN (SELECT id FROM jobs)")
+
+    @staticmethod
+    def _now():
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def add(self, job):
+        """Record a new top-level job and set its store_id"""
+        options = {
+            "fmt": job.fmt,
+            "download_dir": str(job.download_dir),
+            "format_sort": job.format_sort,
+            "priority": job.priority,
+            "sync_mode": job.sync_mode,
+        }
+        now = self._now()
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT INTO jobs (url, mode, options, status, host, pid, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job.url, job.mode, json.dumps(options), self.host, self.pid, now, now))
+        job.store_id = cursor.lastrowid
+        return job.store_id
+
+    def set_running(self, job):
+        # A retried job reuses its row, which must read as unfinished again
+        with self._lock, self._db:
+            self._db.execute("UPDATE jobs SET status = 'running', title = ?, error = NULL, updated_at = ?, "
+                             "finished_at = NULL WHERE id = ?",
+                             (job.title, self._now(), job.store_id))
+
+    def entry_done(self, job, entry):
+        """Remember a finished playlist entry of a stored job"""
+        with self._lock, self._db:
+            self._db.execute("INSERT OR IGNORE INTO job_entries VALUES (?, ?)", (job.store_id, entry))
+
+    def finish(self, job, status=None):
+        now = self._now()
+        with self._lock, self._db:
+            self._db.execute("UPDATE jobs SET status = ?, title = ?, filename = ?, error = ?, "
+                             "updated_at = ?, finished_at = ? WHERE id = ?",
+                             (status or job.status.lower(), job.title, job.filename, job.error, now, now, job.store_id))
+
+    def interrupted(self, config):
+        """Claim the unfinished jobs of processes that are gone and rebuild them.
+
+        Jobs owned by a process on another host are left alone.
+        """
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so two processes starting
+            # together cannot claim the same jobs
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute("SELECT id, url, mode, options, host, pid FROM jobs "
+                                        "WHERE finished_at IS NULL ORDER BY id").fetchall()
+                rows = [row for row in rows
+                        if row[4] == self.host and row[5] != self.pid and not process_alive(row[5])]
+                self._db.executemany("UPDATE jobs SET status = 'queued', pid = ?, updated_at = ? WHERE id = ?",
+                                     [(self.pid, self._now(), row[0]) for row in rows])
+                entries = {}
+                for job_id, entry in self._db.execute(
+                        "SELECT job_id, entry FROM job_entries WHERE job_id IN "
+                        "(SELECT id FROM jobs WHERE finished_at IS NULL)"):
+                    entries.setdefault(job_id, set()).add(entry)
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+
+        jobs = []
+        for job_id, url, mode, options, host, pid in rows:
+            options = json.loads(options)
+            job = DownloadJob(url, mode, config, download_dir=options.get('download_dir'), fmt=options.get('fmt'))
+            job.store_id = job_id
+            job.format_sort = options.get('format_sort')
+            job.priority = options.get('priority')
+            job.sync_mode = options.get('sync_mode')
+            job.done_entries = entries.get(job_id, set())
+            jobs.append(job)
+        return jobs
+
+def process_alive(pid):
+    """Whether a process with this ID is still running on this machine"""
+    if not pid:
+        return False
+    if os.name == 'nt':
+        import ctypes
+        # PROCESS_QUERY_LIMITED_INFORMATION; fails for processes that are gone
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        ctypes.windll.kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return exit_code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+_job_store = None
+_job_store_lock = threading.Lock()
+
+def get_job_store(config):
+    """Return the shared job store, or None when it is disabled"""
+    global _job_store
+    if not config.get('job_store', True):
+        return None
+    with _job_store_lock:
+        if _job_store is None:
+            try:
+                _job_store = JobStore(JOBS_FILE)
+            except sqlite3.Error:
+                return None
+    return _job_store
+
 def format_duration(seconds):
     """Format duration from seconds to MM:SS or HH:MM:SS"""
     if not seconds:
@@ -256,194 +1094,1545 @@ def format_duration(seconds):
     else:
         return f"{minutes:02d}:{seconds:02d}"
 
-def progress_hook(info, config):
+# yt-dlp postprocessor names mapped to the phase they are timed under
+POSTPROCESSOR_PHASES = {
+    "Merger": "merge",
+    "ExtractAudio": "transcode",
+}
+
+class JobMetrics:
+    """Per-job timing spans (seconds per phase) and transfer counters"""
+
+    def __init__(self):
+        self.phases = {}
+        self.bytes = 0
+        self._running = {}
+
+    def start(self, phase):
+        self._running.setdefault(phase, time.perf_counter())
+
+    def stop(self, phase):
+        started = self._running.pop(phase, None)
+        if started is not None:
+            self.add(phase, time.perf_counter() - started)
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def span(self, phase):
+        metrics = self
+
+        class Span:
+            def __enter__(self):
+                metrics.start(phase)
+
+            def __exit__(self, *args):
+                metrics.stop(phase)
+
+        return Span()
+
+    def stop_all(self):
+        for phase in list(self._running):
+            self.stop(phase)
+
+    def summary(self):
+        """One-line breakdown such as 'metadata 1.2s · download 9.8s · merge 1.1s'"""
+        labels = {"extract": "metadata"}
+        return " · ".join(f"{labels.get(phase, phase)} {seconds:.1f}s"
+                          for phase, seconds in self.phases.items() if round(seconds, 1))
+
+class DownloadJob:
+    """State for a single download, owned by the worker that runs it"""
+
+    def __init__(self, url, mode, config, download_dir=None, fmt=None, parent=None):
+        self.url = url
+        self.mode = mode
+        self.config = config
+        self.download_dir = Path(download_dir or DOWNLOAD_DIR)
+        self.fmt = fmt
+        self.parent = parent
+        self.extra_info = {}
+        self.info = None
+        self.url_info = None
+        self.status = "Queued"
+        self.queued_at = time.time()
+        self.metrics = JobMetrics()
+        # (YoutubeDL, deferred post_process calls) between download and FFmpeg stages
+        self.postprocessing = None
+        self.format_sort = None  # yt-dlp format_sort fields from a format preference
+        self.priority = None  # "high", "normal" or "low"; see job_priority
+        self.bandwidth = None  # BandwidthConsumer while downloading
+        self.archive_id = None
+        self.store_id = None  # row in the JobStore; top-level jobs only
+        self.entries_skipped = 0
+        # None, "incremental" or "full"; see PlaylistSync
+        self.sync_mode = None
+        self.sync = None
+        self.filename = None
+        self.entry_key = None
+        self.error = None
+        self.entries_total = 0
+        self.entries_failed = 0
+        self.attempts = []
+        self.retryable = True  # False after a failure retrying cannot fix (e.g. a full disk)
+        # Keys of playlist entries that already finished; skipped on re-runs
+        self.done_entries = set()
+        self.progress = None  # latest downloading progress: bytes, total, speed, eta
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        """Ask the workers to stop this job (and its playlist entries)"""
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set() or bool(self.parent and self.parent.cancelled)
+
+    @property
+    def is_playlist(self):
+        return bool(self.url_info and self.url_info['type'] == 'playlist')
+
+    @property
+    def title(self):
+        if self.url_info:
+            return self.url_info.get('title', self.url)
+        return self.url
+
+
+_metrics_lock = threading.Lock()
+# Process-wide totals for the Prometheus text file
+_metrics_totals = {"jobs": {}, "phases": {}, "bytes": 0, "retries": 0}
+
+def record_metrics(job):
+    """Append a job's timings to the metrics log and refresh Prometheus totals"""
+    config = job.config
+    if not config.get('enable_metrics', True):
+        return
+    retries = max(0, len(job.attempts) - 1)
+    record = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "url": job.url,
+        "title": job.title,
+        "mode": mode_text(job.mode),
+        "status": job.status,
+        "playlist": job.parent.title if job.parent else None,
+        "phases": {phase: round(seconds, 3) for phase, seconds in job.metrics.phases.items()},
+        "bytes": job.metrics.bytes,
+        "retries": retries,
+        "error": job.error,
+    }
+    try:
+        with _metrics_lock:
+            with open(METRICS_FILE, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+            totals = _metrics_totals
+            totals["jobs"][job.status] = totals["jobs"].get(job.status, 0) + 1
+            for phase, seconds in job.metrics.phases.items():
+                totals["phases"][phase] = totals["phases"].get(phase, 0.0) + seconds
+            totals["bytes"] += job.metrics.bytes
+            totals["retries"] += retries
+            if config.get('prometheus_file'):
+                write_prometheus(config['prometheus_file'], totals)
+    except Exception:
+        pass
+
+def write_prometheus(path, totals):
+    """Write totals in the Prometheus text exposition format (atomic replace)"""
+    lines = [
+        "# HELP ytdl_jobs_total Finished download jobs by status.",
+        "# TYPE ytdl_jobs_total counter",
+    ]
+    lines += [f'ytdl_jobs_total{{status="{status.lower()}"}} {count}'
+              for status, count in totals["jobs"].items()]
+    lines += [
+        "# HELP ytdl_phase_seconds_total Time spent per download phase.",
+        "# TYPE ytdl_phase_seconds_total counter",
+    ]
+    lines += [f'ytdl_phase_seconds_total{{phase="{phase}"}} {seconds:.3f}'
+              for phase, seconds in totals["phases"].items()]
+    lines += [
+        "# HELP ytdl_bytes_total Bytes transferred by finished jobs.",
+        "# TYPE ytdl_bytes_total counter",
+        f"ytdl_bytes_total {totals['bytes']}",
+        "# HELP ytdl_retries_total Retry attempts made.",
+        "# TYPE ytdl_retries_total counter",
+        f"ytdl_retries_total {totals['retries']}",
+    ]
+    path = Path(os.path.expanduser(path))
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
+
+# Share of the bandwidth limit a running download gets relative to the others
+PRIORITY_WEIGHTS = {"high": 8, "normal": 2, "low": 1}
+# Seconds of unused share a download may save up and spend at once
+BANDWIDTH_BURST = 0.5
+BANDWIDTH_RECHECK = 0.25
+
+class BandwidthScheduler:
+    """Process-wide token-bucket rate limit shared by every download worker.
+
+    Each running download draws from its own bucket, refilled at its share
+    of the current limit: limit * weight / total weight of running downloads.
+    A high priority video therefore takes most of the link while low
+    priority playlist entries back off, and shares grow again as downloads
+    finish.
+    """
+
+    def __init__(self):
+        self.config = {}
+        self._lock = threading.Lock()
+        self._consumers = set()
+        self._limit = 0
+        self._limit_checked = 0
+
+    def configure(self, config):
+        self.config = config
+        self._limit_checked = 0
+
+    def limit(self):
+        """Current limit in bytes per second, 0 when unlimited"""
+        now = time.time()
+        if now - self._limit_checked >= 1:
+            self._limit = scheduled_mbps(self.config, datetime.now()) * 1e6 / 8
+            self._limit_checked = now
+        return self._limit
+
+    def share(self, consumer):
+        limit = self.limit()
+        if not limit:
+            return 0
+        with self._lock:
+            total = sum(c.weight for c in self._consumers) or consumer.weight
+        return limit * consumer.weight / total
+
+    def register(self, job):
+        consumer = BandwidthConsumer(self, job_priority(job))
+        with self._lock:
+            self._consumers.add(consumer)
+        return consumer
+
+    def unregister(self, consumer):
+        with self._lock:
+            self._consumers.discard(consumer)
+
+class BandwidthConsumer:
+    """One download's token bucket; shared by all of its connections"""
+
+    def __init__(self, scheduler, priority):
+        self.scheduler = scheduler
+        self.weight = PRIORITY_WEIGHTS.get(priority, PRIORITY_WEIGHTS["normal"])
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._last = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.scheduler.unregister(self)
+
+    def share(self):
+        """Bytes per second this download may currently use, 0 when unlimited"""
+        return self.scheduler.share(self)
+
+    def consume(self, size):
+        """Account for `size` downloaded bytes, sleeping to stay within the share"""
+        with self._lock:
+            self._refill(self.share())
+            self._tokens -= size
+        while True:
+            share = self.share()
+            with self._lock:
+                self._refill(share)
+                if not share or self._tokens >= 0:
+                    return
+                wait = -self._tokens / share
+            # Short naps so a share that grows mid-wait takes effect at once
+            time.sleep(min(wait, BANDWIDTH_RECHECK))
+
+    def _refill(self, share):
+        now = time.monotonic()
+        if share:
+            self._tokens = min(self._tokens + (now - self._last) * share, share * BANDWIDTH_BURST)
+        else:
+            self._tokens = 0.0
+        self._last = now
+
+def job_priority(job):
+    """Explicit priority, else playlist entries run as bulk ('low') work"""
+    return job.priority or (job.parent.priority if job.parent else None) or ("low" if job.parent else "normal")
+
+def scheduled_mbps(config, now):
+    """Bandwidth limit for the time of day; schedule windows may wrap midnight"""
+    clock = now.strftime("%H:%M")
+    for window in config.get('bandwidth_schedule') or []:
+        start, end = window.get('from', '00:00'), window.get('to', '24:00')
+        inside = start <= clock < end if start <= end else (clock >= start or clock < end)
+        if inside:
+            return float(window.get('mbps') or 0)
+    return float(config.get('bandwidth_limit_mbps') or 0)
+
+bandwidth_scheduler = BandwidthScheduler()
+
+class ProgressDisplay:
+    """Rate-limited console renderer that aggregates progress of all active jobs.
+
+    Progress hooks only record state; a single background thread redraws
+    the status line at most `refresh_rate` times per second, so the
+    download threads never block on console I/O.
+    """
+
+    def __init__(self, refresh_rate=4):
+        self.refresh_rate = refresh_rate
+        self._states = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._line_width = 0
+
+    @property
+    def enabled(self):
+        return sys.stdout.isatty()
+
+    def update(self, job, info):
+        """Record the latest progress of a job; never touches the console"""
+        if not self.enabled:
+            return
+        from yt_dlp.utils import remove_terminal_sequences
+
+        state = {
+            'title': job.title,
+            'downloaded': info.get('downloaded_bytes') or 0,
+            'total': info.get('total_bytes') or info.get('total_bytes_estimate') or 0,
+            'speed': info.get('speed') or 0,
+            'cap': job.bandwidth.share() if job.bandwidth else 0,
+        }
+        # yt-dlp colours these strings when writing to a terminal
+        for key, default in (('percent', ''), ('speed', 'N/A'), ('eta', 'N/A'),
+                             ('total_bytes', 'N/A'), ('downloaded_bytes', 'N/A')):
+            state[f'{key}_str'] = remove_terminal_sequences(info.get(f'_{key}_str', default)).strip()
+        with self._lock:
+            self._states[job] = state
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="progress", daemon=True)
+                self._thread.start()
+
+    def remove(self, job):
+        with self._lock:
+            self._states.pop(job, None)
+
+    def clear_line(self):
+        """Erase the status line; caller must hold print_lock"""
+        if self._line_width:
+            sys.stdout.write("\r" + " " * self._line_width + "\r")
+            sys.stdout.flush()
+            self._line_width = 0
+
+    def _run(self):
+        while True:
+            time.sleep(1.0 / max(1, self.refresh_rate))
+            with self._lock:
+                states = list(self._states.values())
+                if not states:
+                    self._thread = None
+            if not states:
+                with print_lock:
+                    self.clear_line()
+                return
+            line = self._render(states)
+            with print_lock:
+                self.clear_line()
+                sys.stdout.write(line)
+                sys.stdout.flush()
+                self._line_width = len(line)
+
+    def _render(self, states):
+        from yt_dlp.utils import format_bytes
+
+        if len(states) == 1:
+            state = states[0]
+            line = (f"⏳ Downloading... {state['percent_str']} | {state['downloaded_bytes_str']}/{state['total_bytes_str']}"
+                    f" | Speed: {state['speed_str']} | ETA: {state['eta_str']}")
+            if state['cap']:
+                line += f" | Limit: {format_bytes(state['cap'])}/s"
+        else:
+            downloaded = sum(state['downloaded'] for state in states)
+            total = sum(state['total'] for state in states)
+            speed = sum(state['speed'] for state in states)
+            # Per-job rate next to each title; the limit is the shared total
+            jobs = " · ".join(f"{state['title'][:20]} {state['percent_str']} @{format_bytes(state['speed'])}/s"
+                              for state in states)
+            limit = bandwidth_scheduler.limit()
+            limit_str = f" of {format_bytes(limit)}/s" if limit else ""
+            line = (f"⏳ {len(states)} downloads | {format_bytes(downloaded)}/{format_bytes(total)}"
+                    f" | Speed: {format_bytes(speed)}/s{limit_str} | {jobs}")
+        width = shutil.get_terminal_size().columns - 1
+        return line[:width]
+
+progress_display = ProgressDisplay()
+
+def job_print(job, *lines):
+    """Print worker output for a job unless quiet mode is on"""
+    if job.config.get('quiet_mode', False):
+        return
+    with print_lock:
+        progress_display.clear_line()
+        for line in lines:
+            print(line)
+
+def progress_hook(info, job):
     """Enhanced progress hook with detailed information"""
-    global download_completed_shown
-    
+    if job.cancelled:
+        from yt_dlp.utils import DownloadCancelled
+        # Raised inside the downloader, which aborts the transfer
+        raise DownloadCancelled("Cancelled")
+
     if info["status"] == "downloading":
-        # Show download progress
-        if '_percent_str' in info:
-            percent = info['_percent_str'].strip()
-            speed = info.get('_speed_str', 'N/A').strip()
-            eta = info.get('_eta_str', 'N/A').strip()
-            total_size = info.get('_total_bytes_str', 'N/A').strip()
-            downloaded = info.get('_downloaded_bytes_str', 'N/A').strip()
-            
-            progress_text = f"\r⏳ Downloading... {percent} | {downloaded}/{total_size} | Speed: {speed} | ETA: {eta}"
-            sys.stdout.write(progress_text)
-            sys.stdout.flush()
-    
-    elif info["status"] == "finished" and not download_completed_shown:
-        download_completed_shown = True
-        filepath = info.get("filepath", "Unknown")
-        
-        # Wait a moment to ensure file is fully written
-        time.sleep(0.5)
+        job.metrics.start("download")
+        job.progress = {
+            "downloaded_bytes": info.get("downloaded_bytes") or 0,
+            "total_bytes": info.get("total_bytes") or info.get("total_bytes_estimate"),
+            "speed": info.get("speed"),
+            "eta": info.get("eta"),
+        }
+    elif info["status"] == "finished":
+        # Each stream (video, audio) reports its own finish
+        job.metrics.stop("download")
+        job.metrics.bytes += info.get("downloaded_bytes") or info.get("total_bytes") or 0
+        progress_display.remove(job)
+
+    if job.config.get('quiet_mode', False):
+        return
+
+    if info["status"] == "downloading":
+        # Only record progress here; ProgressDisplay redraws at a fixed rate
+        progress_display.refresh_rate = job.config.get('progress_refresh_rate', 4)
+        progress_display.update(job, info)
+
+def postprocessor_hook(info, job):
+    """Time FFmpeg merging and audio extraction separately from the transfer"""
+    phase = POSTPROCESSOR_PHASES.get(info.get("postprocessor"), "postprocess")
+    if info["status"] == "started":
+        job.metrics.start(phase)
+    elif info["status"] == "finished":
+        job.metrics.stop(phase)
+
+def print_completed(job, filepath):
+    """Print the completion summary with the job's timing totals"""
+    metrics = job.metrics
+    total = sum(seconds for phase, seconds in metrics.phases.items() if phase != "queue_wait")
+    transfer = metrics.phases.get("download", 0)
+    speed = f" (avg {metrics.bytes / transfer / (1024 * 1024):.2f} MB/s)" if transfer else ""
+    retries = max(0, len(job.attempts) - 1)
+
+    if filepath and os.path.exists(filepath):
+        filepath = os.path.abspath(filepath)
+        filename = os.path.basename(filepath)
+        try:
+            file_size = os.path.getsize(filepath) if os.path.exists(filepath) else 0
+            size_mb = file_size / (1024 * 1024)
+        except:
+            size_mb = 0
         
-        if filepath and filepath != "Unknown" and os.path.exists(filepath):
-            filepath = os.path.abspath(filepath)
-            filename = os.path.basename(filepath)
-            try:
-                file_size = os.path.getsize(filepath) if os.path.exists(filepath) else 0
-                size_mb = file_size / (1024 * 1024)
-            except:
-                size_mb = 0
-            
-            print("\n" + "═" * 55)
-            print("            ✅ DOWNLOAD COMPLETED")
-            print("═" * 55)
-            print(f"📄 File name: {filename}")
-            print(f"📂 Location: {os.path.dirname(filepath)}")
-            print(f"💾 File size: {size_mb:.2f} MB")
-            print(f"⏰ Completed at: {datetime.now().strftime('%H:%M:%S')}")
-            print("═" * 55 + "\n")
-        else:
-            print("\n✅ Download Completed Successfully")
-            print("📂 File saved in download folder\n")
+        job_print(job,
+                  "\n" + "═" * 55,
+                  "            ✅ DOWNLOAD COMPLETED",
+                  "═" * 55,
+                  f"📄 File name: {filename}",
+                  f"📂 Location: {os.path.dirname(filepath)}",
+                  f"💾 File size: {size_mb:.2f} MB",
+                  f"⏱️ Time: {total:.1f}s ({metrics.summary()})",
+                  f"📶 Transferred: {metrics.bytes / (1024 * 1024):.2f} MB{speed} | Retries: {retries}",
+                  f"⏰ Completed at: {datetime.now().strftime('%H:%M:%S')}",
+                  "═" * 55 + "\n")
+    else:
+        job_print(job,
+                  "\n✅ Download Completed Successfully",
+                  "📂 File saved in download folder",
+                  f"⏱️ Time: {total:.1f}s ({metrics.summary()})\n")
+
+MP3_QUALITY = "320"  # kbps
+
+def staging_dir(job):
+    """Folder a job downloads and post-processes in, or None to work in download_dir"""
+    staging = job.config.get('staging_dir')
+    if not staging:
+        return None
+    staging = Path(os.path.expanduser(staging))
+    return None if staging.resolve() == job.download_dir.resolve() else staging
+
+MERGE_HEADROOM = 2  # merging streams needs room for the inputs and the output at once
+
+def bitrate_size(kbps, duration):
+    return int(kbps * 1000 / 8 * duration) if kbps and duration else None
+
+def expected_sizes(job, info):
+    """(peak, final) bytes a download needs, from its selected formats.
+
+    Peak covers everything on disk at once while downloading and
+    post-processing; final is the published file. None if the formats
+    carry no size or bitrate to estimate from.
+    """
+    formats = info.get('requested_formats') or [info]
+    duration = info.get('duration')
+    sizes = [f.get('filesize') or f.get('filesize_approx') or bitrate_size(f.get('tbr'), duration)
+             for f in formats]
+    if not all(sizes):
+        return None
+    downloaded = sum(sizes)
+    if job.mode == "2":
+        # The source may be kept until FFmpegExtractAudio has written the MP3
+        mp3 = bitrate_size(int(MP3_QUALITY), duration) or downloaded
+        return downloaded + mp3, mp3
+    if len(formats) > 1:
+        return downloaded * MERGE_HEADROOM, downloaded
+    return downloaded, downloaded
+
+class InsufficientDiskSpace(Exception):
+    """A download that cannot fit; retrying would fail the same way"""
+
+def existing_parent(path):
+    path = Path(path).absolute()
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    return path
+
+def is_disk_full(error):
+    """True for out-of-space failures, including ones wrapped by yt-dlp"""
+    while error is not None:
+        if isinstance(error, InsufficientDiskSpace):
+            return True
+        if isinstance(error, OSError) and error.errno == errno.ENOSPC:
+            return True
+        exc_info = getattr(error, 'exc_info', None)
+        error = exc_info[1] if exc_info else error.__cause__
+    return False
+
+class DiskSpace:
+    """Process-wide ledger of space promised to downloads in flight.
+
+    Free space only shows bytes already written, so each download reserves
+    its expected size per volume until it is published. A download that
+    fits the free space but not what other downloads still need waits for
+    them; one that does not fit the free space at all fails immediately.
+    """
+
+    POLL = 5  # seconds between free-space checks while waiting
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._reserved = {}  # st_dev -> bytes
+        self._jobs = {}  # job -> {st_dev: bytes}
+
+    def needs(self, job, info):
+        """Bytes needed per volume as {st_dev: (folder, bytes)}, or None if unknown"""
+        sizes = expected_sizes(job, info)
+        if sizes is None:
+            return None
+        peak, final = sizes
+        folders = [(staging_dir(job), peak), (job.download_dir, final)] if staging_dir(job) else \
+            [(job.download_dir, peak)]
+        needs = {}
+        for folder, size in folders:
+            folder = existing_parent(folder)
+            dev = folder.stat().st_dev
+            # Staging and download folder on one volume: the publish is a rename
+            if size > needs.get(dev, (None, 0))[1]:
+                needs[dev] = (folder, size)
+        return needs
+
+    def reserve(self, job, info):
+        from yt_dlp.utils import format_bytes
+
+        needs = self.needs(job, info)
+        if not needs:
+            return
+        margin = int(job.config.get('disk_reserve_mb', 500) * 1024 * 1024)
+        announced = False
+        with self._cond:
+            self._release(job)
+            while True:
+                waiting = None
+                for dev, (folder, size) in needs.items():
+                    free = shutil.disk_usage(folder).free - margin
+                    if size > free:
+                        raise InsufficientDiskSpace(
+                            f"Not enough disk space in {folder}: needs {format_bytes(size)}, "
+                            f"{format_bytes(max(free, 0))} free")
+                    if size > free - self._reserved.get(dev, 0):
+                        waiting = folder
+                if waiting is None:
+                    break
+                if job.cancelled:
+                    raise InsufficientDiskSpace("Cancelled while waiting for disk space")
+                if not announced:
+                    job_print(job, f"💾 Waiting for other downloads to finish: not enough space in {waiting}")
+                    job.status = "Waiting"  # for disk space
+                    announced = True
+                self._cond.wait(self.POLL)
+            self._jobs[job] = {dev: size for dev, (folder, size) in needs.items()}
+            for dev, size in self._jobs[job].items():
+                self._reserved[dev] = self._reserved.get(dev, 0) + size
+        if announced:
+            job.status = "Downloading"
+
+    def _release(self, job):
+        for dev, size in self._jobs.pop(job, {}).items():
+            self._reserved[dev] -= size
+
+    def release(self, job):
+        with self._cond:
+            if job in self._jobs:
+                self._release(job)
+                self._cond.notify_all()
+
+disk_space = DiskSpace()
+
+def preflight_filter(info, job, incomplete=False):
+    """yt-dlp match_filter: reserve disk space once the formats are chosen"""
+    if not incomplete:
+        disk_space.reserve(job, info)
+    return None
+
+def build_ydl_opts(job):
+    """Build yt-dlp options for a job from its mode and output folder"""
+    # Everything before publish_file happens in the staging folder, if one is set
+    download_dir = str(staging_dir(job) or job.download_dir)
+    if (job.is_playlist or job.parent) and job.mode in ("1", "2"):
+        outtmpl = os.path.join(download_dir, "%(playlist_title)s", "%(title)s.%(ext)s")
+    else:
+        outtmpl = os.path.join(download_dir, "%(title)s.%(ext)s")
 
-def download_content(url, mode, config, retry_count=0):
-    """Universal download function that handles both single videos and playlists"""
-    global download_completed_shown
-    download_completed_shown = False
-    
     # Base ydl options - Clean and minimal output
-    if mode == "1":
+    ydl_opts = {
+        "outtmpl": outtmpl,
+        "progress_hooks": [lambda info: progress_hook(info, job)],
+        "postprocessor_hooks": [lambda info: postprocessor_hook(info, job)],
+        "quiet": True,  # Suppress yt-dlp output
+        "no_warnings": True,  # Suppress warnings
+        "noprogress": True,  # We handle progress ourselves
+        "extract_flat": False,
+        "continuedl": True,  # Resume .part files left by a failed attempt
+        "preallocate": bool(job.config.get('preallocate', False)),
+    }
+    if job.config.get('disk_preflight', True):
+        ydl_opts["match_filter"] = lambda info, incomplete=False: preflight_filter(info, job, incomplete)
+
+    # Segmented downloads: DASH/HLS fragments and range chunks of progressive files
+    connections = job.config.get('download_connections', 4)
+    ydl_opts["concurrent_fragment_downloads"] = connections
+    ydl_opts["segment_connections"] = connections
+    ydl_opts["segment_chunk_size"] = int(job.config.get('chunk_size_mb', 10) * 1024 * 1024)
+
+    if job.mode == "1":
         # Video mode
-        ydl_opts = {
-            "outtmpl": os.path.join(str(DOWNLOAD_DIR), "%(title)s.%(ext)s"),
-            "format": "bestvideo+bestaudio/best",
-            "merge_output_format": "mp4",
-            "progress_hooks": [lambda info: progress_hook(info, config)],
-            "quiet": True,  # Suppress yt-dlp output
-            "no_warnings": True,  # Suppress warnings
-            "noprogress": False,  # We handle progress ourselves
-            "extract_flat": False,
-        }
-    elif mode == "2":
+        ydl_opts["format"] = "bestvideo+bestaudio/best"
+        ydl_opts["merge_output_format"] = "mp4"
+    elif job.mode == "2":
         # MP3 mode
-        ydl_opts = {
-            "outtmpl": os.path.join(str(DOWNLOAD_DIR), "%(title)s.%(ext)s"),
-            "format": "bestaudio/best",
-            "postprocessors": [{
-                "key": "FFmpegExtractAudio",
-                "preferredcodec": "mp3",
-                "preferredquality": "320",
-            }],
-            "progress_hooks": [lambda info: progress_hook(info, config)],
-            "quiet": True,  # Suppress yt-dlp output
-            "no_warnings": True,  # Suppress warnings
-            "noprogress": False,  # We handle progress ourselves
-            "extract_flat": False,
-        }
-    elif mode == "3":
+        ydl_opts["format"] = "bestaudio/best"
+        ydl_opts["postprocessors"] = [{
+            "key": "FFmpegExtractAudio",
+            "preferredcodec": "mp3",
+            "preferredquality": MP3_QUALITY,
+        }]
+    elif job.mode == "3":
         # Manual format selection
+        ydl_opts["format"] = job.fmt
+    if job.format_sort:
+        ydl_opts["format_sort"] = job.format_sort
+
+    # Add FFmpeg location if available
+    ffmpeg_location = get_ffmpeg_location()
+    if ffmpeg_location and os.path.exists(ffmpeg_location):
+        ydl_opts['ffmpeg_location'] = ffmpeg_location
+
+    return ydl_opts
+
+# Column name -> sort key for the manual format table
+FORMAT_TABLE_SORTS = {
+    "res": lambda row: (row['height'] or 0, row['tbr'] or 0),
+    "size": lambda row: row['size'] or 0,
+    "bitrate": lambda row: row['tbr'] or 0,
+    "fps": lambda row: row['fps'] or 0,
+    "ext": lambda row: row['ext'],
+    "codec": lambda row: (row['vcodec'], row['acodec']),
+}
+
+# Preference words -> yt-dlp format_sort fields
+FORMAT_PREFERENCE_WORDS = {
+    "avc1": "vcodec:h264", "h264": "vcodec:h264", "avc": "vcodec:h264",
+    "hevc": "vcodec:h265", "h265": "vcodec:h265",
+    "vp9": "vcodec:vp9", "vp09": "vcodec:vp9",
+    "av1": "vcodec:av01", "av01": "vcodec:av01",
+    "aac": "acodec:aac", "mp4a": "acodec:aac", "opus": "acodec:opus",
+    "mp4": "ext:mp4", "webm": "ext:webm",
+    "smallest": "+size", "largest": "size",
+}
+
+def format_rows(info):
+    """One row per format of a processed info dict, with an estimated size"""
+    rows = []
+    for fmt in info.get('formats') or []:
+        vcodec = fmt.get('vcodec') or 'none'
+        acodec = fmt.get('acodec') or 'none'
+        if vcodec == 'none' and acodec == 'none' and fmt.get('ext') in ('mhtml', None):
+            continue  # storyboards
+        size = fmt.get('filesize') or fmt.get('filesize_approx')
+        if not size and fmt.get('tbr') and info.get('duration'):
+            size = fmt['tbr'] * 1000 / 8 * info['duration']
+        rows.append({
+            'id': fmt.get('format_id'),
+            'ext': fmt.get('ext') or '',
+            'height': fmt.get('height'),
+            'resolution': 'audio only' if vcodec == 'none' else (fmt.get('resolution') or ''),
+            'fps': fmt.get('fps'),
+            'vcodec': vcodec.split('.')[0],
+            'acodec': acodec.split('.')[0],
+            'tbr': fmt.get('tbr'),
+            'size': size,
+            'estimated': not fmt.get('filesize'),
+            'note': fmt.get('format_note') or '',
+        })
+    return rows
+
+def print_format_table(rows, sort=None):
+    """Print the manual format table, best last unless sorted by a column"""
+    from yt_dlp.utils import format_bytes
+
+    if sort:
+        rows = sorted(rows, key=FORMAT_TABLE_SORTS[sort])
+    id_width = max([len(row['id']) for row in rows] + [4])
+    print(f"{'ID':<{id_width}} {'EXT':<5} {'RESOLUTION':<11} {'FPS':>3} {'VCODEC':<7} {'ACODEC':<7} "
+          f"{'KBPS':>6} {'SIZE':>11}  NOTE")
+    print("─" * (68 + id_width))
+    for row in rows:
+        size = format_bytes(row['size']) if row['size'] else ''
+        if size and row['estimated']:
+            size = "~" + size
+        print(f"{row['id']:<{id_width}} {row['ext']:<5} {row['resolution']:<11} {row['fps'] or '':>3} "
+              f"{row['vcodec']:<7} {row['acodec']:<7} {round(row['tbr']) if row['tbr'] else '':>6} "
+              f"{size:>11}  {row['note']}")
+
+def parse_format_preference(text):
+    """Turn a preference like '<=1080p, avc1, smallest' into (format, format_sort).
+
+    Raises ValueError for words it does not understand.
+    """
+    fmt = "bv*+ba/b"
+    format_sort = []
+    for word in (part.strip().lower() for part in text.split(",")):
+        if not word:
+            continue
+        height = re.fullmatch(r"(?:≤|<=|<)?\s*(\d+)p", word)
+        fps = re.fullmatch(r"(\d+)\s*fps", word)
+        if height:
+            format_sort.append(f"res:{height.group(1)}")
+        elif fps:
+            format_sort.append(f"fps:{fps.group(1)}")
+        elif word == "audio":
+            fmt = "ba/b"
+        elif word in ("best", "highest"):
+            continue
+        elif word in FORMAT_PREFERENCE_WORDS:
+            format_sort.append(FORMAT_PREFERENCE_WORDS[word])
+        else:
+            raise ValueError(f"Unknown preference '{word}'")
+    return fmt, format_sort
+
+def select_formats(info, fmt, format_sort=None):
+    """Formats yt-dlp picks for fmt (and format_sort) from an already resolved info dict"""
+    params = {"quiet": True, "no_warnings": True, "format": fmt}
+    if format_sort:
+        params["format_sort"] = format_sort
+    with ydl_sessions.session(params) as ydl:
+        # Processing mutates the dict, so work on a copy
+        chosen = ydl.process_ie_result(copy.deepcopy(info), download=False)
+    return chosen.get('requested_formats') or [chosen]
+
+def choose_format(job, format_info):
+    """Manual mode prompt: pick format IDs or a preference; sets job.fmt (and job.format_sort)"""
+    from yt_dlp.utils import format_bytes
+
+    rows = format_rows(format_info)
+    ids = {row['id'] for row in rows}
+    print_format_table(rows)
+    while True:
+        print("\n" + "─" * 50)
+        print("🎯 Enter format ID(s) (e.g. 137+140), a preference (e.g. ≤1080p, avc1, smallest)")
+        print(f"   or 's <column>' to sort by {', '.join(FORMAT_TABLE_SORTS)}")
+        answer = input("🎯 Format: ").strip()
+        if not answer:
+            return False
+        if answer.lower().startswith("s "):
+            column = answer[2:].strip().lower()
+            if column in FORMAT_TABLE_SORTS:
+                print_format_table(rows, sort=column)
+            else:
+                print(f"❌ Unknown column '{column}'")
+            continue
+        if all(part in ids for part in re.split(r"[+/]", answer)):
+            job.fmt = answer
+            return True
         try:
-            print("\n📋 Fetching available formats...")
-            with YoutubeDL({"listformats": True, "quiet": True, "no_warnings": True}) as ydl:
-                ydl.download([url])
-            print("\n" + "─" * 50)
-            fmt = input("🎯 Enter format ID: ").strip()
-            if not fmt:
+            fmt, format_sort = parse_format_preference(answer)
+            chosen = select_formats(format_info, fmt, format_sort)
+        except Exception as e:
+            print(f"❌ {e}")
+            continue
+
+        size = sum(row['size'] or 0 for row in rows if row['id'] in {f.get('format_id') for f in chosen})
+        print("✅ Selected: " + " + ".join(
+            f"{f.get('format_id')} ({f.get('resolution') or f.get('ext')}, {(f.get('vcodec') or 'none').split('.')[0]}"
+            f"/{(f.get('acodec') or 'none').split('.')[0]})" for f in chosen)
+            + (f" ≈ {format_bytes(size)}" if size else ""))
+        if job.is_playlist:
+            # Every entry has its own formats, so keep the preference itself
+            job.fmt, job.format_sort = fmt, format_sort
+        else:
+            job.fmt = "+".join(f.get('format_id') for f in chosen)
+        return True
+
+def resolve_job(job):
+    """Fill in a job's metadata from the cache or a single extraction"""
+    cache = get_metadata_cache(job.config)
+    # Manual mode needs live formats, which are never cached
+    cached_info = cache.get(job.url) if cache and job.mode != "3" else None
+    if cached_info:
+        # The download step extracts the live formats itself
+        job.url_info = summarize_info(cached_info)
+        job.archive_id = archive_id(cached_info)
+        return job
+    with job.metrics.span("extract"):
+        job.info = extract_url_info(job.url, job.config)
+    if cache:
+        cache.put(job.url, job.info)
+    job.url_info = summarize_info(job.info)
+    job.archive_id = archive_id(job.info)
+    return job
+
+def prepare_download(url, mode, config):
+    """Interactive part of a download: format choice, preview and confirmation.
+
+    Returns a DownloadJob ready to be run, or None if the user cancelled.
+    """
+    job = DownloadJob(url, mode, config)
+
+    # Resolve metadata once; the preview, format table and download all reuse it
+    print("\n🔍 Fetching information...")
+    try:
+        resolve_job(job)
+    except Exception as e:
+        print(f"❌ Error fetching URL info: {e}")
+    url_info = job.url_info
+
+    if mode == "3":
+        # Manual format selection
+        if not job.info:
+            print("❌ Failed to fetch formats")
+            return None
+        try:
+            print("\n📋 Available formats:")
+            with ydl_sessions.session({"quiet": True, "no_warnings": True}) as ydl:
+                if job.is_playlist:
+                    # Formats of the first entry; the rest stay unresolved
+                    first = next((entry for entry in job.info['entries'] if entry), None)
+                    format_info = ydl.process_ie_result(dict(first), download=False) if first else {}
+                else:
+                    # Processing mutates the dict, so the download keeps a clean copy
+                    format_info = ydl.process_ie_result(copy.deepcopy(job.info), download=False)
+            if not format_info.get('formats'):
+                print("❌ Failed to fetch formats")
+                return None
+            if not choose_format(job, format_info):
                 print("❌ No format ID entered")
-                return
-            
-            ydl_opts = {
-                "outtmpl": os.path.join(str(DOWNLOAD_DIR), "%(title)s.%(ext)s"),
-                "format": fmt,
-                "progress_hooks": [lambda info: progress_hook(info, config)],
-                "quiet": True,  # Suppress yt-dlp output
-                "no_warnings": True,  # Suppress warnings
-                "noprogress": False,  # We handle progress ourselves
-                "extract_flat": False,
-            }
+                return None
         except Exception as e:
             print(f"❌ Failed to fetch formats: {e}")
-            return
+            return None
+    
+    if url_info:
+        if url_info['type'] == 'playlist':
+            print("\n" + "─" * 50)
+            print("📂 PLAYLIST INFORMATION")
+            print("─" * 50)
+            print(f"📺 Playlist: {url_info['title']}")
+            print(f"👤 Channel: {url_info['uploader']}")
+            print(f"🎬 Total Videos: {url_info['video_count'] if url_info['video_count'] is not None else 'Unknown'}")
+            print(f"📥 Mode: {mode_text(mode)}")
+            print("\n📹 First few videos:")
+            for i, video_title in enumerate(url_info['videos'], 1):
+                print(f"  {i}. {video_title}")
+            print("─" * 50)
+            
+            count_text = url_info['video_count'] if url_info['video_count'] is not None else "all"
+            confirm = input(f"\n🚀 Download {count_text} videos as {mode_text(mode).upper()}? (y/n): ").lower().strip()
+            if confirm != 'y':
+                print("❌ Download cancelled.")
+                return None
+                
+        else:
+            # Single video
+            print("\n" + "─" * 50)
+            print("📹 VIDEO INFORMATION")
+            print("─" * 50)
+            print(f"📺 Title: {url_info['title']}")
+            print(f"👤 Channel: {url_info['uploader']}")
+            print(f"⏱️ Duration: {format_duration(url_info['duration'])}")
+            print(f"👀 Views: {url_info['view_count']:,}")
+            print(f"📅 Upload date: {url_info['upload_date']}")
+            print(f"📥 Mode: {mode_text(mode)}")
+            print("─" * 50)
 
-    # Add FFmpeg location if available
-    if FFMPEG_LOCATION and os.path.exists(FFMPEG_LOCATION):
-        ydl_opts['ffmpeg_location'] = FFMPEG_LOCATION
+    # Time spent at the prompts above is not queue wait
+    job.queued_at = time.time()
+    return job
+
+def entry_key(entry):
+    return entry.get('id') or entry.get('url')
+
+def archive_checker(job, playlist_title):
+    """Return a predicate telling whether a flat playlist entry is already downloaded"""
+    archive = get_download_archive(job.config)
+    if archive is None:
+        return lambda entry: False
+    from yt_dlp.utils import sanitize_filename
+
+    mode = archive_mode(job)
+    # One query for the whole playlist instead of one per entry
+    known = archive.entries(mode)
+    ext = {"1": "mp4", "2": "mp3"}.get(job.mode)
+    playlist_dir = Path(job.download_dir) / sanitize_filename(playlist_title)
+
+    def is_archived(entry):
+        entry_id = archive_id(entry)
+        if not entry_id:
+            return False
+        if entry_id in known:
+            return archived_file_exists(known[entry_id])
+        # Downloaded before the archive existed: look for the file yt-dlp would write
+        if ext and entry.get('title'):
+            filepath = playlist_dir / f"{sanitize_filename(entry['title'])}.{ext}"
+            if filepath.is_file():
+                archive.add(entry_id, mode, str(filepath), entry['title'])
+                return True
+        return False
+
+    return is_archived
+
+# Consecutive known entries that end an incremental walk of a newest-first playlist
+SYNC_KNOWN_STREAK = 3
+
+class PlaylistSync:
+    """Incremental sync of one playlist against the entries seen on earlier runs.
+
+    Playlists that showed new entries at the top on an earlier sync are
+    treated as newest-first: the walk stops after SYNC_KNOWN_STREAK known
+    entries in a row that are also in the download archive, so a known
+    entry that failed last time is still retried. Other playlists, first
+    syncs and syncs older than sync_full_days walk every entry, which is
+    also when removals are found.
+    """
+
+    def __init__(self, archive, playlist, config, mode, force_full=False):
+        self.archive = archive
+        self.playlist = playlist
+        self.archived = archive.entries(mode)
+        self.known, meta = archive.playlist_state(playlist)
+        self.newest_first = meta['newest_first'] if meta else None
+        self.full = force_full or not meta or not self.newest_first or self._full_due(meta, config)
+        self.seen = {}
+        self.added = []
+        self.removed = []
+        self.stopped_early = False
+        self._streak = 0
+
+    @staticmethod
+    def _full_due(meta, config):
+        if not meta.get('full_synced_at'):
+            return True
+        last_full = datetime.strptime(meta['full_synced_at'], "%Y-%m-%d %H:%M:%S")
+        return (datetime.now() - last_full).days >= config.get('sync_full_days', 7)
+
+    def see(self, entry):
+        """Record an enumerated entry; returns True once the walk can stop"""
+        key = entry_key(entry)
+        if key in self.seen:
+            # Re-enumeration after a failed page
+            return False
+        self.seen[key] = len(self.seen)
+        entry_id = archive_id(entry)
+        if key in self.known and entry_id in self.archived and archived_file_exists(self.archived[entry_id]):
+            self._streak += 1
+        else:
+            self._streak = 0
+            if key not in self.known:
+                self.added.append(key)
+        self.stopped_early = not self.full and self._streak >= SYNC_KNOWN_STREAK
+        return self.stopped_early
+
+    def save(self, title):
+        if self.full:
+            self.removed = [key for key in self.known if key not in self.seen]
+        known_positions = [position for key, position in self.seen.items() if key in self.known]
+        if self.added and known_positions:
+            # New entries ahead of every known one: the playlist grows at the top
+            self.newest_first = max(self.seen[key] for key in self.added) < min(known_positions)
+        self.archive.save_playlist_sync(self.playlist, title, list(self.seen), self.removed,
+                                        self.newest_first, self.full and not self.stopped_early)
+
+    def summary(self):
+        text = f"🔁 Sync: {len(self.added)} new, {len(self.removed)} removed"
+        if self.stopped_early:
+            text += f" (stopped after {len(self.seen)} entries at already-seen videos)"
+        return text
+
+def iter_playlist_jobs(job, skip=()):
+    """Yield one child DownloadJob per playlist entry, paging the playlist lazily"""
+    info = job.info
+    if info is None:
+        info = job.info = extract_url_info(job.url, job.config)
+    playlist_title = info.get('title') or job.title
+    is_archived = archive_checker(job, playlist_title)
+    if job.sync_mode and job.sync is None:
+        archive = get_download_archive(dict(job.config, download_archive=True))
+        if archive:
+            job.sync = PlaylistSync(archive, archive_id(info) or job.url, job.config,
+                                    archive_mode(job), force_full=job.sync_mode == "full")
+
+    for index, entry in enumerate(info.get('entries') or [], 1):
+        if entry and job.sync and job.sync.see(entry):
+            break
+        if not entry or entry_key(entry) in skip or entry_key(entry) in job.done_entries:
+            continue
+        if is_archived(entry):
+            # Decided from the flat entry, before any per-entry extraction
+            job.done_entries.add(entry_key(entry))
+            job.entries_skipped += 1
+            continue
+        child = DownloadJob(entry.get('url') or entry.get('webpage_url'), job.mode, job.config,
+                            download_dir=job.download_dir, fmt=job.fmt, parent=job)
+        # Flat entries are resolved by the worker that picks them up
+        child.info = entry
+        child.entry_key = entry_key(entry)
+        child.archive_id = archive_id(entry)
+        child.url_info = {'type': 'video', 'title': entry.get('title') or child.url}
+        child.extra_info = {
+            'playlist': playlist_title,
+            'playlist_title': playlist_title,
+            'playlist_id': info.get('id'),
+            'playlist_index': index,
+        }
+        yield child
+
+def max_attempts(config):
+    """Total attempts allowed per download, including the first one"""
+    if not config.get('auto_retry', True):
+        return 1
+    return config.get('max_retries', 3) + 1
+
+def retry_delay(config, attempt):
+    """Exponential backoff with jitter before retry number `attempt` (1-based)"""
+    base = config.get('retry_backoff', 2)
+    delay = min(config.get('retry_backoff_max', 60), base * 2 ** (attempt - 1))
+    # Half fixed, half random so parallel workers don't retry in lockstep
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def wait_before_retry(job, attempt):
+    if job.cancelled:
+        return
+    delay = retry_delay(job.config, attempt)
+    job_print(job, f"🔄 Retrying in {delay:.1f}s... Attempt {attempt} of {max_attempts(job.config) - 1}")
+    job.cancel_event.wait(delay)
+    # Signed format URLs may have expired, so a retry resolves afresh
+    job.info = None
+
+def run_playlist(job, submit=None):
+    """Download a playlist entry by entry.
+
+    With a submit callable, entries are handed to the worker pool as soon as
+    they are enumerated; otherwise they run one after another. Entries that
+    finished on an earlier run are skipped, and a failed enumeration resumes
+    after the entries it already handed out.
+    """
+    url = job.url
+    mode = job.mode
+    job.status = "Downloading"
+    outcomes = []
+    submitted = set()
+
+    for attempt in range(max_attempts(job.config)):
+        if attempt:
+            wait_before_retry(job, attempt)
+        if job.cancelled:
+            break
+        started = time.time()
+        try:
+            for child in iter_playlist_jobs(job, skip=submitted):
+                if job.cancelled:
+                    break
+                submitted.add(child.entry_key)
+                outcomes.append(submit(child) if submit else run_download(child))
+            job.attempts.append({'attempt': attempt + 1, 'seconds': round(time.time() - started, 3), 'error': None})
+            job.error = None
+            break
+        except Exception as e:
+            job.error = str(e)
+            job.attempts.append({'attempt': attempt + 1, 'seconds': round(time.time() - started, 3), 'error': job.error})
+            job_print(job, f"\n❌ Playlist Error: {e}")
+
+    if job.sync and not job.error and not job.cancelled:
+        job.sync.save(job.title)
+        job_print(job, "\n" + job.sync.summary())
+    if job.entries_skipped:
+        job_print(job, f"\n⏭️ Skipped {job.entries_skipped} videos already downloaded")
+    results = [outcome.result() if submit else outcome for outcome in outcomes]
+    failed = results.count(False)
+    job.entries_total = len(job.done_entries) + failed
+    job.entries_failed = failed
+    if job.cancelled:
+        log_download(url, f"Playlist: {job.title}", mode, "Cancelled", job.config)
+        job.status = "Cancelled"
+        return False
+    if not failed and not job.error and job.entries_total:
+        log_download(url, f"Playlist: {job.title} ({mode_text(mode)})", mode, "Success", job.config)
+        job.status = "Success"
+        return True
+
+    reason = job.error or f"{failed} of {job.entries_total} entries"
+    log_download(url, f"Playlist: {job.title}", mode, f"Failed: {reason}", job.config)
+    job.status = "Failed"
+    return False
+
+def download_attempt(job):
+    """Make one download attempt, recording its timing and failure reason.
+
+    FFmpeg work (merging, MP3 extraction) is not run here: it is left in
+    job.postprocessing for finish_download.
+    """
+    import segmented
+
+    segmented.register()
+
+    url = job.url
+    job.status = "Downloading"
+    job.retryable = True
+    started = time.time()
+    attempt = {'attempt': len(job.attempts) + 1, 'seconds': None, 'error': None}
+    job.attempts.append(attempt)
+    ydl = None
 
     try:
-        # Show content info before downloading
-        print("\n🔍 Fetching information...")
-        url_info = get_url_info(url, config)
+        job_print(job,
+                  f"\n🚀 Starting download: {job.title}",
+                  f"📁 Download location: {job.download_dir}",
+                  "")  # Empty line before progress starts
         
-        if url_info:
-            if url_info['type'] == 'playlist':
-                print("\n" + "─" * 50)
-                print("📂 PLAYLIST INFORMATION")
-                print("─" * 50)
-                print(f"📺 Playlist: {url_info['title']}")
-                print(f"👤 Channel: {url_info['uploader']}")
-                print(f"🎬 Total Videos: {url_info['video_count']}")
-                print(f"📥 Mode: {mode_text(mode)}")
-                print("\n📹 First few videos:")
-                for i, video_title in enumerate(url_info['videos'], 1):
-                    print(f"  {i}. {video_title}")
-                print("─" * 50)
-                
-                # Update output template for playlists
-                if mode == "1":
-                    ydl_opts["outtmpl"] = os.path.join(str(DOWNLOAD_DIR), "%(playlist_title)s", "%(title)s.%(ext)s")
-                elif mode == "2":
-                    ydl_opts["outtmpl"] = os.path.join(str(DOWNLOAD_DIR), "%(playlist_title)s", "%(title)s.%(ext)s")
-                
-                confirm = input(f"\n🚀 Download {url_info['video_count']} videos as {mode_text(mode).upper()}? (y/n): ").lower().strip()
-                if confirm != 'y':
-                    print("❌ Download cancelled.")
-                    return
-                    
-            else:
-                # Single video
-                print("\n" + "─" * 50)
-                print("📹 VIDEO INFORMATION")
-                print("─" * 50)
-                print(f"📺 Title: {url_info['title']}")
-                print(f"👤 Channel: {url_info['uploader']}")
-                print(f"⏱️ Duration: {format_duration(url_info['duration'])}")
-                print(f"👀 Views: {url_info['view_count']:,}")
-                print(f"📅 Upload date: {url_info['upload_date']}")
-                print(f"📥 Mode: {mode_text(mode)}")
-                print("─" * 50)
-        
-        print(f"\n🚀 Starting download...")
-        print("📁 Download location:", DOWNLOAD_DIR)
-        print()  # Empty line before progress starts
-        
-        with YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
+        deferred = []
+        ydl_opts = build_ydl_opts(job)
+        bandwidth_scheduler.configure(job.config)
+        job.bandwidth = ydl_opts["bandwidth_consumer"] = bandwidth_scheduler.register(job)
+        # Held until finish_download, which runs the deferred post-processing on it
+        ydl = ydl_sessions.acquire(ydl_opts)
+        with job.bandwidth:
+            if job.mode == "2" and job.config.get('stream_mp3', True):
+                # Progressive audio goes straight into the MP3 encoder; FFmpegExtractAudio
+                # then only converts formats that could not be streamed
+                ydl.add_post_processor(segmented.StreamAudioPP(ydl, MP3_QUALITY), when='video')
+            # Collect post-processing instead of running it on this thread
+            ydl.post_process = lambda filename, info, files_to_move=None: deferred.append(
+                (filename, info, files_to_move)) or info
 
-            # Log successful download
-            if url_info and url_info['type'] == 'playlist':
-                log_download(url, f"Playlist: {url_info['title']} ({mode_text(mode)})", mode, "Success")
-            else:
-                try:
-                    filename = ydl.prepare_filename(info)
-                    log_download(url, os.path.basename(filename), mode, "Success")
-                except:
-                    log_download(url, "Unknown", mode, "Success")
+            # Download straight from the info resolved during preview if there is one
+            info = job.info
+            with job.metrics.span("extract"):
+                if info is None:
+                    info = ydl.extract_info(url, download=False, process=False)
+                while info.get('_type') == 'url':
+                    info = ydl.extract_info(info['url'], download=False, process=False, ie_key=info.get('ie_key'))
+            info = ydl.process_ie_result(info, download=True, extra_info=job.extra_info)
+
+            job.archive_id = archive_id(info) or job.archive_id
+            downloads = info.get('requested_downloads') or [{}]
+            try:
+                job.filename = downloads[0].get('filepath') or ydl.prepare_filename(info)
+            except Exception:
+                job.filename = None
+        job.postprocessing = (ydl, deferred)
+        job.status = "Downloaded"
+        job.error = None
+        return True
             
     except Exception as e:
-        error_msg = str(e)
-        print(f"\n❌ Download Error: {error_msg}")
-        
+        job.error = attempt['error'] = str(e)
+        if ydl is not None:
+            ydl_sessions.release(ydl)
+        disk_space.release(job)
+        if is_disk_full(e):
+            # Retrying against a full disk would only fail again
+            job.retryable = False
+        if not job.cancelled:
+            job_print(job, f"\n❌ Download Error: {job.error}")
+        return False
+    finally:
+        job.bandwidth = None
+        job.metrics.stop_all()
+        attempt['seconds'] = round(time.time() - started, 3)
+
+_publish_slots = None
+_publish_slots_lock = threading.Lock()
+
+def publish_slots(config):
+    """Semaphore bounding simultaneous cross-filesystem copies"""
+    global _publish_slots
+    with _publish_slots_lock:
+        if _publish_slots is None:
+            _publish_slots = threading.BoundedSemaphore(max(1, int(config.get('publish_copies', 2))))
+    return _publish_slots
+
+def publish_file(job, path):
+    """Move a finished file from the staging folder to the download folder.
+
+    The file keeps its path relative to the staging folder. On the same
+    filesystem this is one atomic rename. Otherwise it is copied once under
+    a hidden temporary name and renamed into place, so nobody reading the
+    download folder sees a partial file.
+    """
+    staging = staging_dir(job)
+    path = Path(path)
+    try:
+        relative = path.resolve().relative_to(staging.resolve())
+    except ValueError:
+        return str(path)  # Not produced in staging (e.g. an existing file)
+    target = job.download_dir / relative
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.replace(path, target)
+        return str(target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    partial = target.with_name(f".{target.name}.publishing")
+    with publish_slots(job.config):
+        try:
+            # copyfile streams kernel-side (sendfile/fcopyfile) where available
+            shutil.copyfile(path, partial)
+            shutil.copystat(path, partial)
+            os.replace(partial, target)
+        except BaseException:
+            if partial.exists():
+                partial.unlink()
+            raise
+    os.remove(path)
+    return str(target)
+
+def finish_download(job):
+    """Second pipeline stage: run the job's deferred FFmpeg work and report the result"""
+    ydl, deferred = job.postprocessing
+    job.postprocessing = None
+    if job.cancelled:
+        # The raw download is left in place; nothing is merged or converted
+        ydl_sessions.release(ydl)
+        return cancel_download(job)
+    job.status = "Processing"
+    # Drop the deferring override so the real post-processing runs
+    del ydl.post_process
+
+    error = None
+    try:
+        for filename, info, files_to_move in deferred:
+            info = ydl.post_process(filename, info, files_to_move)
+            job.filename = info.get('filepath') or filename
+    except Exception as e:
+        error = f"Postprocessing: {e}"
+    finally:
+        ydl_sessions.release(ydl)
+    if not error:
+        try:
+            if job.filename and staging_dir(job):
+                with job.metrics.span("publish"):
+                    job.filename = publish_file(job, job.filename)
+        except OSError as e:
+            # The finished file stays in the staging folder
+            error = f"Publishing: {e}"
+    disk_space.release(job)
+    if error:
+        job.error = error
+        job_print(job, f"\n❌ Download Error: {job.error}")
+        if not job.parent:
+            log_download(job.url, "Unknown", job.mode, f"Failed: {job.error}", job.config)
+        job.status = "Failed"
+        job.metrics.stop_all()
+        record_metrics(job)
+        return False
+    job.metrics.stop_all()
+
+    archive = get_download_archive(job.config)
+    if archive and job.archive_id:
+        archive.add(job.archive_id, archive_mode(job), job.filename, job.title)
+
+    # Log successful download; playlist entries are logged by the playlist
+    if job.parent:
+        job.parent.done_entries.add(job.entry_key)
+    else:
+        log_download(job.url, os.path.basename(job.filename) if job.filename else "Unknown",
+                     job.mode, "Success", job.config)
+    job.status = "Success"
+    print_completed(job, job.filename)
+    record_metrics(job)
+    return True
+
+def run_download(job, pipelined=False):
+    """Non-interactive part of a download; safe to run on a worker thread.
+
+    Failed attempts are retried in a loop with exponential backoff. yt-dlp
+    resumes the .part file left behind, so bytes already fetched are kept.
+    With pipelined=True a successful download that still needs FFmpeg
+    returns with job.postprocessing set, and the caller runs finish_download.
+    """
+    if job.is_playlist:
+        return run_playlist(job)
+    if job.cancelled:
+        return cancel_download(job)
+
+    archive = get_download_archive(job.config)
+    if archive and job.archive_id and not job.parent:
+        filename = archive.lookup(job.archive_id, archive_mode(job))
+        if filename is not None and archived_file_exists(filename):
+            job.status = "Skipped"
+            job.filename = filename or None
+            job_print(job, f"\n⏭️ Already downloaded: {job.title}")
+            return True
+
+    job.metrics.add("queue_wait", max(0.0, time.time() - job.queued_at))
+    try:
+        for attempt in range(max_attempts(job.config)):
+            if attempt:
+                wait_before_retry(job, attempt)
+            if job.cancelled:
+                return cancel_download(job)
+            if download_attempt(job):
+                if pipelined and job.postprocessing[1]:
+                    return True
+                return finish_download(job)
+            if not job.retryable:
+                break
+        if job.cancelled:
+            return cancel_download(job)
+
         # Log failed download
-        url_info = get_url_info(url, config)
-        if url_info and url_info['type'] == 'playlist':
-            log_download(url, f"Playlist: {url_info.get('title', 'Unknown')}", mode, f"Failed: {error_msg}")
+        if not job.parent:
+            attempts = len(job.attempts)
+            log_download(job.url, "Unknown", job.mode, f"Failed: {job.error} (after {attempts} attempts)", job.config)
+        job.status = "Failed"
+        record_metrics(job)
+        return False
+    finally:
+        progress_display.remove(job)
+
+def cancel_download(job):
+    """Mark a single download as cancelled; partial files are kept for a later resume"""
+    disk_space.release(job)
+    job.status = "Cancelled"
+    job.error = None
+    job_print(job, f"\n⏹️ Cancelled: {job.title}")
+    if not job.parent:
+        log_download(job.url, job.title, job.mode, "Cancelled", job.config)
+    record_metrics(job)
+    return False
+
+class DownloadQueue:
+    """Bounded worker pool that runs queued DownloadJobs concurrently.
+
+    With a JobStore, every submitted job is recorded before it is queued
+    and its status is kept up to date, so resume() can pick up the work
+    of a process that crashed.
+    """
+
+    def __init__(self, max_workers, store=None):
+        self.max_workers = max(1, int(max_workers))
+        self.store = store
+        # Set by stop(); jobs cancelled from then on stay queued in the store
+        self._stopping = False
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix="download")
+        # Playlist jobs only enumerate entries and wait, so they get their own threads
+        self._playlist_executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                     thread_name_prefix="playlist")
+        # FFmpeg merges and transcodes overlap with downloads; FFmpeg itself does the CPU work
+        self._postprocess_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1,
+                                                        thread_name_prefix="postprocess")
+        # Keeps playlist enumeration from running far ahead of the workers
+        self._entry_slots = threading.BoundedSemaphore(self.max_workers * 2)
+        self._lock = threading.Lock()
+        self._futures = {}  # future -> job
+
+    def _track(self, future, job):
+        with self._lock:
+            self._futures = {f: j for f, j in self._futures.items() if not f.done()}
+            self._futures[future] = job
+        return future
+
+    def submit(self, job):
+        job.queued_at = time.time()
+        if self.store and job.store_id is None:
+            try:
+                self.store.add(job)
+            except sqlite3.Error:
+                pass
+        if job.info is None and job.url_info is None:
+            # Not previewed yet: resolve on a coordinator thread, then route
+            future = self._playlist_executor.submit(self._resolve_and_run, job)
+        elif job.is_playlist:
+            future = self._playlist_executor.submit(self._run_playlist, job)
         else:
-            log_download(url, "Unknown", mode, f"Failed: {error_msg}")
-        
-        if config.get('auto_retry', True) and retry_count < config.get('max_retries', 3):
-            retry_count += 1
-            print(f"🔄 Retrying... Attempt {retry_count} of {config.get('max_retries', 3)}")
-            time.sleep(2)
-            download_content(url, mode, config, retry_count)
+            future = self._submit_download(job)
+        if job.store_id is not None:
+            future.add_done_callback(lambda f: self._store_finished(job))
+        return self._track(future, job)
+
+    def resume(self, config):
+        """Re-submit the jobs a crashed process left unfinished.
+
+        Returns (job, future) pairs; finished playlist entries and the
+        .part files already on disk are reused.
+        """
+        if not self.store:
+            return []
+        try:
+            jobs = self.store.interrupted(config)
+        except sqlite3.Error:
+            return []
+        return [(job, self.submit(job)) for job in jobs]
+
+    def _store_update(self, update, *args):
+        try:
+            update(*args)
+        except sqlite3.Error:
+            # The store is a safety net; a locked or full database never fails a download
+            pass
+
+    def _store_started(self, job):
+        if job.store_id is not None:
+            self._store_update(self.store.set_running, job)
+
+    def _store_finished(self, job):
+        if job.status == "Cancelled" and self._stopping:
+            return
+        # A worker that raised leaves an in-progress status behind
+        unfinished = job.status in ("Queued", "Resolving", "Waiting", "Downloading", "Downloaded", "Processing")
+        self._store_update(self.store.finish, job, "failed" if unfinished else None)
+
+    def _run_playlist(self, job):
+        self._store_started(job)
+        return self._run_entries(job)
+
+    def _run_entries(self, job):
+        """Download a resolved playlist's entries on this queue's workers"""
+        return run_playlist(job, self._submit_entry)
+
+    def _submit_download(self, job):
+        """Future that resolves once the job is downloaded and post-processed"""
+        result = Future()
+
+        def relay(future):
+            try:
+                result.set_result(future.result())
+            except BaseException as e:
+                result.set_exception(e)
+
+        def downloaded(future):
+            if future.exception() is None and job.postprocessing:
+                # Free the download worker; FFmpeg runs on the post-processing pool
+                self._postprocess_executor.submit(finish_download, job).add_done_callback(relay)
+            else:
+                relay(future)
+
+        self._executor.submit(self._run_download, job).add_done_callback(downloaded)
+        return result
+
+    def _run_download(self, job):
+        if not job.parent:
+            self._store_started(job)
+        return run_download(job, pipelined=True)
+
+    def _resolve_and_run(self, job):
+        self._store_started(job)
+        job.status = "Resolving"
+        for attempt in range(max_attempts(job.config)):
+            if attempt:
+                wait_before_retry(job, attempt)
+            if job.cancelled:
+                return cancel_download(job)
+            started = time.time()
+            try:
+                resolve_job(job)
+                break
+            except Exception as e:
+                job.error = str(e)
+                job.attempts.append({'attempt': attempt + 1, 'seconds': round(time.time() - started, 3), 'error': job.error})
         else:
-            retry = input("\n🔄 Retry download? (y/n): ").lower().strip()
-            if retry == 'y':
-                download_content(url, mode, config)
+            job.status = "Failed"
+            log_download(job.url, "Unknown", job.mode, f"Failed: {job.error} (after {len(job.attempts)} attempts)", job.config)
+            record_metrics(job)
+            return False
+        if job.is_playlist:
+            return self._run_entries(job)
+        # Back in line for a download worker
+        job.status = "Queued"
+        job.queued_at = time.time()
+        return self._submit_download(job).result()
+
+    def _submit_entry(self, job):
+        self._entry_slots.acquire()
+        job.queued_at = time.time()
+        future = self._submit_download(job)
+        # Held until post-processing is done, which bounds the raw files waiting for FFmpeg
+        future.add_done_callback(lambda f: self._entry_slots.release())
+        if self.store and job.parent.store_id is not None:
+            def entry_finished(future):
+                if future.exception() is None and future.result():
+                    self._store_update(self.store.entry_done, job.parent, job.entry_key)
+            future.add_done_callback(entry_finished)
+        return self._track(future, job)
+
+    def pending(self):
+        with self._lock:
+            return sum(1 for f in self._futures if not f.done())
+
+    def wait(self):
+        """Block until every submitted job has finished"""
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                pass
+
+    def unfinished(self):
+        """Top-level jobs that are queued or still running"""
+        with self._lock:
+            return [job for future, job in self._futures.items() if not future.done() and not job.parent]
+
+    def stop(self):
+        """Cancel every unfinished job but keep it queued in the store for the next start.
+
+        Returns the number of jobs cancelled; call shutdown() afterwards.
+        """
+        self._stopping = True
+        jobs = self.unfinished()
+        for job in jobs:
+            job.cancel()
+        return len(jobs)
+
+    def shutdown(self):
+        self._playlist_executor.shutdown(wait=True)
+        self.wait()
+        self._executor.shutdown(wait=True)
+        self._postprocess_executor.shutdown(wait=True)
 
 def change_download_folder():
     """Change the download folder"""
@@ -487,7 +2676,7 @@ def settings_menu(config):
         print_banner()
         print_settings_menu()
         
-        choice = input("Select an option (1-6): ").strip()
+        choice = input("Select an option (1-10): ").strip()
         
         if choice == "1":
             change_download_folder()
@@ -510,35 +2699,340 @@ def settings_menu(config):
             status = "enabled" if quiet_mode else "disabled"
             print(f"✅ Quiet mode {status}")
         elif choice == "5":
+            value = input(f"⚡ Max parallel downloads (current: {config.get('max_downloads', 5)}): ").strip()
+            if value.isdigit() and int(value) > 0:
+                config['max_downloads'] = int(value)
+                save_config(config)
+                print(f"✅ Max parallel downloads set to {value} (applies on next start)")
+            else:
+                print("❌ Please enter a positive number.")
+        elif choice == "6":
+            value = input(f"🔀 Connections per download, 1 to disable (current: {config.get('download_connections', 4)}): ").strip()
+            if value.isdigit() and int(value) > 0:
+                config['download_connections'] = int(value)
+            elif value:
+                print("❌ Please enter a positive number.")
+            value = input(f"📦 Chunk size in MB (current: {config.get('chunk_size_mb', 10)}): ").strip()
+            if value.isdigit() and int(value) > 0:
+                config['chunk_size_mb'] = int(value)
+            elif value:
+                print("❌ Please enter a positive number.")
+            save_config(config)
+            print(f"✅ {config.get('download_connections', 4)} connections, {config.get('chunk_size_mb', 10)} MB chunks")
+        elif choice == "7":
+            value = input(f"🚦 Bandwidth limit in Mbps, 0 for unlimited (current: {config.get('bandwidth_limit_mbps', 0)}): ").strip()
+            try:
+                limit = float(value)
+            except ValueError:
+                limit = -1
+            if limit >= 0:
+                config['bandwidth_limit_mbps'] = limit
+                save_config(config)
+                print(f"✅ Bandwidth limit set to {f'{limit:g} Mbps' if limit else 'unlimited'}")
+                if config.get('bandwidth_schedule'):
+                    print("ℹ️  Time windows in 'bandwidth_schedule' still take precedence.")
+            else:
+                print("❌ Please enter a number of 0 or more.")
+        elif choice == "8":
             confirm = input("🧹 Are you sure you want to clear download history? (y/n): ").lower()
             if confirm == 'y':
-                log_file = BASE_DIR / "download_history.json"
                 try:
-                    if os.path.exists(log_file):
-                        os.remove(log_file)
+                    clear_history()
                     print("✅ Download history cleared.")
                 except Exception as e:
                     print(f"❌ Error clearing history: {e}")
-        elif choice == "6":
+        elif choice == "9":
+            cache = get_metadata_cache(config)
+            if cache:
+                stats = cache.stats()
+                print(f"🗃️  Cached items: {stats['entries']} | Hits: {stats['hits']} | Misses: {stats['misses']}")
+                confirm = input("🧹 Clear the metadata cache? (y/n): ").lower()
+                if confirm == 'y':
+                    cache.clear()
+                    print("✅ Metadata cache cleared.")
+            else:
+                print("ℹ️  Metadata cache is disabled.")
+        elif choice == "10":
             break
         else:
-            print("❌ Invalid choice. Please select 1-6.")
+            print("❌ Invalid choice. Please select 1-10.")
         
         input("\nPress Enter to continue...")
 
+def is_youtube_url(url):
+    return "youtube.com" in url or "youtu.be" in url
+
+BATCH_MODES = {"video": "1", "mp3": "2"}
+
+def parse_batch_args(argv):
+    """Parse command line arguments for headless batch mode"""
+    parser = argparse.ArgumentParser(
+        prog="Downloader.py",
+        description="Download YouTube videos and playlists without prompts. "
+                    "One JSON result per input URL is written to stdout.")
+    parser.add_argument("urls", nargs="*", metavar="URL", help="video or playlist URLs")
+    parser.add_argument("-i", "--input", metavar="FILE", action="append", default=[],
+                        help="read URLs from FILE, one per line ('-' for stdin)")
+    parser.add_argument("-m", "--mode", default="video",
+                        help="'video', 'mp3' or a yt-dlp format string (default: video)")
+    parser.add_argument("-S", "--prefer", metavar="PREFERENCE",
+                        help="format preference such as '<=1080p, avc1, smallest'")
+    parser.add_argument("-p", "--priority", choices=sorted(PRIORITY_WEIGHTS),
+                        help="bandwidth priority (default: normal, low for playlist entries)")
+    parser.add_argument("-o", "--output", metavar="DIR", help="download folder")
+    parser.add_argument("-j", "--jobs", type=int, help="parallel downloads (default: max_downloads)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show progress on stdout")
+    parser.add_argument("--sync", action="store_true",
+                        help="only fetch playlist entries added since the last sync")
+    parser.add_argument("--full-sync", action="store_true",
+                        help="like --sync, but walk whole playlists to detect removed entries")
+    parser.add_argument("--resume", action="store_true",
+                        help="also resume jobs left unfinished by a run that crashed or was interrupted")
+    parser.add_argument("--import-archive", action="store_true",
+                        help="record existing downloads (history and download folder) in the archive and exit")
+    return parser.parse_args(argv)
+
+def read_batch_urls(args):
+    """Collect URLs from arguments and input files, skipping blanks and comments"""
+    urls = list(args.urls)
+    for source in args.input:
+        if source == "-":
+            lines = sys.stdin.read().splitlines()
+        else:
+            with open(source, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        urls.extend(line.strip() for line in lines)
+    return [url for url in urls if url and not url.startswith("#")]
+
+def batch_result(job):
+    """Machine-readable summary of a finished job"""
+    result = {
+        "url": job.url,
+        "mode": mode_text(job.mode),
+        "status": job.status.lower(),
+        "title": job.url_info.get('title') if job.url_info else None,
+        "filename": job.filename,
+        "error": job.error,
+        "attempts": job.attempts,
+    }
+    if job.is_playlist:
+        result["entries"] = job.entries_total
+        result["failed_entries"] = job.entries_failed
+        result["skipped_entries"] = job.entries_skipped
+        if job.sync:
+            result["sync"] = {
+                "added": job.sync.added,
+                "removed": job.sync.removed,
+                "entries_seen": len(job.sync.seen),
+                "full": job.sync.full and not job.sync.stopped_early,
+            }
+    return result
+
+def batch_main(argv):
+    """Headless entry point: download every URL and exit with a status code.
+
+    Exit status is 0 when every item succeeded or was already downloaded,
+    1 when any item failed or was rejected and 2 for usage errors.
+    """
+    args = parse_batch_args(argv)
+    if args.import_archive:
+        config = load_config()
+        if args.output:
+            config['download_dir'] = os.path.expanduser(args.output)
+        archive = get_download_archive(dict(config, download_archive=True))
+        if archive is None:
+            print(f"❌ Cannot open the download archive: {ARCHIVE_FILE}", file=sys.stderr)
+            return 1
+        added = import_download_archive(archive, config, playlists=True)
+        print(f"🗄️  Imported {added} downloads ({archive.count()} in the archive)")
+        return 0
+
+    try:
+        urls = read_batch_urls(args)
+    except OSError as e:
+        print(f"❌ Cannot read URL list: {e}", file=sys.stderr)
+        return 2
+    if not urls and not args.resume:
+        print("❌ No URLs given", file=sys.stderr)
+        return 2
+
+    config = load_config()
+    config['quiet_mode'] = not args.verbose
+    mode = BATCH_MODES.get(args.mode.lower(), "3")
+    fmt = None if mode != "3" else args.mode
+    format_sort = None
+    if args.prefer:
+        try:
+            # The preference orders the formats -m chooses from
+            format_sort = parse_format_preference(args.prefer)[1]
+        except ValueError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 2
+    download_dir = Path(os.path.expanduser(args.output or config.get('download_dir', DOWNLOAD_DIR)))
+    download_dir.mkdir(parents=True, exist_ok=True)
+
+    queue = DownloadQueue(args.jobs or config.get('max_downloads', 5), store=get_job_store(config))
+    results = []
+
+    def report(job):
+        result = batch_result(job)
+        results.append(result)
+        with print_lock:
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+
+    for url in urls:
+        job = DownloadJob(url, mode, config, download_dir=download_dir, fmt=fmt)
+        job.format_sort = format_sort
+        job.priority = args.priority
+        if args.sync or args.full_sync:
+            job.sync_mode = "full" if args.full_sync else "incremental"
+        if not is_youtube_url(url):
+            job.status = "Rejected"
+            job.error = "Not a YouTube URL"
+            report(job)
+            continue
+        queue.submit(job).add_done_callback(lambda f, job=job: report(job))
+    if args.resume:
+        for job, future in queue.resume(config):
+            future.add_done_callback(lambda f, job=job: report(job))
+
+    try:
+        queue.shutdown()
+    except KeyboardInterrupt:
+        # Unfinished jobs stay in the job store for the next --resume
+        queue.stop()
+        queue.shutdown()
+        raise
+    return 0 if all(result["status"] in ("success", "skipped") for result in results) else 1
+
+def submit_watched(queue, job, failed):
+    """Queue a menu download; if it fails, it is added to `failed` for offer_retry"""
+    def done(future):
+        try:
+            ok = future.result()
+        except Exception:
+            ok = False
+        if not ok and job.status == "Failed":
+            failed.append(job)
+
+    queue.submit(job).add_done_callback(done)
+
+def offer_retry(queue, failed):
+    """Offer to re-run the menu downloads that failed since the last prompt.
+
+    Re-running the same job keeps finished playlist entries and .part files.
+    """
+    jobs = []
+    while failed:
+        jobs.append(failed.pop(0))
+    if not jobs:
+        return
+    print(f"\n❌ {len(jobs)} download(s) failed:")
+    for job in jobs[:5]:
+        reason = job.error or f"{job.entries_failed} of {job.entries_total} entries"
+        print(f"  • {job.title}: {reason}")
+    if len(jobs) > 5:
+        print(f"  • ... and {len(jobs) - 5} more")
+    if any(not job.retryable for job in jobs):
+        print("💾 Free up disk space (or choose another download folder) before retrying.")
+    if input("\n🔄 Retry download? (y/n): ").lower().strip() == 'y':
+        for job in jobs:
+            submit_watched(queue, job, failed)
+        print(f"📥 Added to download queue ({queue.pending()} active/queued)")
+
+def unfinished_progress(job):
+    """How far an unfinished job got, for the exit prompt"""
+    if job.is_playlist:
+        total = job.entries_total or "?"
+        return f"{len(job.done_entries)} of {total} entries done"
+    progress = job.progress or {}
+    if job.status == "Downloading" and progress.get('total_bytes'):
+        return f"{progress['downloaded_bytes'] / progress['total_bytes']:.0%} downloaded"
+    return job.status.lower()
+
+def confirm_exit(queue):
+    """Ask whether to wait for or cancel unfinished downloads; False to stay in the menu"""
+    jobs = queue.unfinished()
+    if not jobs:
+        return True
+    print(f"\n⏳ {len(jobs)} download(s) are not finished:")
+    for job in jobs[:5]:
+        print(f"  • {job.title} ({unfinished_progress(job)})")
+    if len(jobs) > 5:
+        print(f"  • ... and {len(jobs) - 5} more")
+    if queue.store:
+        print("ℹ️  Cancelled downloads are offered again on the next start; partial files are kept.")
+    else:
+        print("⚠️  Cancelled downloads are dropped from the queue; partial files are kept.")
+    while True:
+        choice = input("\n⏹️  [w]ait for them, [c]ancel them or go [b]ack to the menu? (w/c/b): ").lower().strip()
+        if choice == "w":
+            print("⏳ Waiting for the downloads to finish (Ctrl+C cancels them)...")
+            queue.wait()
+            return True
+        if choice == "c":
+            return True
+        if choice == "b":
+            return False
+        print("❌ Please enter w, c or b")
+
+def stop_queue(queue):
+    """Cancel unfinished downloads instead of waiting for them"""
+    stopped = queue.stop()
+    if stopped:
+        kept = "they resume on the next start" if queue.store else "partial files are kept"
+        print(f"\n⏹️  Stopping {stopped} unfinished download(s); {kept}")
+    queue.shutdown()
+
+def resume_interrupted(queue, config, failed):
+    """Offer to resume the downloads an earlier session did not finish"""
+    try:
+        jobs = queue.store.interrupted(config) if queue.store else []
+    except sqlite3.Error:
+        return
+    if not jobs:
+        return
+    print(f"\n♻️  {len(jobs)} download(s) from an earlier session did not finish:")
+    for job in jobs[:5]:
+        print(f"  • {job.url} ({mode_text(job.mode)})")
+    if len(jobs) > 5:
+        print(f"  • ... and {len(jobs) - 5} more")
+    if input("♻️  Resume them now? (y/n): ").lower().strip() == 'y':
+        for job in jobs:
+            submit_watched(queue, job, failed)
+        print(f"📥 Added to download queue ({queue.pending()} active/queued)")
+        return
+    try:
+        for job in jobs:
+            job.status = "Cancelled"
+            queue.store.finish(job)
+    except sqlite3.Error:
+        pass
+
 def main():
     """Main application function"""
     config = load_config()
     global DOWNLOAD_DIR
     DOWNLOAD_DIR = Path(config.get('download_dir', DOWNLOAD_DIR))
     os.makedirs(DOWNLOAD_DIR, exist_ok=True)
-    
+    queue = DownloadQueue(config.get('max_downloads', 5), store=get_job_store(config))
+    failed = []  # Menu downloads that failed; filled from worker threads
+
     clear_screen()
     print_banner()
     print(f"✨ Welcome to PRO YouTube Downloader ✨")
     print(f"📁 Download location: {DOWNLOAD_DIR}")
-    
+    try:
+        resume_interrupted(queue, config, failed)
+        menu_loop(queue, config, failed)
+    except KeyboardInterrupt:
+        # Joining the workers here would block until every download finished
+        stop_queue(queue)
+        raise
+
+def menu_loop(queue, config, failed):
     while True:
+        offer_retry(queue, failed)
         print_menu()
         choice = input("Select an option (1-6): ").strip()
         
@@ -555,11 +3049,14 @@ def main():
                     print("❌ Please enter a valid URL")
                     continue
                     
-                if "youtube.com" not in url and "youtu.be" not in url:
+                if not is_youtube_url(url):
                     print("❌ Please enter a valid YouTube URL")
                     continue
                     
-                download_content(url, choice, config)
+                job = prepare_download(url, choice, config)
+                if job:
+                    submit_watched(queue, job, failed)
+                    print(f"📥 Added to download queue ({queue.pending()} active/queued)")
                 
                 again = input("\n📥 Download another file? (y/n): ").lower().strip()
                 if again != "y":
@@ -581,6 +3078,9 @@ def main():
             
         elif choice == "6":
             # Exit
+            if not confirm_exit(queue):
+                continue
+            stop_queue(queue)
             print("\n👋 Thanks for using PRO Downloader. Goodbye!")
             print(f"📂 Your files are saved in: {DOWNLOAD_DIR}")
             break
@@ -589,6 +3089,12 @@ def main():
             print("❌ Invalid choice. Please select 1-6.")
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # Headless batch mode
+        try:
+            sys.exit(batch_main(sys.argv[1:]))
+        except KeyboardInterrupt:
+            sys.exit(130)
     try:
         main()
     except KeyboardInterrupt:
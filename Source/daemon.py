@@ -0,0 +1,475 @@
+"""
+Background download service with a local HTTP/JSON API.
+
+    python Source/daemon.py [--host 127.0.0.1] [--port 8770] [-j 5]
+
+Jobs run on the same DownloadQueue as the interactive menu and batch mode;
+the asyncio loop only parses requests and publishes progress, so it stays
+responsive however many jobs are queued. yt-dlp is imported and its YouTube
+extractors set up once at startup instead of on the first request. Jobs
+are kept in the job store, so work left by a crash or a stop resumes when
+the daemon starts again.
+
+    GET    /health            service status
+    POST   /jobs              enqueue {"url" | "urls", "mode", "prefer", "priority", "output", "sync"}
+    GET    /jobs              list jobs (?status=downloading, ?parent=ID for playlist entries)
+                              status: queued, resolving, waiting, downloading, downloaded,
+                              processing, then success, skipped, failed, cancelled or rejected
+    GET    /jobs/ID           one job
+    DELETE /jobs/ID           cancel a job; partial files are kept
+    GET    /events            server-sent events with job snapshots (?job=ID)
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import signal
+import sys
+import threading
+from concurrent.futures import Future
+from http import HTTPStatus
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import Downloader
+
+# Seconds between progress event batches
+EVENT_INTERVAL = 0.5
+# Seconds of silence before an SSE comment keeps idle connections open
+KEEPALIVE_INTERVAL = 15
+# Finished jobs kept for GET /jobs; older ones are forgotten first
+MAX_FINISHED_JOBS = 1000
+MAX_BODY_SIZE = 1024 * 1024
+# Events buffered per SSE client before a slow client is dropped
+SUBSCRIBER_BACKLOG = 1000
+SYNC_MODES = {True: "incremental", "incremental": "incremental", "full": "full"}
+
+
+class JobRegistry:
+    """Jobs submitted to the daemon, plus the playlist entries they spawn.
+
+    Playlist threads add entries while the event loop reads, so every
+    access goes through one lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._jobs = {}  # id -> (job, parent id, future), in submission order
+        self._job_ids = {}  # job -> id
+        self._active = set()
+        self._published = {}  # id -> last snapshot sent to event subscribers
+
+    def add(self, job, future):
+        with self._lock:
+            job_id = str(next(self._ids))
+            parent_id = self._job_ids.get(job.parent) if job.parent else None
+            self._jobs[job_id] = (job, parent_id, future)
+            self._job_ids[job] = job_id
+            self._active.add(job_id)
+            self._prune()
+        return job_id
+
+    def _prune(self):
+        finished = [job_id for job_id, (job, parent_id, future) in self._jobs.items()
+                    if future.done() and job_id not in self._active]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            job = self._jobs.pop(job_id)[0]
+            self._job_ids.pop(job, None)
+            self._published.pop(job_id, None)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def snapshot(self, job_id):
+        with self._lock:
+            entry = self._jobs.get(job_id)
+        return job_snapshot(job_id, *entry) if entry else None
+
+    def snapshots(self, status=None, parent=None):
+        with self._lock:
+            entries = list(self._jobs.items())
+        snapshots = (job_snapshot(job_id, *entry) for job_id, entry in entries
+                     if parent is None or entry[1] == parent)
+        return [snapshot for snapshot in snapshots if status is None or snapshot["status"] == status]
+
+    def counts(self):
+        with self._lock:
+            return len(self._jobs), len(self._active)
+
+    def changes(self):
+        """Snapshots of active jobs that changed since the last call"""
+        with self._lock:
+            entries = [(job_id, self._jobs[job_id]) for job_id in self._active]
+        changed = []
+        for job_id, entry in entries:
+            snapshot = job_snapshot(job_id, *entry)
+            if snapshot["finished"]:
+                with self._lock:
+                    self._active.discard(job_id)
+            if self._published.get(job_id) != snapshot:
+                self._published[job_id] = snapshot
+                changed.append(snapshot)
+        return changed
+
+
+def job_snapshot(job_id, job, parent_id, future):
+    """JSON view of a job: the batch mode result plus live progress"""
+    snapshot = Downloader.batch_result(job)
+    snapshot.update({
+        "id": job_id,
+        "parent": parent_id,
+        "attempts": len(job.attempts),
+        "finished": future.done(),
+        "progress": job.progress if job.status == "Downloading" else None,
+    })
+    if job.is_playlist:
+        snapshot["entries_done"] = len(job.done_entries)
+    return snapshot
+
+
+class DaemonQueue(Downloader.DownloadQueue):
+    """DownloadQueue that registers playlist entries as jobs of their own"""
+
+    def __init__(self, max_workers, registry, store=None):
+        super().__init__(max_workers, store)
+        self.registry = registry
+
+    def _submit_entry(self, job):
+        future = super()._submit_entry(job)
+        self.registry.add(job, future)
+        return future
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def warm_up():
+    """Import yt-dlp and build the YouTube extractors before the first request.
+
+    Its cookie jar and connections stay in the session pool, so the first
+    lookup reuses them.
+    """
+    import segmented
+
+    segmented.register()
+    Downloader.get_ffmpeg_location()
+    with Downloader.ydl_sessions.session(Downloader.INFO_PARAMS) as ydl:
+        for ie_key in ("Youtube", "YoutubeTab"):
+            ydl.get_info_extractor(ie_key)
+
+
+class DownloadDaemon:
+    """asyncio HTTP server in front of a DaemonQueue"""
+
+    def __init__(self, config, host, port, max_workers):
+        self.config = config
+        self.host = host
+        self.port = port
+        self.registry = JobRegistry()
+        self.queue = DaemonQueue(max_workers, self.registry, Downloader.get_job_store(config))
+        self.subscribers = set()
+        self.server = None
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop.set)
+            except (NotImplementedError, RuntimeError):  # Windows
+                pass
+
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        print(f"🛰️  Listening on http://{self.host}:{self.server.sockets[0].getsockname()[1]}", flush=True)
+        warm = loop.run_in_executor(None, warm_up)
+        publisher = asyncio.create_task(self.publish_events())
+        resumed = self.queue.resume(self.config)
+        for job, future in resumed:
+            self.track(job, future)
+        if resumed:
+            print(f"♻️  Resumed {len(resumed)} interrupted job(s)", flush=True)
+        try:
+            try:
+                await warm
+                print("✅ yt-dlp loaded", flush=True)
+            except Exception as e:
+                print(f"⚠️  Could not preload yt-dlp: {e}", flush=True)
+            await stop.wait()
+        finally:
+            publisher.cancel()
+            self.server.close()
+            await self.shutdown()
+
+    async def shutdown(self):
+        """Stop unfinished jobs and wait for the workers to wind down.
+
+        The stopped jobs stay queued in the job store and resume on the next start.
+        """
+        stopped = self.queue.stop()
+        if stopped:
+            print(f"\n⏹️  Stopping {stopped} unfinished job(s); they resume on the next start", flush=True)
+        await asyncio.get_running_loop().run_in_executor(None, self.queue.shutdown)
+
+    # --- HTTP ---
+
+    async def handle(self, reader, writer):
+        try:
+            method, target, headers, body = await self.read_request(reader)
+            url = urlsplit(target)
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            token = self.config.get('daemon_token')
+            if token and headers.get("authorization") != f"Bearer {token}":
+                raise ApiError(HTTPStatus.UNAUTHORIZED, "Missing or wrong bearer token")
+            if method == "GET" and url.path == "/events":
+                await self.stream_events(writer, query.get("job"))
+                return
+            path = url.path.rstrip("/") or "/"
+            if method == "POST":
+                # Submitting writes to the job store and creates folders; a locked
+                # store must not stall the other requests and event streams
+                status, payload = await asyncio.get_running_loop().run_in_executor(
+                    None, self.route, method, path, query, body)
+            else:
+                status, payload = self.route(method, path, query, body)
+        except ApiError as e:
+            status, payload = e.status, {"error": str(e)}
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception as e:
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}
+        await self.send(writer, status, json.dumps(payload, ensure_ascii=False).encode())
+
+    async def read_request(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").split()
+        if len(request_line) != 3:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+        method, target = request_line[0].upper(), request_line[1]
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        if length > MAX_BODY_SIZE:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method, target, headers, body
+
+    async def send(self, writer, status, body, content_type="application/json; charset=utf-8"):
+        status = HTTPStatus(status)
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n")
+        try:
+            writer.write(head.encode("latin-1") + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def route(self, method, path, query, body):
+        parts = path.strip("/").split("/")
+        if path == "/health" and method == "GET":
+            jobs, active = self.registry.counts()
+            return HTTPStatus.OK, {"status": "ok", "jobs": jobs, "active": active,
+                                   "workers": self.queue.max_workers}
+        if parts[0] != "jobs" or len(parts) > 2:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No such endpoint: {path}")
+        if len(parts) == 1:
+            if method == "GET":
+                return HTTPStatus.OK, {"jobs": self.registry.snapshots(query.get("status"), query.get("parent"))}
+            if method == "POST":
+                return HTTPStatus.CREATED, {"jobs": self.enqueue(self.parse_body(body))}
+        else:
+            if method == "GET":
+                return HTTPStatus.OK, self.find(parts[1])
+            if method == "DELETE":
+                return HTTPStatus.ACCEPTED, self.cancel(parts[1])
+        raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} is not supported on {path}")
+
+    @staticmethod
+    def parse_body(body):
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Invalid JSON: {e}")
+        if not isinstance(request, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Expected a JSON object")
+        return request
+
+    def find(self, job_id):
+        snapshot = self.registry.snapshot(job_id)
+        if snapshot is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No such job: {job_id}")
+        return snapshot
+
+    # --- Jobs ---
+
+    def enqueue(self, request):
+        """Create and submit one job per URL, configured like a batch mode run"""
+        urls = request.get("urls") or ([request["url"]] if request.get("url") else [])
+        if not urls or not all(isinstance(url, str) for url in urls):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Give 'url' or a list of 'urls'")
+        mode_arg = str(request.get("mode") or "video")
+        mode = Downloader.BATCH_MODES.get(mode_arg.lower(), "3")
+        fmt = mode_arg if mode == "3" else None
+        format_sort = None
+        if request.get("prefer"):
+            try:
+                format_sort = Downloader.parse_format_preference(request["prefer"])[1]
+            except ValueError as e:
+                raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+        priority = request.get("priority")
+        if priority is not None and priority not in Downloader.PRIORITY_WEIGHTS:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Unknown priority: {priority}")
+        sync = request.get("sync")
+        if sync and sync not in SYNC_MODES:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "'sync' must be true, 'incremental' or 'full'")
+        download_dir = Path(os.path.expanduser(request.get("output") or self.config.get('download_dir', Downloader.DOWNLOAD_DIR)))
+        download_dir.mkdir(parents=True, exist_ok=True)
+
+        snapshots = []
+        for url in urls:
+            job = Downloader.DownloadJob(url.strip(), mode, self.config, download_dir=download_dir, fmt=fmt)
+            job.format_sort = format_sort
+            job.priority = priority
+            job.sync_mode = SYNC_MODES[sync] if sync else None
+            if Downloader.is_youtube_url(job.url):
+                future = self.queue.submit(job)
+            else:
+                job.status = "Rejected"
+                job.error = "Not a YouTube URL"
+                future = Future()
+                future.set_result(False)
+            snapshots.append(self.registry.snapshot(self.track(job, future)))
+        return snapshots
+
+    def track(self, job, future):
+        """Register a submitted job and log it once it finishes; returns its id"""
+        job_id = self.registry.add(job, future)
+        future.add_done_callback(lambda f: self.log_finished(job_id, job))
+        return job_id
+
+    def cancel(self, job_id):
+        entry = self.registry.get(job_id)
+        if entry is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No such job: {job_id}")
+        job, parent_id, future = entry
+        if future.done():
+            raise ApiError(HTTPStatus.CONFLICT, f"Job {job_id} already finished ({job.status.lower()})")
+        job.cancel()
+        return self.registry.snapshot(job_id)
+
+    @staticmethod
+    def log_finished(job_id, job):
+        icon = {"Success": "✅", "Skipped": "⏭️ ", "Cancelled": "⏹️ "}.get(job.status, "❌")
+        detail = f" ({job.error})" if job.error else ""
+        with Downloader.print_lock:
+            print(f"{icon} [{job_id}] {job.status}: {job.title}{detail}", flush=True)
+
+    # --- Events ---
+
+    async def publish_events(self):
+        """Push changed job snapshots to every SSE subscriber at a fixed rate"""
+        while True:
+            await asyncio.sleep(EVENT_INTERVAL)
+            # Run even without subscribers so finished jobs leave the active set
+            for snapshot in self.registry.changes():
+                for subscriber in list(self.subscribers):
+                    try:
+                        subscriber.put_nowait(snapshot)
+                    except asyncio.QueueFull:
+                        # A client this far behind is dropped rather than buffered forever
+                        self.subscribers.discard(subscriber)
+                        subscriber.get_nowait()
+                        subscriber.put_nowait(None)
+
+    async def stream_events(self, writer, job_id):
+        if job_id is not None and self.registry.get(job_id) is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No such job: {job_id}")
+        subscriber = asyncio.Queue(SUBSCRIBER_BACKLOG)
+        self.subscribers.add(subscriber)
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\n"
+                         b"Content-Type: text/event-stream\r\n"
+                         b"Cache-Control: no-cache\r\n"
+                         b"Connection: close\r\n\r\n")
+            for snapshot in self.registry.snapshots():
+                if self.wanted(snapshot, job_id):
+                    writer.write(self.event(snapshot))
+            await writer.drain()
+            while True:
+                try:
+                    snapshot = await asyncio.wait_for(subscriber.get(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    writer.write(b": keepalive\n\n")
+                else:
+                    if snapshot is None:
+                        break
+                    if not self.wanted(snapshot, job_id):
+                        continue
+                    writer.write(self.event(snapshot))
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # Client gone, or the daemon is shutting down: just end the stream
+            pass
+        finally:
+            self.subscribers.discard(subscriber)
+            writer.close()
+
+    @staticmethod
+    def wanted(snapshot, job_id):
+        return job_id is None or job_id in (snapshot["id"], snapshot["parent"])
+
+    @staticmethod
+    def event(snapshot):
+        return f"event: job\nid: {snapshot['id']}\ndata: {json.dumps(snapshot, ensure_ascii=False)}\n\n".encode()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="daemon.py",
+        description="Run the downloader as a service with a local HTTP/JSON API.")
+    parser.add_argument("--host", help="address to listen on (default: daemon_host)")
+    parser.add_argument("--port", type=int, help="port to listen on (default: daemon_port)")
+    parser.add_argument("-j", "--jobs", type=int, help="parallel downloads (default: max_downloads)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    config = Downloader.load_config()
+    # Progress goes to API clients, not the console
+    config['quiet_mode'] = True
+    daemon = DownloadDaemon(config,
+                            args.host or config.get('daemon_host', "127.0.0.1"),
+                            args.port if args.port is not None else config.get('daemon_port', 8770),
+                            args.jobs or config.get('max_downloads', 5))
+    try:
+        asyncio.run(daemon.serve())
+    except OSError as e:
+        print(f"❌ Cannot start the daemon: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    print("👋 Daemon stopped.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
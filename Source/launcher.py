@@ -1,11 +1,18 @@
 import os
+import re
 import sys
+import json
+import argparse
+import importlib.util
 import subprocess
 import platform
 import shutil
 import time
 from pathlib import Path
 
+# Results of the last successful readiness check
+STATE_FILE = Path(__file__).parent / "launcher_state.json"
+
 def clear_screen():
     """Clear terminal screen cross-platform"""
     os.system('cls' if os.name == 'nt' else 'clear')
@@ -245,6 +252,20 @@ def run_main_application():
         print(f"❌ Application error: {e}")
         return False
 
+def find_ffmpeg():
+    """Return the FFmpeg binary the readiness check accepts, or None"""
+    ffmpeg_base = Path(__file__).parent / "FFmpeg"
+    current_system = platform.system().lower()
+    
+    if current_system == "windows":
+        ffmpeg_exe = ffmpeg_base / "windows" / "ffmpeg" / "bin" / "ffmpeg.exe"  # Fixed path
+    else:
+        ffmpeg_exe = ffmpeg_base / "ffmpeg"
+    
+    if ffmpeg_exe.exists():
+        return str(ffmpeg_exe)
+    return shutil.which('ffmpeg')
+
 def check_system_readiness():
     """Check if system is ready without installing anything"""
     print("🔍 Checking system readiness...")
@@ -259,29 +280,85 @@ def check_system_readiness():
         return False
     
     # Check FFmpeg
-    system_ffmpeg = shutil.which('ffmpeg')
-    ffmpeg_base = Path(__file__).parent / "FFmpeg"
-    current_system = platform.system().lower()
-    
-    if current_system == "windows":
-        ffmpeg_exe = ffmpeg_base / "windows" / "ffmpeg" / "bin" / "ffmpeg.exe"  # Fixed path
-    else:
-        ffmpeg_exe = ffmpeg_base / "ffmpeg"
-    
-    if not ffmpeg_exe.exists() and not system_ffmpeg:
+    if not find_ffmpeg():
         print("⚠️  FFmpeg not found")
         return False
     
     print("✅ System is ready!")
     return True
 
+def readiness_fingerprint():
+    """Describe the installed interpreter, yt-dlp and FFmpeg without running them.
+
+    Returns None when yt-dlp is not installed.
+    """
+    importlib.invalidate_caches()  # yt-dlp may have been installed since startup
+    try:
+        spec = importlib.util.find_spec('yt_dlp')  # Locates the package without importing it
+    except (ImportError, ValueError):
+        spec = None
+    if spec is None or not spec.origin:
+        return None
+    
+    version_file = Path(spec.origin).parent / "version.py"
+    try:
+        match = re.search(r"__version__\s*=\s*['\"]([^'\"]+)", version_file.read_text(encoding='utf-8'))
+        yt_dlp_version = match.group(1) if match else None
+        yt_dlp_mtime = version_file.stat().st_mtime
+    except OSError:
+        return None
+    
+    ffmpeg = find_ffmpeg()
+    return {
+        "python": sys.executable,
+        "yt_dlp_path": str(version_file.parent),
+        "yt_dlp_version": yt_dlp_version,
+        "yt_dlp_mtime": yt_dlp_mtime,
+        "ffmpeg": ffmpeg,
+        "ffmpeg_mtime": os.path.getmtime(ffmpeg) if ffmpeg else None,
+    }
+
+def load_readiness_state():
+    try:
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def save_readiness_state():
+    """Remember a successful readiness check for the current installation"""
+    fingerprint = readiness_fingerprint()
+    if fingerprint is None:
+        return
+    try:
+        with open(STATE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(fingerprint, f, indent=4)
+    except Exception:
+        pass
+
+def is_ready_cached():
+    """True when nothing changed since the last successful readiness check"""
+    fingerprint = readiness_fingerprint()
+    return fingerprint is not None and fingerprint == load_readiness_state()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="PRO YouTube Downloader launcher")
+    parser.add_argument("--check", action="store_true",
+                        help="ignore the cached readiness result and probe the system again")
+    return parser.parse_args()
+
 def main():
     """Main setup function"""
+    args = parse_args()
     clear_screen()
     print_banner()
     
-    # Check if system is already ready
-    if check_system_readiness():
+    # Warm start: nothing changed since the last successful check
+    warm_start = not args.check and is_ready_cached()
+    if warm_start:
+        print("✅ System is ready! (cached check, run with --check to re-probe)")
+    elif check_system_readiness():
+        save_readiness_state()
         print("\n" + "═" * 60)
         print("✅ System is already set up! Launching application...")
         print("═" * 60)
@@ -320,6 +397,8 @@ def main():
         print("\n" + "═" * 60)
         print("✅ Setup completed successfully!")
         print("═" * 60)
+        if find_ffmpeg():
+            save_readiness_state()
         time.sleep(2)  # Brief pause to show completion message
     
     # Create downloads folder
@@ -333,7 +412,8 @@ def main():
     
     # Automatic countdown instead of requiring Enter
     print("\n🕐 Launching PRO YouTube Downloader 🚀")
-    time.sleep(0.1)
+    if not warm_start:
+        time.sleep(0.1)
     clear_screen()
     
     # Run main application
@@ -0,0 +1,378 @@
+"""
+Multi-connection HTTP downloader for yt-dlp.
+
+Progressive (single-file) formats are split into byte ranges that are fetched
+over several connections at once and written in place into the .part file.
+Servers without range support, unknown sizes and small files fall back to
+yt-dlp's regular single-connection downloader, which starts over when the
+.part file was left by an interrupted segmented download.
+
+Audio marked by StreamAudioPP is not written to disk as downloaded: the
+bytes are piped into FFmpeg as they arrive and only the MP3 is written.
+
+With the 'preallocate' param the .part file of a segmented download is
+allocated in full before the first byte arrives.
+
+Both paths report the bytes they read to the 'bandwidth_consumer' param
+(Downloader.BandwidthConsumer), which sleeps to keep the process-wide
+bandwidth limit.
+"""
+
+import errno
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+from yt_dlp.downloader import PROTOCOL_MAP
+from yt_dlp.downloader.http import HttpFD
+from yt_dlp.networking import Request
+from yt_dlp.networking.exceptions import RequestError
+from yt_dlp.postprocessor import FFmpegPostProcessor, PostProcessor
+from yt_dlp.utils import ContentTooShortError, DownloadError, encodeArgument
+
+READ_BLOCK = 256 * 1024
+# Containers FFmpeg can decode from a pipe. MP4/M4A only qualify when fragmented
+# (DASH), since a plain MP4 may keep its index after the media data
+STREAMABLE_EXTS = {'webm', 'weba', 'ogg', 'opus', 'mp3', 'aac'}
+STREAMABLE_CONTAINERS = {'m4a_dash', 'mp4_dash', 'webm_dash'}
+
+
+class SegmentedHttpFD(HttpFD):
+    """HttpFD that fetches large files as parallel range requests.
+
+    Reads the 'segment_connections' and 'segment_chunk_size' params. A
+    '<file>.part.segments' sidecar records finished chunks so an interrupted
+    download resumes without refetching them. It exists for as long as the
+    .part file is a segmented one.
+    """
+
+    FD_NAME = 'segmented'
+
+    def slow_down(self, start_time, now, byte_counter):
+        """Single-connection path: HttpFD calls this after every block"""
+        consumer = self.params.get('bandwidth_consumer')
+        if consumer:
+            if getattr(self, '_throttle_start', None) != start_time:
+                # A new request (or retry) restarts byte_counter
+                self._throttle_start, self._throttled_bytes = start_time, 0
+            consumer.consume(byte_counter - self._throttled_bytes)
+            self._throttled_bytes = byte_counter
+        super().slow_down(start_time, now, byte_counter)
+
+    def real_download(self, filename, info_dict):
+        if info_dict.get('__stream_audio'):
+            return self._download_encoded(filename, info_dict)
+        connections = self.params.get('segment_connections') or 1
+        chunk_size = self.params.get('segment_chunk_size') or 0
+        if (connections < 2 or not chunk_size or filename == '-' or self.params.get('test')
+                or info_dict.get('is_live') or info_dict.get('request_data')):
+            return self._download_single(filename, info_dict)
+
+        headers = {'Accept-Encoding': 'identity', **(info_dict.get('http_headers') or {})}
+        size = self._probe_size(info_dict['url'], headers)
+        if not size or size < 2 * chunk_size:
+            return self._download_single(filename, info_dict)
+
+        return self._download_segments(filename, info_dict, headers, size, connections, chunk_size)
+
+    def _download_single(self, filename, info_dict):
+        """HttpFD's single-connection download, after clearing segmented leftovers.
+
+        The .part file of an interrupted segmented download is already full
+        size, with holes where chunks are missing. HttpFD would resume it at
+        its end and get a 416, or take it for a finished download.
+        """
+        tmpfilename = self.temp_name(filename)
+        state_file = tmpfilename + '.segments'
+        if os.path.exists(state_file):
+            self.to_screen(f'[{self.FD_NAME}] Discarding an unfinished segmented download')
+            for path in (tmpfilename, state_file):
+                if os.path.exists(path):
+                    os.remove(path)
+        return super().real_download(filename, info_dict)
+
+    @staticmethod
+    def _preallocate(f, size):
+        """Reserve the file's blocks up front, where the OS can.
+
+        Fewer, larger extents when many downloads write at once, and a full
+        disk fails here instead of partway through. truncate() alone only
+        makes a sparse file.
+        """
+        if not hasattr(os, 'posix_fallocate'):
+            return
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+        except OSError as e:
+            if e.errno not in (errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+
+    def _probe_size(self, url, headers):
+        """Total size if the server honours range requests, else None"""
+        try:
+            response = self.ydl.urlopen(Request(url, headers={**headers, 'Range': 'bytes=0-0'}))
+        except RequestError:
+            return None
+        with response:
+            content_range = response.headers.get('Content-Range') or ''
+            if response.status != 206 or '/' not in content_range:
+                return None
+            total = content_range.rsplit('/', 1)[1]
+            return int(total) if total.isdigit() else None
+
+    def _download_segments(self, filename, info_dict, headers, size, connections, chunk_size):
+        tmpfilename = self.temp_name(filename)
+        state_file = tmpfilename + '.segments'
+        chunks = [(start, min(start + chunk_size, size) - 1) for start in range(0, size, chunk_size)]
+
+        done = self._load_state(state_file, tmpfilename, size, chunk_size)
+        if not done:
+            with open(tmpfilename, 'wb') as f:
+                f.truncate(size)
+                if self.params.get('preallocate'):
+                    self._preallocate(f, size)
+            # Marks the full-size .part as segmented before any chunk is in
+            self._save_state(state_file, size, chunk_size, done)
+        self.to_screen(f'[{self.FD_NAME}] {len(chunks) - len(done)} of {len(chunks)} chunks '
+                       f'over {connections} connections')
+
+        lock = threading.Lock()
+        stop = threading.Event()
+        progress = {'bytes': sum(chunks[index][1] - chunks[index][0] + 1 for index in done)}
+        resumed = progress['bytes']
+
+        def fetch(index):
+            # [next byte to fetch, last byte]; advanced as data is written
+            span = list(chunks[index])
+            # 'retries' may be infinite; chunks are cheap to restart on the next attempt
+            retries = int(min(self.params.get('retries', 3), 10))
+            for attempt in range(retries + 1):
+                try:
+                    self._fetch_range(info_dict['url'], headers, tmpfilename, span, progress, lock, stop)
+                    break
+                except (RequestError, ContentTooShortError, OSError) as e:
+                    if stop.is_set() or attempt == retries:
+                        raise
+                    self.report_retry(e, attempt + 1, retries)
+            if stop.is_set():
+                return
+            with lock:
+                done.add(index)
+                self._save_state(state_file, size, chunk_size, done)
+
+        started = time.time()
+        # The first hook marks the start of the transfer; the next one only
+        # comes after the first wait below
+        self._report(filename, tmpfilename, info_dict, resumed, resumed, size, started)
+        with ThreadPoolExecutor(max_workers=connections, thread_name_prefix='segment') as executor:
+            futures = [executor.submit(fetch, index) for index in range(len(chunks)) if index not in done]
+            try:
+                pending = set(futures)
+                while pending:
+                    finished, pending = wait(pending, timeout=0.25, return_when=FIRST_EXCEPTION)
+                    for future in finished:
+                        future.result()
+                    self._report(filename, tmpfilename, info_dict, progress['bytes'], resumed, size, started)
+            except BaseException:
+                stop.set()
+                for future in futures:
+                    future.cancel()
+                raise
+
+        if len(done) != len(chunks):
+            raise DownloadError(f'only {len(done)} of {len(chunks)} chunks were downloaded')
+
+        os.remove(state_file)
+        self.try_rename(tmpfilename, filename)
+        self._hook_progress({
+            'downloaded_bytes': size,
+            'total_bytes': size,
+            'filename': filename,
+            'status': 'finished',
+            'elapsed': time.time() - started,
+            'ctx_id': info_dict.get('ctx_id'),
+        }, info_dict)
+        return True
+
+    def _fetch_range(self, url, headers, tmpfilename, span, progress, lock, stop):
+        """Write bytes span[0]..span[1] (inclusive) of url into the .part file"""
+        start, end = span
+        consumer = self.params.get('bandwidth_consumer')
+        response = self.ydl.urlopen(Request(url, headers={**headers, 'Range': f'bytes={start}-{end}'}))
+        with response, open(tmpfilename, 'r+b') as f:
+            if response.status != 206:
+                raise ContentTooShortError(0, end - start + 1)
+            f.seek(start)
+            while span[0] <= end and not stop.is_set():
+                block = response.read(min(READ_BLOCK, end + 1 - span[0]))
+                if not block:
+                    break
+                f.write(block)
+                span[0] += len(block)
+                with lock:
+                    progress['bytes'] += len(block)
+                if consumer:
+                    consumer.consume(len(block))
+        if span[0] <= end and not stop.is_set():
+            raise ContentTooShortError(span[0] - start, end - start + 1)
+
+    def _download_encoded(self, filename, info_dict):
+        """Feed the response body to FFmpeg's stdin; only the encoded file is written.
+
+        The body is requested in ranges of 'segment_chunk_size' when the server
+        supports them, so a dropped connection continues where it stopped
+        while FFmpeg keeps running.
+        """
+        ffmpeg = FFmpegPostProcessor(self.ydl)
+        if not ffmpeg.available:
+            raise DownloadError('ffmpeg is required to encode audio while downloading')
+        url = info_dict['url']
+        headers = {'Accept-Encoding': 'identity', **(info_dict.get('http_headers') or {})}
+        chunk_size = self.params.get('segment_chunk_size') or 0
+        size = self._probe_size(url, headers) if chunk_size else None
+        consumer = self.params.get('bandwidth_consumer')
+        tmpfilename = self.temp_name(filename)
+        self.to_screen(f'[{self.FD_NAME}] Encoding to MP3 while downloading: {filename}')
+
+        # -xerror: a demuxing error must fail the download, not end the MP3 early
+        args = [ffmpeg.executable, '-y', '-hide_banner', '-nostats', '-loglevel', 'error', '-xerror',
+                '-i', 'pipe:0', '-vn', '-acodec', 'libmp3lame',
+                '-b:a', f'{info_dict["__stream_audio"]}k', '-f', 'mp3', tmpfilename]
+        # stderr goes to a file so a chatty FFmpeg can never block on a full pipe
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen([encodeArgument(arg) for arg in args],
+                                       stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr)
+            started = time.time()
+            downloaded = 0
+            self._report(filename, tmpfilename, info_dict, downloaded, 0, size, started)
+            try:
+                retries = int(min(self.params.get('retries', 3), 10))
+                attempt = 0
+                while size is None or downloaded < size:
+                    request_headers = headers
+                    if size:
+                        end = min(downloaded + chunk_size, size) - 1
+                        request_headers = {**headers, 'Range': f'bytes={downloaded}-{end}'}
+                    try:
+                        response = self.ydl.urlopen(Request(url, headers=request_headers))
+                        with response:
+                            if size and response.status != 206:
+                                # A full body here would repeat bytes FFmpeg already has
+                                raise ContentTooShortError(downloaded, size)
+                            received = 0
+                            while True:
+                                block = response.read(READ_BLOCK)
+                                if not block:
+                                    break
+                                process.stdin.write(block)
+                                received += len(block)
+                                downloaded += len(block)
+                                if consumer:
+                                    consumer.consume(len(block))
+                                self._report(filename, tmpfilename, info_dict, downloaded, 0, size, started)
+                            if size and not received:
+                                raise ContentTooShortError(downloaded, size)
+                    except (RequestError, ContentTooShortError, OSError) as e:
+                        if isinstance(e, BrokenPipeError) or process.poll() is not None:
+                            break  # FFmpeg gave up; its error is reported below
+                        if not size or attempt >= retries:
+                            raise
+                        attempt += 1
+                        self.report_retry(e, attempt, retries)
+                        continue
+                    if size is None:
+                        break
+                process.stdin.close()
+                returncode = process.wait()
+            except BaseException:
+                process.kill()
+                process.wait()
+                if os.path.exists(tmpfilename):
+                    os.remove(tmpfilename)
+                raise
+            if returncode != 0 or (size and downloaded < size):
+                stderr.seek(0)
+                message = stderr.read().decode('utf-8', 'replace').strip().splitlines()
+                if os.path.exists(tmpfilename):
+                    os.remove(tmpfilename)
+                raise DownloadError(f'FFmpeg could not encode the stream: {message[-1] if message else returncode}')
+
+        self.try_rename(tmpfilename, filename)
+        self._hook_progress({
+            'downloaded_bytes': downloaded,
+            'total_bytes': size or downloaded,
+            'filename': filename,
+            'status': 'finished',
+            'elapsed': time.time() - started,
+            'ctx_id': info_dict.get('ctx_id'),
+        }, info_dict)
+        return True
+
+    def _report(self, filename, tmpfilename, info_dict, downloaded, resumed, size, started):
+        now = time.time()
+        speed = self.calc_speed(started, now, downloaded - resumed)
+        eta = self.calc_eta(started, now, size - resumed, downloaded - resumed) if size else None
+        self._hook_progress({
+            'status': 'downloading',
+            'downloaded_bytes': downloaded,
+            'total_bytes': size,
+            'tmpfilename': tmpfilename,
+            'filename': filename,
+            'eta': eta,
+            'speed': speed,
+            'elapsed': now - started,
+            'ctx_id': info_dict.get('ctx_id'),
+        }, info_dict)
+
+    @staticmethod
+    def _load_state(state_file, tmpfilename, size, chunk_size):
+        """Chunks finished by an earlier run with the same layout"""
+        if not os.path.exists(tmpfilename):
+            return set()
+        try:
+            with open(state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return set()
+        if state.get('size') != size or state.get('chunk_size') != chunk_size:
+            return set()
+        return set(state.get('done', []))
+
+    @staticmethod
+    def _save_state(state_file, size, chunk_size, done):
+        with open(state_file, 'w', encoding='utf-8') as f:
+            json.dump({'size': size, 'chunk_size': chunk_size, 'done': sorted(done)}, f)
+
+
+class StreamAudioPP(PostProcessor):
+    """Before the download, mark a progressive HTTP format to be encoded in flight.
+
+    Runs at the 'video' stage, after format selection and before the file
+    name is chosen, so the file is named .mp3 from the start. The regular
+    FFmpegExtractAudio step then finds an MP3 and leaves it alone; formats
+    that cannot be streamed (fragment protocols, merged formats, plain MP4)
+    are left for it to convert as usual.
+    """
+
+    def __init__(self, downloader=None, quality='320'):
+        super().__init__(downloader)
+        self.quality = quality
+
+    def run(self, info):
+        streamable = (info.get('protocol') in ('http', 'https') and info.get('url')
+                      and not info.get('requested_formats') and not info.get('is_live')
+                      and not info.get('request_data')
+                      and (info.get('ext') in STREAMABLE_EXTS or info.get('container') in STREAMABLE_CONTAINERS))
+        if streamable and FFmpegPostProcessor(self._downloader).available:
+            info['__stream_audio'] = self.quality
+            info['ext'] = 'mp3'
+        return [], info
+
+
+def register():
+    """Use SegmentedHttpFD for plain HTTP(S) formats in this process"""
+    PROTOCOL_MAP['http'] = PROTOCOL_MAP['https'] = SegmentedHttpFD
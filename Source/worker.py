@@ -0,0 +1,578 @@
+"""
+Worker mode: several hosts share one download queue.
+
+    python Source/worker.py add QUEUE_DIR URL... [-i FILE] [-m mode] [-S prefer] [-p priority] [-o DIR]
+    python Source/worker.py run QUEUE_DIR [-j 5] [-o DIR] [--node NAME] [--follow]
+    python Source/worker.py status QUEUE_DIR [--json]
+
+QUEUE_DIR is a folder every host can reach (an NFS or SMB share). Each
+host runs `worker.py run` and claims items from it until all of them are
+finished. A playlist item is split into one item per entry, so a large
+playlist is spread across hosts too. Items download with the same modes
+and folder layout as the menu and batch mode, whichever host fetches them.
+
+    items/ID.json      queued downloads
+    leases/ID.GEN      the host working on an item, touched while it runs
+    done/ID.json       the result of a finished item
+    nodes/NODE.json    progress and throughput of each host
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+import Downloader
+
+# Seconds without a refresh before another host takes an item over
+LEASE_SECONDS = 120
+# Seconds between claim attempts while every unfinished item is leased
+POLL_INTERVAL = 5
+# Seconds between checks for a stop request (Ctrl+C, SIGTERM)
+STOP_CHECK_INTERVAL = 0.25
+# Flat playlist entry fields kept in an entry item
+ENTRY_FIELDS = ("ie_key", "id", "title")
+
+
+def item_id(url, mode, fmt, output):
+    """Same URL, mode and folder give the same ID, so adding twice is a no-op"""
+    return hashlib.sha1(json.dumps([url, mode, fmt, output]).encode()).hexdigest()[:16]
+
+
+class Lease:
+    def __init__(self, item_id, generation):
+        self.item_id = item_id
+        self.generation = generation
+
+    @property
+    def name(self):
+        return f"{self.item_id}.{self.generation}"
+
+
+class LeaseQueue:
+    """Download items in a shared folder, claimed by hosts with lease files.
+
+    Claiming item ID creates leases/ID.GEN with O_EXCL, which exactly one
+    host wins, so no lock server is needed. The owner touches the file
+    while it works. A lease not touched for lease_seconds belongs to a
+    dead host: the next claim creates ID.GEN+1, and should the old owner
+    come back it finds that file on its next refresh and gives the item up.
+    Expiry compares file times, so the hosts' clocks must be in sync (NTP).
+    """
+
+    def __init__(self, root, lease_seconds=LEASE_SECONDS):
+        self.root = Path(root)
+        self.lease_seconds = lease_seconds
+        self.items = self.root / "items"
+        self.leases = self.root / "leases"
+        self.done = self.root / "done"
+        self.nodes = self.root / "nodes"
+        for folder in (self.items, self.leases, self.done, self.nodes):
+            folder.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _temp_path(path):
+        return path.with_name(f".{path.name}.{socket.gethostname()}.{os.getpid()}.{threading.get_ident()}")
+
+    def _write(self, path, data):
+        """Write JSON under a temporary name and rename it into place"""
+        temp = self._temp_path(path)
+        temp.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+        os.replace(temp, path)
+
+    @staticmethod
+    def _read(path):
+        return json.loads(path.read_text(encoding='utf-8'))
+
+    @staticmethod
+    def _names(folder, suffix=".json"):
+        return {name[:-len(suffix)] for name in os.listdir(folder)
+                if name.endswith(suffix) and not name.startswith(".")}
+
+    def add(self, item):
+        """Queue an item unless one with its ID was queued before; True if added"""
+        path = self.items / f"{item['id']}.json"
+        temp = self._temp_path(path)
+        temp.write_text(json.dumps(item, ensure_ascii=False), encoding='utf-8')
+        try:
+            # A hard link fails if the name exists, atomically even over NFS
+            os.link(temp, path)
+            return True
+        except FileExistsError:
+            return False
+        except OSError:
+            # No hard links on this share (FAT, some SMB servers)
+            if path.exists():
+                return False
+            os.replace(temp, path)
+            return True
+        finally:
+            temp.unlink(missing_ok=True)
+
+    def _generations(self):
+        """Item ID -> newest lease generation"""
+        generations = {}
+        for name in os.listdir(self.leases):
+            item, _, generation = name.rpartition(".")
+            if item and generation.isdigit():
+                generations[item] = max(generations.get(item, 0), int(generation))
+        return generations
+
+    def _expired(self, lease):
+        try:
+            touched = (self.leases / lease.name).stat().st_mtime
+        except FileNotFoundError:
+            return False  # Changing hands right now
+        return time.time() - touched > self.lease_seconds
+
+    def claim(self, node):
+        """Lease the next unfinished item nobody holds; (lease, item) or None"""
+        finished = self._names(self.done)
+        generations = self._generations()
+        for item in sorted(self._names(self.items) - finished):
+            generation = generations.get(item, 0)
+            if generation and not self._expired(Lease(item, generation)):
+                continue
+            lease = self._take(item, generation + 1, node)
+            if lease is None:
+                continue
+            if (self.done / f"{item}.json").exists():
+                # Finished by another host between the listing and the lease
+                self.release(lease)
+                continue
+            try:
+                return lease, self._read(self.items / f"{item}.json")
+            except (OSError, ValueError) as e:
+                self.finish(lease, {"id": item, "status": "failed", "error": f"Unreadable item: {e}"})
+        return None
+
+    def _take(self, item, generation, node):
+        path = self.leases / f"{item}.{generation}"
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None
+        with os.fdopen(fd, "w") as f:
+            json.dump({"node": node, "host": socket.gethostname(), "pid": os.getpid(),
+                       "claimed": time.time()}, f)
+        (self.leases / f"{item}.{generation - 1}").unlink(missing_ok=True)
+        return Lease(item, generation)
+
+    def renew(self, lease):
+        """Touch a held lease; False once another host has taken the item over"""
+        if (self.leases / f"{lease.item_id}.{lease.generation + 1}").exists():
+            return False
+        try:
+            os.utime(self.leases / lease.name)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def release(self, lease):
+        """Give an unfinished item back to the other hosts"""
+        (self.leases / lease.name).unlink(missing_ok=True)
+
+    def finish(self, lease, result):
+        self._write(self.done / f"{lease.item_id}.json", result)
+        self.release(lease)
+
+    def all_done(self):
+        return self._names(self.items) <= self._names(self.done)
+
+    def report(self, node, stats):
+        self._write(self.nodes / f"{node}.json", stats)
+
+    def status(self):
+        """Item counts by state, plus the last report of every host"""
+        items = self._names(self.items)
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        for item in self._names(self.done) & items:
+            try:
+                status = self._read(self.done / f"{item}.json").get("status")
+            except (OSError, ValueError):
+                status = None
+            counts["done" if status in ("success", "skipped") else "failed"] += 1
+        generations = self._generations()
+        for item in items - self._names(self.done):
+            leased = item in generations and not self._expired(Lease(item, generations[item]))
+            counts["running" if leased else "queued"] += 1
+        nodes = []
+        for node in sorted(self._names(self.nodes)):
+            try:
+                nodes.append(self._read(self.nodes / f"{node}.json"))
+            except (OSError, ValueError):
+                pass
+        return counts, nodes
+
+
+def entry_item(parent, child):
+    """Queue item for one playlist entry, downloaded as the playlist would be"""
+    entry = child.info
+    return {
+        "id": f"{parent['id']}-{child.extra_info['playlist_index']:05d}",
+        "url": child.url,
+        "mode": parent["mode"],
+        "fmt": parent.get("fmt"),
+        "format_sort": parent.get("format_sort"),
+        "priority": parent.get("priority"),
+        "output": parent.get("output"),
+        "parent": parent["id"],
+        "playlist_url": parent["url"],
+        # Re-extracted by whichever host downloads it
+        "entry": {"_type": "url", "url": child.url, **{key: entry[key] for key in ENTRY_FIELDS if key in entry}},
+        "entry_key": child.entry_key,
+        "archive_id": child.archive_id,
+        "title": child.url_info["title"],
+        "extra_info": child.extra_info,
+        "added": time.time(),
+    }
+
+
+class WorkerQueue(Downloader.DownloadQueue):
+    """DownloadQueue that splits playlists into shared queue items instead of downloading them"""
+
+    def __init__(self, max_workers, leases):
+        super().__init__(max_workers)
+        self.leases = leases
+        self.items = {}  # playlist job -> its queue item
+
+    def _run_entries(self, job):
+        item = self.items[job]
+        for attempt in range(Downloader.max_attempts(job.config)):
+            if attempt:
+                Downloader.wait_before_retry(job, attempt)
+            if job.cancelled:
+                return Downloader.cancel_download(job)
+            job.entries_total = added = 0
+            try:
+                for child in Downloader.iter_playlist_jobs(job):
+                    added += self.leases.add(entry_item(item, child))
+                    job.entries_total += 1
+                break
+            except Exception as e:
+                job.error = str(e)
+                job.attempts.append({'attempt': attempt + 1, 'seconds': None, 'error': job.error})
+                Downloader.job_print(job, f"\n❌ Playlist Error: {e}")
+        else:
+            job.status = "Failed"
+            return False
+        job.error = None
+        job.status = "Success"
+        Downloader.job_print(job, f"\n📋 Split {job.title}: {added} new of {job.entries_total} entries")
+        return True
+
+
+class Worker:
+    """Claims items from a LeaseQueue and downloads them on a WorkerQueue"""
+
+    def __init__(self, leases, config, download_dir, jobs, node, follow=False):
+        self.leases = leases
+        self.config = config
+        self.download_dir = download_dir
+        self.jobs = max(1, int(jobs))
+        self.node = node
+        self.follow = follow
+        self.queue = WorkerQueue(self.jobs, leases)
+        self._lock = threading.Lock()
+        self.active = {}  # job -> (lease, started)
+        self.lost = set()  # leases another host took over
+        self.playlists = {}  # parent item ID -> stand-in playlist job
+        self.results = []
+        self.stopping = False
+        self.stop_requested = False
+        self.wake = threading.Event()
+        self.closed = threading.Event()
+        self.stats = {"node": node, "host": socket.gethostname(), "pid": os.getpid(),
+                      "started": time.time(), "done": 0, "failed": 0, "bytes": 0, "busy_seconds": 0.0}
+
+    def run(self):
+        heartbeat = threading.Thread(target=self.heartbeat, name="lease-heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            next_claim = 0
+            while not self.stop_requested:
+                if self.wake.is_set() or time.monotonic() >= next_claim:
+                    self.wake.clear()
+                    next_claim = time.monotonic() + POLL_INTERVAL
+                    claimed = self.fill()
+                    with self._lock:
+                        idle = not self.active
+                    if idle and not claimed and not self.follow and self.leases.all_done():
+                        break
+                # Short slices, since a stop request is a flag nobody can wake us for
+                self.wake.wait(STOP_CHECK_INTERVAL)
+            if self.stop_requested:
+                stopped = self.stop()
+                print(f"\n⏹️  Stopping; {stopped} unfinished item(s) go back to the queue",
+                      file=sys.stderr, flush=True)
+            self.queue.shutdown()
+        finally:
+            self.closed.set()
+            heartbeat.join()
+            self.leases.report(self.node, self.node_stats())
+        return self.results
+
+    def request_stop(self):
+        """Safe from a signal handler: only sets a flag that run() polls.
+
+        The handler runs on the main thread, which may be holding _lock or
+        an Event's internal lock at that moment.
+        """
+        self.stop_requested = True
+
+    def stop(self):
+        """Cancel running items and hand them back to the other hosts"""
+        self.stopping = True
+        with self._lock:
+            jobs = list(self.active)
+        for job in jobs:
+            job.cancel()
+        self.wake.set()
+        return len(jobs)
+
+    def busy(self):
+        # Items waiting for FFmpeg free their download slot, as in DownloadQueue
+        with self._lock:
+            return sum(1 for job in self.active if job.status not in ("Downloaded", "Processing"))
+
+    def fill(self):
+        """Claim items until every download slot is busy; returns how many were claimed"""
+        claimed = 0
+        while not self.stopping and not self.stop_requested and self.busy() < self.jobs:
+            try:
+                claim = self.leases.claim(self.node)
+            except OSError as e:
+                print(f"⚠️  Cannot read the queue: {e}", file=sys.stderr, flush=True)
+                break
+            if claim is None:
+                break
+            self.start(*claim)
+            claimed += 1
+        return claimed
+
+    def make_job(self, item):
+        download_dir = Path(item.get("output") or self.download_dir)
+        parent = self.playlist(item, download_dir) if item.get("parent") else None
+        job = Downloader.DownloadJob(item["url"], item["mode"], self.config,
+                                     download_dir=download_dir, fmt=item.get("fmt"), parent=parent)
+        job.format_sort = item.get("format_sort")
+        job.priority = item.get("priority")
+        if parent:
+            job.info = item["entry"]
+            job.entry_key = item.get("entry_key")
+            job.archive_id = item.get("archive_id")
+            job.url_info = {'type': 'video', 'title': item.get("title") or job.url}
+            job.extra_info = item.get("extra_info") or {}
+        return job
+
+    def playlist(self, item, download_dir):
+        """Local stand-in for the playlist an entry item came from"""
+        with self._lock:
+            parent = self.playlists.get(item["parent"])
+            if parent is None:
+                parent = Downloader.DownloadJob(item.get("playlist_url") or item["url"], item["mode"],
+                                                self.config, download_dir=download_dir, fmt=item.get("fmt"))
+                title = (item.get("extra_info") or {}).get("playlist_title")
+                parent.url_info = {'type': 'playlist', 'title': title or parent.url}
+                self.playlists[item["parent"]] = parent
+        return parent
+
+    def start(self, lease, item):
+        job = self.make_job(item)
+        if not job.parent:
+            self.queue.items[job] = item
+        with self._lock:
+            self.active[job] = (lease, time.time())
+        future = self.queue.submit(job)
+        future.add_done_callback(lambda f: self.finished(job, f))
+
+    def finished(self, job, future):
+        with self._lock:
+            lease, started = self.active.pop(job)
+            lost = lease in self.lost
+        self.queue.items.pop(job, None)
+        self.wake.set()
+        if future.exception() is not None:
+            job.status = "Failed"
+            job.error = str(future.exception())
+        if lost:
+            print(f"⚠️  {job.title}: taken over by another host", file=sys.stderr, flush=True)
+            return
+        if job.status == "Cancelled" and self.stopping:
+            self.leases.release(lease)
+            return
+
+        seconds = time.time() - started
+        result = Downloader.batch_result(job)
+        result.update({"id": lease.item_id, "node": self.node, "seconds": round(seconds, 3)})
+        try:
+            self.leases.finish(lease, result)
+        except OSError as e:
+            # The lease runs out and another host repeats the item
+            print(f"⚠️  Cannot record {lease.item_id}: {e}", file=sys.stderr, flush=True)
+        with self._lock:
+            self.stats["done" if result["status"] in ("success", "skipped") else "failed"] += 1
+            self.stats["bytes"] += job.metrics.bytes
+            self.stats["busy_seconds"] += seconds
+            self.results.append(result)
+        with Downloader.print_lock:
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+
+    def heartbeat(self):
+        while not self.closed.wait(self.leases.lease_seconds / 4):
+            self.refresh()
+
+    def refresh(self):
+        """Renew every held lease and publish this host's numbers"""
+        with self._lock:
+            active = [(job, lease) for job, (lease, started) in self.active.items()]
+        for job, lease in active:
+            try:
+                held = self.leases.renew(lease)
+            except OSError:
+                continue  # Shared storage hiccup; the lease has time left
+            if not held:
+                with self._lock:
+                    self.lost.add(lease)
+                job.cancel()
+        try:
+            self.leases.report(self.node, self.node_stats())
+        except OSError:
+            pass
+
+    def node_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["active"] = [job.title for job in self.active]
+        stats["updated"] = time.time()
+        return stats
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="worker.py",
+        description="Share one download queue between several hosts.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="queue URLs")
+    add.add_argument("queue", metavar="QUEUE_DIR", help="shared queue folder")
+    add.add_argument("urls", nargs="*", metavar="URL", help="video or playlist URLs")
+    add.add_argument("-i", "--input", metavar="FILE", action="append", default=[],
+                     help="read URLs from FILE, one per line ('-' for stdin)")
+    add.add_argument("-m", "--mode", default="video",
+                     help="'video', 'mp3' or a yt-dlp format string (default: video)")
+    add.add_argument("-S", "--prefer", metavar="PREFERENCE",
+                     help="format preference such as '<=1080p, avc1, smallest'")
+    add.add_argument("-p", "--priority", choices=sorted(Downloader.PRIORITY_WEIGHTS),
+                     help="bandwidth priority (default: normal, low for playlist entries)")
+    add.add_argument("-o", "--output", metavar="DIR",
+                     help="download folder for these URLs on every host (default: each host's own)")
+
+    run = commands.add_parser("run", help="download queued items until all are finished")
+    run.add_argument("queue", metavar="QUEUE_DIR", help="shared queue folder")
+    run.add_argument("-j", "--jobs", type=int, help="parallel downloads (default: max_downloads)")
+    run.add_argument("-o", "--output", metavar="DIR", help="download folder (default: download_dir)")
+    run.add_argument("--node", help="name in status reports (default: host name)")
+    run.add_argument("--lease", type=int, default=LEASE_SECONDS,
+                     help=f"seconds before a silent host's items are taken over (default: {LEASE_SECONDS})")
+    run.add_argument("--follow", action="store_true", help="keep waiting for new items")
+    run.add_argument("-v", "--verbose", action="store_true", help="show progress on stdout")
+
+    status = commands.add_parser("status", help="show queue progress and per-host throughput")
+    status.add_argument("queue", metavar="QUEUE_DIR", help="shared queue folder")
+    status.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    return parser.parse_args(argv)
+
+
+def add_items(args):
+    try:
+        urls = Downloader.read_batch_urls(args)
+    except OSError as e:
+        print(f"❌ Cannot read URL list: {e}", file=sys.stderr)
+        return 2
+    if not urls:
+        print("❌ No URLs given", file=sys.stderr)
+        return 2
+    mode = Downloader.BATCH_MODES.get(args.mode.lower(), "3")
+    fmt = None if mode != "3" else args.mode
+    format_sort = None
+    if args.prefer:
+        try:
+            format_sort = Downloader.parse_format_preference(args.prefer)[1]
+        except ValueError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return 2
+    output = os.path.abspath(os.path.expanduser(args.output)) if args.output else None
+
+    leases = LeaseQueue(args.queue)
+    added = rejected = 0
+    for url in urls:
+        if not Downloader.is_youtube_url(url):
+            print(f"❌ Not a YouTube URL: {url}", file=sys.stderr)
+            rejected += 1
+            continue
+        added += leases.add({
+            "id": item_id(url, mode, fmt, output),
+            "url": url,
+            "mode": mode,
+            "fmt": fmt,
+            "format_sort": format_sort,
+            "priority": args.priority,
+            "output": output,
+            "added": time.time(),
+        })
+    print(f"📥 Queued {added} new of {len(urls) - rejected} URL(s) in {leases.root}")
+    return 1 if rejected else 0
+
+
+def run_worker(args):
+    config = Downloader.load_config()
+    config['quiet_mode'] = not args.verbose
+    download_dir = Path(os.path.expanduser(args.output or config.get('download_dir', Downloader.DOWNLOAD_DIR)))
+    download_dir.mkdir(parents=True, exist_ok=True)
+    node = args.node or socket.gethostname()
+    worker = Worker(LeaseQueue(args.queue, args.lease), config, download_dir,
+                    args.jobs or config.get('max_downloads', 5), node, args.follow)
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: worker.request_stop())
+    results = worker.run()
+    return 0 if all(result["status"] in ("success", "skipped") for result in results) else 1
+
+
+def show_status(args):
+    from yt_dlp.utils import format_bytes
+
+    leases = LeaseQueue(args.queue)
+    counts, nodes = leases.status()
+    if args.json:
+        print(json.dumps({"items": counts, "nodes": nodes}, ensure_ascii=False))
+        return 0
+    print(f"📦 {leases.root}: {counts['queued']} queued | {counts['running']} running | "
+          f"{counts['done']} done | {counts['failed']} failed")
+    now = time.time()
+    for node in nodes:
+        elapsed = max(node["updated"] - node["started"], 1e-9)
+        state = "offline" if now - node["updated"] > LEASE_SECONDS else f"{len(node.get('active', []))} active"
+        print(f"🖥️  {node['node']}: {node['done']} done, {node['failed']} failed | "
+              f"{format_bytes(node['bytes'] / elapsed)}/s | {node['done'] * 3600 / elapsed:.0f} items/h | {state}")
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    try:
+        return {"add": add_items, "run": run_worker, "status": show_status}[args.command](args)
+    except OSError as e:
+        print(f"❌ Cannot use the queue folder: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
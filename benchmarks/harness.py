@@ -0,0 +1,229 @@
+"""Offline stand-ins for YouTube used by the benchmarks.
+
+MediaServer serves synthetic media over HTTP with range requests and
+adjustable latency/bandwidth. BenchIE is a yt-dlp extractor for its
+URLs, so Downloader.py runs its real video, MP3 and custom-format code
+paths without touching the network:
+
+    http://127.0.0.1:<port>/bench/video/<id>       single video
+    http://127.0.0.1:<port>/bench/playlist/<count> playlist of <count> videos
+"""
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+SOURCE_DIR = Path(__file__).resolve().parent.parent / "Source"
+
+# Synthetic media files: name -> (yt-dlp format fields, ffmpeg arguments)
+MEDIA_FORMATS = {
+    "video.mp4": ({"format_id": "bench-video", "ext": "mp4", "vcodec": "mpeg4", "acodec": "none",
+                   "width": 1280, "height": 720, "tbr": 2000},
+                  ["-f", "lavfi", "-i", "testsrc=size=1280x720:rate=30", "-an", "-c:v", "mpeg4", "-q:v", "4"]),
+    "audio.m4a": ({"format_id": "bench-audio", "ext": "m4a", "vcodec": "none", "acodec": "mp4a.40.2",
+                   "abr": 128, "tbr": 128},
+                  ["-f", "lavfi", "-i", "sine=frequency=440", "-vn", "-c:a", "aac", "-b:a", "128k"]),
+    "progressive.mp4": ({"format_id": "bench-progressive", "ext": "mp4", "vcodec": "mpeg4",
+                         "acodec": "mp4a.40.2", "width": 640, "height": 360, "tbr": 900},
+                        ["-f", "lavfi", "-i", "testsrc=size=640x360:rate=30", "-f", "lavfi", "-i",
+                         "sine=frequency=440", "-c:v", "mpeg4", "-q:v", "6", "-c:a", "aac", "-shortest"]),
+}
+
+
+def find_ffmpeg():
+    """FFmpeg the way Downloader.py finds it (bundled first, then PATH)"""
+    sys.path.insert(0, str(SOURCE_DIR))
+    import Downloader
+    return Downloader.get_ffmpeg_path() or shutil.which("ffmpeg")
+
+
+def generate_media(directory, seconds=10, ffmpeg=None):
+    """Create the synthetic media files in `directory`.
+
+    Real encodes are made when FFmpeg is available so merging and MP3
+    conversion work; otherwise random bytes of a similar size are written.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, (fields, ffmpeg_args) in MEDIA_FORMATS.items():
+        path = directory / name
+        if ffmpeg:
+            subprocess.run([ffmpeg, "-y", "-loglevel", "error", *ffmpeg_args, "-t", str(seconds), str(path)],
+                           check=True)
+        else:
+            with open(path, "wb") as f:
+                f.write(os.urandom(int(fields["tbr"] * 1000 / 8 * seconds)))
+    return directory
+
+
+class MediaServer:
+    """Threaded HTTP server for the benchmark extractor and its media files"""
+
+    def __init__(self, media_dir, latency=0.0, bandwidth=0, seconds=10):
+        self.media_dir = Path(media_dir)
+        self.latency = latency  # seconds added before every response
+        self.bandwidth = bandwidth  # bytes per second per connection, 0 = unlimited
+        self.seconds = seconds
+        self.bytes_sent = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def video_url(self, video_id="v1"):
+        return f"{self.base_url}/bench/video/{video_id}"
+
+    def playlist_url(self, count):
+        return f"{self.base_url}/bench/playlist/{count}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _count(self, sent):
+        with self._lock:
+            self.bytes_sent += sent
+
+    def video_json(self, video_id):
+        formats = []
+        for name, (fields, _) in MEDIA_FORMATS.items():
+            path = self.media_dir / name
+            formats.append({**fields, "url": f"{self.base_url}/media/{name}",
+                            "filesize": path.stat().st_size, "protocol": "http"})
+        return {"id": video_id, "title": f"Bench video {video_id}", "duration": self.seconds,
+                "uploader": "Benchmark", "formats": formats}
+
+    def playlist_json(self, count):
+        return {"id": f"pl{count}", "title": f"Bench playlist {count}",
+                "entries": [{"id": f"e{i}", "title": f"Bench video e{i}",
+                             "url": f"{self.base_url}/bench/video/e{i}"} for i in range(1, count + 1)]}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self.do_GET(head=True)
+
+            def do_GET(self, head=False):
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+
+                match = re.fullmatch(r"/api/(video|playlist)/(\w+)", self.path)
+                if match:
+                    kind, value = match.groups()
+                    data = server.video_json(value) if kind == "video" else server.playlist_json(int(value))
+                    body = json.dumps(data).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    if not head:
+                        self.wfile.write(body)
+                    return
+
+                match = re.fullmatch(r"/media/([\w.]+)", self.path)
+                path = server.media_dir / match.group(1) if match else None
+                if not path or not path.is_file():
+                    self.send_error(404)
+                    return
+                self._send_file(path, head)
+
+            def _send_file(self, path, head):
+                size = path.stat().st_size
+                start, end = 0, size - 1
+                range_header = self.headers.get("Range")
+                if range_header:
+                    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+                    if match:
+                        start = int(match.group(1) or 0)
+                        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+                    if not match or start >= size:
+                        self.send_error(416)
+                        return
+                self.send_response(206 if range_header else 200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Length", str(end - start + 1))
+                if range_header:
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                self.end_headers()
+                if head:
+                    return
+
+                chunk_size = 64 * 1024
+                remaining = end - start + 1
+                started = time.perf_counter()
+                sent = 0
+                with open(path, "rb") as f:
+                    f.seek(start)
+                    while remaining > 0:
+                        chunk = f.read(min(chunk_size, remaining))
+                        try:
+                            self.wfile.write(chunk)
+                        except (BrokenPipeError, ConnectionResetError):
+                            break
+                        sent += len(chunk)
+                        remaining -= len(chunk)
+                        # Count as we go: the client may finish before the throttle sleep below
+                        server._count(len(chunk))
+                        if server.bandwidth:
+                            # Sleep until this connection is back under its byte budget
+                            ahead = sent / server.bandwidth - (time.perf_counter() - started)
+                            if ahead > 0:
+                                time.sleep(ahead)
+
+        return Handler
+
+
+def register_extractor():
+    """Make yt-dlp route MediaServer URLs to BenchIE, ahead of every other extractor"""
+    from yt_dlp.extractor import import_extractors
+    from yt_dlp.extractor.common import InfoExtractor
+    from yt_dlp.globals import extractors
+
+    class BenchIE(InfoExtractor):
+        IE_NAME = "bench"
+        _VALID_URL = r"(?P<base>http://127\.0\.0\.1:\d+)/bench/(?P<kind>video|playlist)/(?P<id>\w+)"
+
+        def _real_extract(self, url):
+            base, kind, item_id = self._match_valid_url(url).group("base", "kind", "id")
+            data = self._download_json(f"{base}/api/{kind}/{item_id}", item_id)
+            if kind == "playlist":
+                entries = [self.url_result(entry["url"], BenchIE, entry["id"], entry["title"])
+                           for entry in data["entries"]]
+                return self.playlist_result(entries, data["id"], data["title"])
+            return data
+
+    import_extractors()
+    extractors.value = {"BenchIE": BenchIE, **extractors.value}
+    return BenchIE
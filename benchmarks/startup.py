@@ -0,0 +1,141 @@
+"""Startup benchmark for Downloader.py: how long until the main menu is shown.
+
+Usage:
+    python benchmarks/startup.py [--runs N] [--max-ms MS] [--json]
+
+Every run starts a fresh interpreter so nothing is cached between runs.
+A final run under `python -X importtime` lists the slowest imports.
+Exit status is 1 when --max-ms is given and the median time-to-menu is
+above it, or when yt-dlp gets imported before the menu is shown.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SOURCE_DIR = Path(__file__).resolve().parent.parent / "Source"
+
+# Imports Downloader.py and draws the menu the way main() does, then
+# reports the in-process time and whether yt-dlp was pulled in
+MENU_SNIPPET = r"""
+import io, json, sys, time, contextlib
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import Downloader
+config = Downloader.load_config()
+with contextlib.redirect_stdout(io.StringIO()):
+    Downloader.print_banner()
+    Downloader.print_menu()
+elapsed = time.perf_counter() - started
+print(json.dumps({"ms": elapsed * 1000, "yt_dlp_loaded": "yt_dlp" in sys.modules}))
+"""
+
+YT_DLP_SNIPPET = r"""
+import json, time
+started = time.perf_counter()
+import yt_dlp
+print(json.dumps({"ms": (time.perf_counter() - started) * 1000}))
+"""
+
+
+def run_snippet(snippet, *args, python_flags=()):
+    """Run a snippet in a fresh interpreter; returns (wall ms, parsed stdout, stderr)"""
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, *python_flags, "-c", snippet, *args],
+                            capture_output=True, text=True, cwd=SOURCE_DIR)
+    wall_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    return wall_ms, json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def parse_importtime(stderr, top=15):
+    """Parse `-X importtime` output into the slowest imports by cumulative time"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|", 2)
+        # Nested imports are indented after the single separating space
+        name = name[1:]
+        rows.append({"module": name, "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+    # Only top-level entries (no indentation) add up to the total
+    total_us = sum(row["cumulative_us"] for row in rows if not row["module"].startswith(" "))
+    rows.sort(key=lambda row: row["cumulative_us"], reverse=True)
+    for row in rows:
+        row["module"] = row["module"].strip()
+    return total_us, rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Downloader.py time-to-menu")
+    parser.add_argument("--runs", type=int, default=10, help="number of fresh interpreter runs")
+    parser.add_argument("--max-ms", type=float, help="fail if the median in-process time exceeds this")
+    parser.add_argument("--json", action="store_true", help="print a JSON report instead of a table")
+    args = parser.parse_args()
+
+    wall_times = []
+    menu_times = []
+    yt_dlp_loaded = False
+    for _ in range(args.runs):
+        wall_ms, result, _ = run_snippet(MENU_SNIPPET, str(SOURCE_DIR))
+        wall_times.append(wall_ms)
+        menu_times.append(result["ms"])
+        yt_dlp_loaded = yt_dlp_loaded or result["yt_dlp_loaded"]
+
+    _, _, importtime = run_snippet(MENU_SNIPPET, str(SOURCE_DIR), python_flags=("-X", "importtime"))
+    import_total_us, slowest = parse_importtime(importtime)
+
+    try:
+        yt_dlp_ms = statistics.median(run_snippet(YT_DLP_SNIPPET)[1]["ms"] for _ in range(3))
+    except RuntimeError:
+        yt_dlp_ms = None
+
+    report = {
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "runs": args.runs,
+        "time_to_menu_ms": {
+            "median": statistics.median(menu_times),
+            "min": min(menu_times),
+            "max": max(menu_times),
+        },
+        "process_wall_ms_median": statistics.median(wall_times),
+        "import_total_ms": import_total_us / 1000,
+        "yt_dlp_loaded_before_menu": yt_dlp_loaded,
+        "yt_dlp_import_ms": yt_dlp_ms,
+        "slowest_imports": slowest,
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print("═" * 60)
+        print("            ⏱️  STARTUP BENCHMARK")
+        print("═" * 60)
+        print(f"Python {report['python']} on {report['platform']}, {args.runs} runs")
+        print(f"Time to menu (in process): median {report['time_to_menu_ms']['median']:.1f} ms "
+              f"(min {report['time_to_menu_ms']['min']:.1f}, max {report['time_to_menu_ms']['max']:.1f})")
+        print(f"Process wall time:         median {report['process_wall_ms_median']:.1f} ms")
+        print(f"yt-dlp loaded before menu: {'YES ❌' if yt_dlp_loaded else 'no ✅'}")
+        if yt_dlp_ms is not None:
+            print(f"yt-dlp import (deferred):  {yt_dlp_ms:.1f} ms")
+        print("-" * 60)
+        print(f"{'Cumulative':>12} {'Self':>10}  Module (from -X importtime)")
+        for row in slowest:
+            print(f"{row['cumulative_us'] / 1000:>10.1f}ms {row['self_us'] / 1000:>8.1f}ms  {row['module']}")
+        print("═" * 60)
+
+    failed = yt_dlp_loaded
+    if args.max_ms is not None and report["time_to_menu_ms"]["median"] > args.max_ms:
+        print(f"❌ Median time to menu {report['time_to_menu_ms']['median']:.1f} ms exceeds {args.max_ms} ms",
+              file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
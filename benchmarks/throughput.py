@@ -0,0 +1,222 @@
+"""Offline throughput benchmark for Downloader.py.
+
+Runs the real download paths (video, MP3, custom format) against the
+local MediaServer and BenchIE from harness.py, across concurrency levels
+and playlist sizes, and reports MB/s, per-item latency, CPU time and
+peak RSS. Each scenario runs in its own interpreter so CPU and memory
+figures are not shared between scenarios.
+
+Usage:
+    python benchmarks/throughput.py [--modes video,mp3,custom]
+        [--concurrency 1,4] [--items 1,8] [--connections 4] [--chunk-mb 1]
+        [--latency-ms 20] [--bandwidth-mbps 0] [--media-seconds 10] [--json]
+
+--items 1 downloads a single video; larger values download a playlist
+of that many videos. --connections sets the connections per file used
+for segmented downloads (1 = a single connection). Modes needing FFmpeg are skipped when it is missing.
+"""
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR))
+
+import harness  # noqa: E402
+
+MODES = {"video": ("1", None), "mp3": ("2", None), "custom": ("3", "bench-progressive")}
+# Video mode merges separate video/audio streams and MP3 mode transcodes
+FFMPEG_MODES = {"video", "mp3"}
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def usage():
+    """CPU seconds and peak RSS (MiB) for this process and its children"""
+    if resource is None:
+        return None, None, None
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    cpu = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+    return cpu, own.ru_maxrss / scale, children.ru_maxrss / scale
+
+
+def run_scenario(scenario):
+    """Child process: run one scenario and return its measurements"""
+    sys.path.insert(0, str(harness.SOURCE_DIR))
+    import Downloader
+
+    work_dir = Path(scenario["work_dir"])
+    # Keep the user's history and cache untouched
+    Downloader.HISTORY_FILE = work_dir / "history.jsonl"
+    Downloader.HISTORY_LOCK_FILE = work_dir / "history.lock"
+    Downloader.LEGACY_HISTORY_FILE = work_dir / "history.json"
+    Downloader.METADATA_CACHE_FILE = work_dir / "metadata_cache.json"
+    Downloader.METRICS_FILE = work_dir / "metrics.jsonl"
+    Downloader.ARCHIVE_FILE = work_dir / "archive.sqlite3"
+    Downloader.JOBS_FILE = work_dir / "jobs.sqlite3"
+    harness.register_extractor()
+
+    # Item time runs from the start of the download to the end of its FFmpeg stage
+    item_times = []
+    run_download = Downloader.run_download
+    finish_download = Downloader.finish_download
+
+    def timed_run_download(job, *args, **kwargs):
+        job.bench_started = time.perf_counter()
+        ok = run_download(job, *args, **kwargs)
+        if not ok and not job.is_playlist:
+            item_times.append(time.perf_counter() - job.bench_started)
+        return ok
+
+    def timed_finish_download(job):
+        try:
+            return finish_download(job)
+        finally:
+            item_times.append(time.perf_counter() - job.bench_started)
+
+    Downloader.run_download = timed_run_download
+    Downloader.finish_download = timed_finish_download
+
+    download_dir = work_dir / "Downloads"
+    config = dict(Downloader.DEFAULT_CONFIG, quiet_mode=True, metadata_cache=False, auto_retry=False,
+                  download_connections=scenario["connections"], chunk_size_mb=scenario["chunk_mb"],
+                  download_dir=str(download_dir))
+    mode, fmt = MODES[scenario["mode"]]
+
+    with harness.MediaServer(scenario["media_dir"], latency=scenario["latency"],
+                             bandwidth=scenario["bandwidth"]) as server:
+        items = scenario["items"]
+        url = server.video_url() if items == 1 else server.playlist_url(items)
+        cpu_before = usage()[0]
+        started = time.perf_counter()
+
+        queue = Downloader.DownloadQueue(scenario["concurrency"])
+        job = Downloader.DownloadJob(url, mode, config, download_dir=download_dir, fmt=fmt)
+        queue.submit(job)
+        queue.shutdown()
+
+        wall = time.perf_counter() - started
+        cpu_after, rss, child_rss = usage()
+        served = server.bytes_sent
+        requests = server.requests
+
+    written = sum(path.stat().st_size for path in download_dir.rglob("*") if path.is_file())
+    phases = {}
+    if Downloader.METRICS_FILE.exists():
+        for line in Downloader.METRICS_FILE.read_text(encoding="utf-8").splitlines():
+            for phase, seconds in json.loads(line)["phases"].items():
+                phases[phase] = round(phases.get(phase, 0.0) + seconds, 3)
+    return {
+        "status": job.status.lower(),
+        "error": job.error,
+        "wall_s": wall,
+        "served_mb": served / 1e6,
+        "written_mb": written / 1e6,
+        "mb_per_s": served / 1e6 / wall if wall else 0,
+        "item_p50_s": statistics.median(item_times) if item_times else None,
+        "item_max_s": max(item_times) if item_times else None,
+        "cpu_s": cpu_after - cpu_before if cpu_after is not None else None,
+        "peak_rss_mb": rss,
+        "ffmpeg_peak_rss_mb": child_rss,
+        "http_requests": requests,
+        "phase_s": phases,
+    }
+
+
+def spawn_scenario(scenario):
+    result = subprocess.run([sys.executable, __file__, "--run-scenario", json.dumps(scenario)],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"status": "crashed", "error": result.stderr.strip().splitlines()[-1:]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def parse_list(value, cast=str):
+    return [cast(item) for item in value.split(",") if item]
+
+
+def print_table(results):
+    print("═" * 109)
+    print("                                    📈 DOWNLOAD THROUGHPUT BENCHMARK")
+    print("═" * 109)
+    print(f"{'Mode':<8} {'Jobs':>4} {'Items':>5} {'Conn':>4} {'Status':<8} {'Wall s':>7} {'MB':>8} {'MB/s':>8} "
+          f"{'Item p50':>9} {'Item max':>9} {'CPU s':>7} {'RSS MB':>7} {'Reqs':>5}")
+    print("-" * 109)
+
+    def fmt(value, spec):
+        if isinstance(value, (int, float)):
+            return format(value, spec)
+        return "-".rjust(int(re.match(r"\d+", spec).group()))
+
+    for scenario, result in results:
+        print(f"{scenario['mode']:<8} {scenario['concurrency']:>4} {scenario['items']:>5} {scenario['connections']:>4} "
+              f"{result['status']:<8} {fmt(result.get('wall_s'), '7.2f')} {fmt(result.get('served_mb'), '8.1f')} "
+              f"{fmt(result.get('mb_per_s'), '8.1f')} {fmt(result.get('item_p50_s'), '9.2f')} "
+              f"{fmt(result.get('item_max_s'), '9.2f')} {fmt(result.get('cpu_s'), '7.2f')} "
+              f"{fmt(result.get('peak_rss_mb'), '7.1f')} {fmt(result.get('http_requests'), '5d')}")
+        if result.get("error"):
+            print(f"         ↳ {result['error']}")
+    print("═" * 109)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline Downloader.py throughput benchmark")
+    parser.add_argument("--modes", default="video,mp3,custom", help="comma separated: video, mp3, custom")
+    parser.add_argument("--concurrency", default="1,4", help="comma separated worker counts")
+    parser.add_argument("--items", default="1,8", help="comma separated item counts (1 = single video)")
+    parser.add_argument("--connections", default="4", help="comma separated connections per file")
+    parser.add_argument("--chunk-mb", type=float, default=1, help="segment size for multi-connection downloads")
+    parser.add_argument("--latency-ms", type=float, default=20, help="server latency per request")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0,
+                        help="per-connection bandwidth cap in megabits/s (0 = unlimited)")
+    parser.add_argument("--media-seconds", type=int, default=10, help="length of the synthetic media")
+    parser.add_argument("--json", action="store_true", help="print JSON results instead of a table")
+    parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        print(json.dumps(run_scenario(json.loads(args.run_scenario))))
+        return 0
+
+    ffmpeg = harness.find_ffmpeg()
+    results = []
+    with tempfile.TemporaryDirectory(prefix="ytdl-bench-") as temp_dir:
+        media_dir = harness.generate_media(Path(temp_dir) / "media", args.media_seconds, ffmpeg)
+        for mode in parse_list(args.modes):
+            for concurrency in parse_list(args.concurrency, int):
+                for items in parse_list(args.items, int):
+                    for connections in parse_list(args.connections, int):
+                        scenario = {
+                            "mode": mode, "concurrency": concurrency, "items": items,
+                            "connections": connections, "chunk_mb": args.chunk_mb,
+                            "media_dir": str(media_dir), "latency": args.latency_ms / 1000,
+                            "bandwidth": args.bandwidth_mbps * 1e6 / 8,
+                        }
+                        if mode in FFMPEG_MODES and not ffmpeg:
+                            results.append((scenario, {"status": "skipped", "error": "FFmpeg not found"}))
+                            continue
+                        with tempfile.TemporaryDirectory(dir=temp_dir) as work_dir:
+                            scenario["work_dir"] = work_dir
+                            results.append((scenario, spawn_scenario(scenario)))
+
+    if args.json:
+        print(json.dumps([dict(scenario, **result) for scenario, result in results], indent=2))
+    else:
+        print_table(results)
+    return 0 if all(result["status"] in ("success", "skipped") for _, result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""Shared fixtures for the test suite.
+
+Source/ and benchmarks/ are put on sys.path so the modules import the same
+way they do when run as scripts. Downloads go to benchmarks/harness.py's
+local media server, so no test touches the network.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "Source"))
+sys.path.insert(0, str(ROOT_DIR / "benchmarks"))
+
+import harness  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def media_dir(tmp_path_factory):
+    """Random-byte media files: enough for transfer tests, no FFmpeg needed"""
+    return harness.generate_media(tmp_path_factory.mktemp("media"), seconds=2)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def bench_extractor():
+    """Registered before any test builds a YoutubeDL, since pooled instances outlive tests"""
+    return harness.register_extractor()
+
+
+@pytest.fixture
+def media_server(media_dir, bench_extractor):
+    with harness.MediaServer(media_dir) as server:
+        yield server
+
+
+@pytest.fixture
+def downloader(tmp_path, monkeypatch):
+    """The Downloader module with its history, cache, archive and job files in tmp_path"""
+    import Downloader
+
+    for name in ("HISTORY_FILE", "HISTORY_LOCK_FILE", "LEGACY_HISTORY_FILE", "METADATA_CACHE_FILE",
+                 "METRICS_FILE", "ARCHIVE_FILE", "JOBS_FILE"):
+        monkeypatch.setattr(Downloader, name, tmp_path / getattr(Downloader, name).name)
+    for name in ("_metadata_cache", "_download_archive", "_job_store"):
+        monkeypatch.setattr(Downloader, name, None)
+    return Downloader
+
+
+@pytest.fixture
+def config(downloader, tmp_path):
+    """Default config with quiet output, no metadata cache and downloads in tmp_path"""
+    return dict(downloader.DEFAULT_CONFIG, quiet_mode=True, metadata_cache=False,
+                download_dir=str(tmp_path / "Downloads"))
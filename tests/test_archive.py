@@ -0,0 +1,86 @@
+from pathlib import Path
+
+import pytest
+
+
+def touch(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"media")
+    return path
+
+
+@pytest.fixture
+def playlist_on_disk(downloader, config, media_server):
+    """Two entries of a playlist saved the way the app names them, plus its history line"""
+    folder = Path(config['download_dir']) / "Bench playlist 3"
+    touch(folder / "Bench video e1.mp4")
+    touch(folder / "Bench video e3.mp4")
+    touch(folder / "Bench video e2.mp3")  # other mode
+    url = media_server.playlist_url(3)
+    downloader.log_download(url, "Playlist: Bench playlist 3 (Video)", "1", "Success", config)
+    return url
+
+
+def test_archive_add_lookup_and_entries(downloader, tmp_path):
+    archive = downloader.DownloadArchive(tmp_path / "archive.sqlite3")
+    assert archive.created
+    archive.add("youtube abc", "1", "/x/a.mp4", "A")
+    archive.add("youtube abc", "2")
+    assert archive.lookup("youtube abc", "1") == "/x/a.mp4"
+    assert archive.lookup("youtube abc", "2") == ""
+    assert archive.lookup("youtube abc", "3") is None
+    assert archive.entries("1") == {"youtube abc": "/x/a.mp4"}
+    assert archive.count() == 2
+    assert not downloader.DownloadArchive(tmp_path / "archive.sqlite3").created
+
+
+def test_archive_id_and_mode(downloader):
+    assert downloader.archive_id({'extractor_key': 'Youtube', 'id': 'abc'}) == "youtube abc"
+    assert downloader.archive_id({'ie_key': 'Youtube', 'id': 'abc'}) == "youtube abc"
+    assert downloader.archive_id({'id': 'abc'}) is None
+    job = downloader.DownloadJob("https://youtu.be/x", "3", {}, fmt="137+140")
+    assert downloader.archive_mode(job) == "3:137+140"
+    job.format_sort = ["res:720", "vcodec:h264"]
+    assert downloader.archive_mode(job) == "3:137+140 -S res:720,vcodec:h264"
+
+
+def test_first_use_seeding_stays_local(downloader, config, playlist_on_disk, monkeypatch):
+    touch(Path(config['download_dir']) / "Old download [dQw4w9WgXcQ].mp3")
+
+    extracted = []
+    monkeypatch.setattr(downloader, "extract_url_info", lambda url, config: extracted.append(url))
+    archive = downloader.get_download_archive(config)
+    assert set(archive.entries("2")) == {"youtube dQw4w9WgXcQ"}
+    assert archive.entries("1") == {}
+    assert extracted == []
+
+
+def test_import_archive_matches_playlist_files_by_title(downloader, config, playlist_on_disk):
+    archive = downloader.get_download_archive(config)
+    assert downloader.import_download_archive(archive, config, playlists=True) == 2
+    entries = archive.entries("1")
+    assert set(entries) == {"bench e1", "bench e3"}
+    assert entries["bench e1"].endswith("Bench video e1.mp4")
+
+
+def test_import_archive_skips_unreachable_playlists(downloader, config, capsys):
+    downloader.log_download("http://127.0.0.1:9/bench/playlist/2", "Playlist: Gone (Video)", "1", "Success", config)
+    archive = downloader.get_download_archive(config)
+    assert downloader.import_download_archive(archive, config, playlists=True) == 0
+    assert "Skipped playlist" in capsys.readouterr().err
+
+
+def test_archive_checker_uses_archive_and_title_fallback(downloader, config, tmp_path):
+    archive = downloader.get_download_archive(config)
+    kept = touch(tmp_path / "kept.mp4")
+    archive.add("bench e1", "1", str(kept))
+    archive.add("bench e2", "1", str(tmp_path / "deleted.mp4"))
+    job = downloader.DownloadJob("http://x/pl", "1", config, download_dir=config['download_dir'])
+    touch(Path(config['download_dir']) / "Playlist" / "Title three.mp4")
+    is_archived = downloader.archive_checker(job, "Playlist")
+
+    assert is_archived({'ie_key': 'Bench', 'id': 'e1'})
+    assert not is_archived({'ie_key': 'Bench', 'id': 'e2'})  # file was deleted
+    assert is_archived({'ie_key': 'Bench', 'id': 'e3', 'title': "Title three"})
+    assert archive.lookup("bench e3", "1").endswith("Title three.mp4")
+    assert not is_archived({'ie_key': 'Bench', 'id': 'e4', 'title': "Missing"})
@@ -0,0 +1,58 @@
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+
+def job(priority=None, parent=None):
+    return SimpleNamespace(priority=priority, parent=parent)
+
+
+@pytest.fixture
+def scheduler(downloader):
+    def make(mbps):
+        scheduler = downloader.BandwidthScheduler()
+        scheduler.configure({"bandwidth_limit_mbps": mbps})
+        return scheduler
+    return make
+
+
+def test_shares_follow_priority_weights(scheduler):
+    bandwidth = scheduler(8)  # 1 MB/s
+    high = bandwidth.register(job("high"))
+    low = bandwidth.register(job(parent=job()))
+    assert high.share() == pytest.approx(1e6 * 8 / 9)
+    assert low.share() == pytest.approx(1e6 / 9)
+    with high:
+        pass
+    assert low.share() == pytest.approx(1e6)
+
+
+def test_unlimited_consumer_never_waits(scheduler):
+    consumer = scheduler(0).register(job())
+    started = time.monotonic()
+    consumer.consume(100 * 1024 * 1024)
+    assert time.monotonic() - started < 0.1
+
+
+def test_consume_holds_the_rate(scheduler):
+    consumer = scheduler(8).register(job())
+    started = time.monotonic()
+    for _ in range(10):
+        consumer.consume(50_000)
+    assert 0.4 < time.monotonic() - started < 1.5
+
+
+@pytest.mark.parametrize("clock, mbps", [("12:00", 5), ("23:30", 50), ("03:00", 50), ("08:00", 5)])
+def test_schedule_windows_may_wrap_midnight(downloader, clock, mbps):
+    config = {"bandwidth_limit_mbps": 5, "bandwidth_schedule": [{"from": "23:00", "to": "07:00", "mbps": 50}]}
+    now = datetime.strptime(f"2026-01-01 {clock}", "%Y-%m-%d %H:%M")
+    assert downloader.scheduled_mbps(config, now) == mbps
+
+
+def test_job_priority(downloader):
+    assert downloader.job_priority(job()) == "normal"
+    assert downloader.job_priority(job(parent=job())) == "low"
+    assert downloader.job_priority(job(parent=job("high"))) == "high"
+    assert downloader.job_priority(job("low")) == "low"
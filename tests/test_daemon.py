@@ -0,0 +1,123 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+import daemon
+
+
+@pytest.fixture
+def service(downloader, config, monkeypatch):
+    """A DownloadDaemon on a free port, served from a background event loop"""
+    monkeypatch.setattr(downloader, "is_youtube_url", lambda url: "youtu" in url or "/bench/" in url)
+    monkeypatch.setattr(daemon, "warm_up", lambda: None)
+    service = daemon.DownloadDaemon(config, "127.0.0.1", 0, 2)
+    running = {}
+
+    async def serve():
+        running["loop"], running["task"] = asyncio.get_running_loop(), asyncio.current_task()
+        await service.serve()
+
+    def run():
+        # asyncio.run() cancels leftover handler tasks, as in daemon.main()
+        try:
+            asyncio.run(serve())
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    for _ in range(100):
+        if service.server and service.server.sockets:
+            break
+        time.sleep(0.05)
+    service.base_url = f"http://127.0.0.1:{service.server.sockets[0].getsockname()[1]}"
+    yield service
+    running["loop"].call_soon_threadsafe(running["task"].cancel)
+    thread.join(30)
+
+
+def call(service, method, path, body=None, timeout=5):
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(service.base_url + path, method=method, data=data)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.mark.parametrize("body, error", [
+    ({}, "Give 'url'"),
+    ({"urls": [1]}, "Give 'url'"),
+    ({"url": "https://youtu.be/x", "priority": "urgent"}, "Unknown priority"),
+    ({"url": "https://youtu.be/x", "sync": "sometimes"}, "'sync' must be"),
+    ({"url": "https://youtu.be/x", "prefer": "4k"}, ""),
+])
+def test_enqueue_rejects_bad_requests(service, body, error):
+    status, payload = call(service, "POST", "/jobs", body)
+    assert status == 400
+    assert error in payload["error"]
+
+
+def test_unknown_endpoint_and_job(service):
+    assert call(service, "GET", "/nope")[0] == 404
+    assert call(service, "GET", "/jobs/99")[0] == 404
+    assert call(service, "PUT", "/jobs")[0] == 405
+
+
+def test_non_youtube_url_is_rejected_as_a_job(service):
+    status, payload = call(service, "POST", "/jobs", {"url": "https://example.com/video"})
+    assert status == 201
+    [job] = payload["jobs"]
+    assert (job["status"], job["finished"]) == ("rejected", True)
+
+
+def test_locked_job_store_does_not_stall_other_requests(service, monkeypatch):
+    release = threading.Event()
+    add = service.queue.store.add
+
+    def blocked_add(job):
+        release.wait(10)
+        return add(job)
+
+    monkeypatch.setattr(service.queue.store, "add", blocked_add)
+    posted = {}
+    poster = threading.Thread(target=lambda: posted.update(result=call(
+        service, "POST", "/jobs", {"url": "http://127.0.0.1:9/bench/video/x"}, timeout=15)))
+    poster.start()
+    try:
+        time.sleep(0.3)
+        started = time.perf_counter()
+        status, health = call(service, "GET", "/health", timeout=2)
+        assert status == 200 and health["status"] == "ok"
+        assert time.perf_counter() - started < 1
+    finally:
+        release.set()
+        poster.join(15)
+    assert posted["result"][0] == 201
+
+
+def test_playlist_job_streams_resolving_then_finishes(service, media_server):
+    # Longer than one event interval, so the resolving state is published
+    media_server.latency = 3 * daemon.EVENT_INTERVAL
+    with socket.create_connection(service.server.sockets[0].getsockname()[:2], timeout=10) as events:
+        events.sendall(b"GET /events HTTP/1.1\r\nHost: test\r\n\r\n")
+        status, payload = call(service, "POST", "/jobs", {"url": media_server.playlist_url(2),
+                                                          "mode": "bench-progressive"})
+        assert status == 201
+        job_id = payload["jobs"][0]["id"]
+        received = b""
+        deadline = time.time() + 30
+        statuses = []
+        while time.time() < deadline and "success" not in statuses and "failed" not in statuses:
+            received += events.recv(65536)
+            statuses = [json.loads(line[6:])["status"] for line in received.decode().splitlines()
+                        if line.startswith("data: ") and json.loads(line[6:])["id"] == job_id]
+    assert "resolving" in statuses
+    assert statuses[-1] == "success"
@@ -0,0 +1,41 @@
+import pytest
+
+
+@pytest.fixture
+def info(media_server):
+    return dict(media_server.video_json("v1"), extractor="Bench", extractor_key="Bench",
+                webpage_url=media_server.video_url("v1"))
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("", ("bv*+ba/b", [])),
+    ("best", ("bv*+ba/b", [])),
+    ("≤1080p, avc1, smallest", ("bv*+ba/b", ["res:1080", "vcodec:h264", "+size"])),
+    ("<= 720p , 60fps", ("bv*+ba/b", ["res:720", "fps:60"])),
+    ("AUDIO, Opus", ("ba/b", ["acodec:opus"])),
+])
+def test_parse_format_preference(downloader, text, expected):
+    assert downloader.parse_format_preference(text) == expected
+
+
+def test_unknown_preference_is_rejected(downloader):
+    with pytest.raises(ValueError, match="'8k'"):
+        downloader.parse_format_preference("1080p, 8k")
+
+
+def test_preference_picks_formats(downloader, info):
+    def pick(text):
+        return [f['format_id'] for f in downloader.select_formats(info, *downloader.parse_format_preference(text))]
+
+    assert pick("best") == ["bench-video", "bench-audio"]
+    assert pick("<=480p") == ["bench-progressive"]
+    assert pick("audio") == ["bench-audio"]
+
+
+def test_format_rows_estimate_missing_sizes(downloader, info):
+    info["formats"][0].pop("filesize")
+    rows = {row['id']: row for row in downloader.format_rows(info)}
+    assert rows["bench-video"]['size'] == 2000 * 1000 / 8 * info["duration"]
+    assert rows["bench-video"]['estimated']
+    assert not rows["bench-audio"]['estimated']
+    assert rows["bench-audio"]['resolution'] == "audio only"
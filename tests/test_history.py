@@ -0,0 +1,27 @@
+import json
+
+
+def test_history_is_compacted_to_the_limit(downloader):
+    config = {"history_limit": 5}
+    for i in range(30):
+        downloader.log_download(f"https://youtu.be/{i:011d}", f"video {i}.mp4", "1", config=config)
+        lines = downloader.HISTORY_FILE.read_text(encoding="utf-8").splitlines()
+        assert len(lines) <= downloader.HISTORY_COMPACT_FACTOR * 5 + 1
+    entries = downloader.read_history_tail(5)
+    assert [entry["filename"] for entry in entries] == [f"video {i}.mp4" for i in range(25, 30)]
+
+
+def test_read_history_tail_skips_torn_lines(downloader):
+    entry = {"timestamp": "2026-01-01 00:00:00", "url": "u", "filename": "f", "mode": "Video",
+             "status": "Success"}
+    downloader.HISTORY_FILE.write_text(json.dumps(entry) + "\n" + '{"timestamp": "2026' + "\n",
+                                       encoding="utf-8")
+    assert downloader.read_history_tail(10) == [entry]
+
+
+def test_legacy_history_is_migrated(downloader):
+    entry = {"timestamp": "2026-01-01 00:00:00", "url": "u", "filename": "f", "mode": "MP3",
+             "status": "Success"}
+    downloader.LEGACY_HISTORY_FILE.write_text(json.dumps([entry]), encoding="utf-8")
+    assert downloader.read_history_tail(10) == [entry]
+    assert not downloader.LEGACY_HISTORY_FILE.exists()
@@ -0,0 +1,90 @@
+import subprocess
+import sys
+
+import pytest
+
+
+@pytest.fixture
+def store(downloader, tmp_path):
+    return downloader.JobStore(tmp_path / "jobs.sqlite3")
+
+
+@pytest.fixture
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def crash(store, job, pid):
+    """Make a job look owned by a process that died"""
+    with store._db:
+        store._db.execute("UPDATE jobs SET pid = ? WHERE id = ?", (pid, job.store_id))
+
+
+def row(store, job):
+    return store._db.execute("SELECT status, error, finished_at FROM jobs WHERE id = ?",
+                             (job.store_id,)).fetchone()
+
+
+def make_job(downloader, tmp_path, url="https://youtu.be/dQw4w9WgXcQ"):
+    job = downloader.DownloadJob(url, "3", {}, download_dir=tmp_path / "out", fmt="18")
+    job.format_sort = ["res:720"]
+    job.priority = "high"
+    job.sync_mode = "incremental"
+    return job
+
+
+def test_interrupted_rebuilds_jobs_of_dead_processes(downloader, store, tmp_path, dead_pid):
+    job = make_job(downloader, tmp_path)
+    store.add(job)
+    store.set_running(job)
+    store.entry_done(job, "e1")
+    store.entry_done(job, "e1")
+    crash(store, job, dead_pid)
+
+    [resumed] = store.interrupted({})
+    assert (resumed.store_id, resumed.url, resumed.mode, resumed.fmt) == (job.store_id, job.url, "3", "18")
+    assert resumed.download_dir == tmp_path / "out"
+    assert resumed.format_sort == ["res:720"]
+    assert (resumed.priority, resumed.sync_mode) == ("high", "incremental")
+    assert resumed.done_entries == {"e1"}
+    # Claimed: a second look finds nothing
+    assert store.interrupted({}) == []
+
+
+def test_interrupted_skips_finished_live_and_foreign_jobs(downloader, store, tmp_path, dead_pid):
+    finished, live, foreign = (make_job(downloader, tmp_path) for _ in range(3))
+    for job in (finished, live, foreign):
+        store.add(job)
+        store.set_running(job)
+    finished.status = "Success"
+    store.finish(finished)
+    crash(store, finished, dead_pid)
+    crash(store, foreign, dead_pid)
+    with store._db:
+        store._db.execute("UPDATE jobs SET host = 'elsewhere' WHERE id = ?", (foreign.store_id,))
+    assert store.interrupted({}) == []
+    assert row(store, finished)[0] == "success"
+
+
+def test_retried_job_that_crashes_is_resumed(downloader, store, tmp_path, dead_pid):
+    job = make_job(downloader, tmp_path)
+    store.add(job)
+    store.set_running(job)
+    job.status, job.error = "Failed", "HTTP Error 403"
+    store.finish(job)
+
+    # offer_retry() runs the same job, and so the same row, again
+    store.set_running(job)
+    assert row(store, job) == ("running", None, None)
+    crash(store, job, dead_pid)
+    assert [resumed.store_id for resumed in store.interrupted({})] == [job.store_id]
+
+
+def test_finish_records_unfinished_status_as_failed(downloader, store, tmp_path):
+    job = make_job(downloader, tmp_path)
+    store.add(job)
+    job.status = "Downloading"
+    store.finish(job, "failed")
+    assert row(store, job)[0] == "failed"
@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+
+class FakeQueue:
+    def __init__(self, jobs, store=None):
+        self.jobs = jobs
+        self.store = store
+        self.waited = False
+
+    def unfinished(self):
+        return list(self.jobs)
+
+    def wait(self):
+        self.waited = True
+
+
+@pytest.fixture
+def answers(monkeypatch):
+    given = []
+
+    def answer(*replies):
+        given.extend(replies)
+
+    monkeypatch.setattr("builtins.input", lambda prompt="": given.pop(0))
+    return answer
+
+
+@pytest.fixture
+def running_job(downloader, config):
+    job = downloader.DownloadJob("https://youtu.be/dQw4w9WgXcQ", "1", config)
+    job.url_info = {'type': 'video', 'title': "Some video"}
+    job.status = "Downloading"
+    job.progress = {'downloaded_bytes': 25, 'total_bytes': 100}
+    return job
+
+
+def test_confirm_exit_without_downloads_does_not_ask(downloader):
+    assert downloader.confirm_exit(FakeQueue([]))
+
+
+def test_confirm_exit_lists_what_is_unfinished(downloader, running_job, answers, capsys):
+    playlist = downloader.DownloadJob("https://youtube.com/playlist?list=PL1", "2", running_job.config)
+    playlist.url_info = {'type': 'playlist', 'title': "Mix"}
+    playlist.entries_total = 10
+    playlist.done_entries = {"a", "b", "c"}
+    answers("c")
+    assert downloader.confirm_exit(FakeQueue([running_job, playlist]))
+    out = capsys.readouterr().out
+    assert "Some video (25% downloaded)" in out
+    assert "Mix (3 of 10 entries done)" in out
+    assert "dropped from the queue" in out
+
+
+def test_confirm_exit_mentions_resume_with_job_store(downloader, running_job, answers, capsys):
+    answers("c")
+    assert downloader.confirm_exit(FakeQueue([running_job], store=object()))
+    assert "offered again on the next start" in capsys.readouterr().out
+
+
+def test_confirm_exit_waits_or_goes_back(downloader, running_job, answers):
+    queue = FakeQueue([running_job])
+    answers("x", "b")
+    assert not downloader.confirm_exit(queue)
+    assert not queue.waited
+    answers("w")
+    assert downloader.confirm_exit(queue)
+    assert queue.waited
+
+
+def test_cancel_on_exit_stops_a_running_download(downloader, config, media_server, answers, capsys):
+    media_server.bandwidth = 64 * 1024
+    queue = downloader.DownloadQueue(2)
+    job = downloader.DownloadJob(media_server.video_url("e1"), "3", config, fmt="bench-video",
+                                 download_dir=config['download_dir'])
+    queue.submit(job)
+    for _ in range(100):
+        if job.status == "Downloading":
+            break
+        time.sleep(0.05)
+    assert queue.unfinished() == [job]
+
+    answers("c")
+    assert downloader.confirm_exit(queue)
+    started = time.perf_counter()
+    downloader.stop_queue(queue)
+    assert time.perf_counter() - started < 5
+    assert job.status == "Cancelled"
+    assert queue.unfinished() == []
@@ -0,0 +1,24 @@
+def test_cache_keys_follow_extractor_and_id(downloader):
+    key = downloader.cache_key_for_url
+    assert key("https://www.youtube.com/watch?v=dQw4w9WgXcQ") == "Youtube:dQw4w9WgXcQ"
+    assert key("https://youtu.be/dQw4w9WgXcQ") == "Youtube:dQw4w9WgXcQ"
+    assert key("https://www.youtube.com/@name/videos") != key("https://www.youtube.com/@name/shorts")
+    assert key("https://example.invalid/nothing") == "url:https://example.invalid/nothing"
+
+
+def test_cache_keys_are_memoized(downloader, monkeypatch):
+    from yt_dlp import extractor
+
+    url = "https://www.youtube.com/watch?v=jNQXAC9IVRw"
+    expected = downloader.cache_key_for_url(url)
+    monkeypatch.setattr(extractor, "gen_extractor_classes", lambda: [])
+    assert downloader.cache_key_for_url(url) == expected
+
+
+def test_cached_info_is_shared_by_urls_with_the_same_key(downloader):
+    cache = downloader.MetadataCache(downloader.METADATA_CACHE_FILE)
+    cache.put("https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+              {"id": "dQw4w9WgXcQ", "title": "Some video", "url": "https://signed.invalid/x"})
+    assert cache.get("https://youtu.be/dQw4w9WgXcQ") == {"id": "dQw4w9WgXcQ", "title": "Some video"}
+    assert cache.get("https://youtu.be/jNQXAC9IVRw") is None
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,146 @@
+import os
+import time
+
+import pytest
+from yt_dlp import YoutubeDL
+from yt_dlp.networking.exceptions import RequestError
+from yt_dlp.utils import DownloadError
+
+import segmented
+
+CHUNK_SIZE = 32 * 1024
+
+
+def make_fd(**params):
+    ydl = YoutubeDL({"quiet": True, "noprogress": True, "retries": 0, **params})
+    return segmented.SegmentedHttpFD(ydl, ydl.params)
+
+
+@pytest.fixture
+def media(media_server, media_dir, tmp_path):
+    info = {"url": f"{media_server.base_url}/media/video.mp4", "http_headers": {}}
+    return info, media_dir / "video.mp4", str(tmp_path / "video.mp4")
+
+
+def test_segmented_download_matches_source(media):
+    info, source, target = media
+    assert make_fd(segment_connections=4, segment_chunk_size=CHUNK_SIZE).download(target, info)
+    with open(target, "rb") as f:
+        assert f.read() == source.read_bytes()
+    assert not os.path.exists(target + ".part.segments")
+
+
+@pytest.mark.parametrize("chunks_before_failure", [0, 3])
+def test_single_connection_retry_after_interrupted_segmented_download(media, monkeypatch, chunks_before_failure):
+    info, source, target = media
+    fetch_range = segmented.SegmentedHttpFD._fetch_range
+    calls = []
+
+    def dropping_fetch_range(self, *args):
+        calls.append(args)
+        if len(calls) > chunks_before_failure:
+            raise RequestError("connection dropped")
+        return fetch_range(self, *args)
+
+    monkeypatch.setattr(segmented.SegmentedHttpFD, "_fetch_range", dropping_fetch_range)
+    with pytest.raises((RequestError, DownloadError)):
+        make_fd(segment_connections=2, segment_chunk_size=CHUNK_SIZE).download(target, info)
+    assert os.path.getsize(target + ".part") == source.stat().st_size
+
+    # The retry runs on one connection, which hands over to HttpFD
+    monkeypatch.setattr(segmented.SegmentedHttpFD, "_fetch_range", fetch_range)
+    assert make_fd(segment_connections=1).download(target, info)
+    with open(target, "rb") as f:
+        assert f.read() == source.read_bytes()
+    assert not os.path.exists(target + ".part.segments")
+
+
+def test_interrupted_segmented_download_resumes_finished_chunks(media, monkeypatch):
+    info, source, target = media
+    fetch_range = segmented.SegmentedHttpFD._fetch_range
+    calls = []
+
+    def dropping_fetch_range(self, *args):
+        calls.append(args)
+        if len(calls) > 3:
+            raise RequestError("connection dropped")
+        return fetch_range(self, *args)
+
+    monkeypatch.setattr(segmented.SegmentedHttpFD, "_fetch_range", dropping_fetch_range)
+    with pytest.raises((RequestError, DownloadError)):
+        make_fd(segment_connections=2, segment_chunk_size=CHUNK_SIZE).download(target, info)
+
+    fetched = []
+    monkeypatch.setattr(segmented.SegmentedHttpFD, "_fetch_range",
+                        lambda self, *args: fetched.append(args) or fetch_range(self, *args))
+    assert make_fd(segment_connections=2, segment_chunk_size=CHUNK_SIZE).download(target, info)
+    with open(target, "rb") as f:
+        assert f.read() == source.read_bytes()
+    chunks = -(-source.stat().st_size // CHUNK_SIZE)
+    assert len(fetched) < chunks
+
+
+def test_download_phase_covers_the_whole_transfer(downloader, config, media, media_server):
+    info, source, target = media
+    # The server throttles after every 64 KiB it sends: about 0.5 s per 128 KiB chunk
+    media_server.bandwidth = 256 * 1024
+    job = downloader.DownloadJob(info["url"], "1", config)
+    fd = make_fd(segment_connections=4, segment_chunk_size=4 * CHUNK_SIZE)
+    fd.add_progress_hook(lambda status: downloader.progress_hook(status, job))
+
+    started = time.perf_counter()
+    assert fd.download(target, info)
+    elapsed = time.perf_counter() - started
+    assert job.metrics.phases["download"] > 0.8 * elapsed
+    assert job.metrics.bytes == source.stat().st_size
+
+
+def test_uneven_chunks_are_merged_in_place(media, monkeypatch):
+    info, source, target = media
+    chunk_size = 30_000  # the last chunk is a short one
+    fetch_range = segmented.SegmentedHttpFD._fetch_range
+    spans = []
+
+    def recording_fetch_range(self, url, headers, tmpfilename, span, *args):
+        spans.append(tuple(span))
+        return fetch_range(self, url, headers, tmpfilename, span, *args)
+
+    monkeypatch.setattr(segmented.SegmentedHttpFD, "_fetch_range", recording_fetch_range)
+    assert make_fd(segment_connections=8, segment_chunk_size=chunk_size).download(target, info)
+    with open(target, "rb") as f:
+        assert f.read() == source.read_bytes()
+    size = source.stat().st_size
+    assert sorted(spans) == [(start, min(start + chunk_size, size) - 1) for start in range(0, size, chunk_size)]
+
+
+def test_state_of_another_chunk_layout_is_discarded(media, monkeypatch):
+    info, source, target = media
+    fetch_range = segmented.SegmentedHttpFD._fetch_range
+    calls = []
+
+    def dropping_fetch_range(self, *args):
+        calls.append(args)
+        if len(calls) > 3:
+            raise RequestError("connection dropped")
+        return fetch_range(self, *args)
+
+    monkeypatch.setattr(segmented.SegmentedHttpFD, "_fetch_range", dropping_fetch_range)
+    with pytest.raises((RequestError, DownloadError)):
+        make_fd(segment_connections=2, segment_chunk_size=CHUNK_SIZE).download(target, info)
+
+    fetched = []
+    monkeypatch.setattr(segmented.SegmentedHttpFD, "_fetch_range",
+                        lambda self, *args: fetched.append(args) or fetch_range(self, *args))
+    assert make_fd(segment_connections=2, segment_chunk_size=2 * CHUNK_SIZE).download(target, info)
+    with open(target, "rb") as f:
+        assert f.read() == source.read_bytes()
+    assert len(fetched) == -(-source.stat().st_size // (2 * CHUNK_SIZE))
+
+
+def test_server_without_ranges_gets_one_connection(media, monkeypatch):
+    info, source, target = media
+    monkeypatch.setattr(segmented.SegmentedHttpFD, "_probe_size", lambda self, url, headers: None)
+    monkeypatch.setattr(segmented.SegmentedHttpFD, "_fetch_range", lambda self, *args: pytest.fail("ranged"))
+    assert make_fd(segment_connections=4, segment_chunk_size=CHUNK_SIZE).download(target, info)
+    with open(target, "rb") as f:
+        assert f.read() == source.read_bytes()
@@ -0,0 +1,67 @@
+import pytest
+
+PARAMS = {"quiet": True, "no_warnings": True}
+
+
+@pytest.fixture
+def pool(downloader):
+    pool = downloader.SessionPool()
+    yield pool
+    for session in pool._sessions.values():
+        pool._close_director(session)
+
+
+def test_instances_share_cookies_and_connections(pool):
+    first = pool.acquire(PARAMS)
+    second = pool.acquire(dict(PARAMS, format="bestaudio"))
+    # Fails if yt-dlp renames the attributes an HttpSession hands over
+    assert first is not second
+    assert first.cookiejar is second.cookiejar
+    assert first._request_director is second._request_director
+    pool.release(first)
+    pool.release(second)
+
+
+def test_hooks_and_postprocessors_do_not_carry_over(pool):
+    from yt_dlp.postprocessor import FFmpegMetadataPP
+
+    ydl = pool.acquire(dict(PARAMS, progress_hooks=[print]))
+    ydl.add_post_processor(FFmpegMetadataPP(ydl), when="post_process")
+    ydl.post_process = lambda *args: None
+    pool.release(ydl)
+
+    ydl = pool.acquire(PARAMS)
+    assert ydl._progress_hooks == []
+    assert not any(ydl._pps.values())
+    assert "post_process" not in vars(ydl)
+    pool.release(ydl)
+
+
+def test_release_keeps_the_shared_director_open(pool, media_server):
+    pool.release(pool.acquire(PARAMS))
+    with pool.session(PARAMS) as ydl:
+        assert ydl.urlopen(f"{media_server.base_url}/media/audio.m4a").read()
+
+
+def test_detached_instance_builds_its_own_director(pool):
+    ydl = pool.acquire(PARAMS)
+    shared = ydl._request_director
+    pool.detach(ydl)
+    assert ydl._request_director is not shared
+    with pool.session(PARAMS) as other:
+        assert other._request_director is shared
+    ydl.close()
+
+
+def test_expired_session_is_closed_after_its_last_user(pool, downloader, monkeypatch):
+    ydl = pool.acquire(PARAMS)
+    session = pool._users[ydl]
+    closed = []
+    monkeypatch.setattr(session.director, "close", lambda: closed.append(session))
+    monkeypatch.setattr(downloader, "SESSION_MAX_AGE", 0)
+
+    with pool.session(PARAMS) as other:
+        assert other._request_director is not session.director
+    assert not closed
+    pool.release(ydl)
+    assert closed == [session]
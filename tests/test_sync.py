@@ -0,0 +1,62 @@
+import pytest
+
+PLAYLIST = "youtubetab PLx"
+
+
+def entries(*ids):
+    return [{'ie_key': 'Youtube', 'id': entry_id, 'url': f"https://youtu.be/{entry_id}"} for entry_id in ids]
+
+
+@pytest.fixture
+def archive(downloader, tmp_path):
+    return downloader.DownloadArchive(tmp_path / "archive.sqlite3")
+
+
+def sync(downloader, archive, walk, force_full=False):
+    """Walk `walk` like iter_playlist_jobs does, archiving every entry it reaches"""
+    state = downloader.PlaylistSync(archive, PLAYLIST, {}, "1", force_full=force_full)
+    for entry in walk:
+        if state.see(entry):
+            break
+        archive.add(downloader.archive_id(entry), "1")
+    state.save("Playlist")
+    return state
+
+
+def test_first_sync_walks_everything(downloader, archive):
+    state = sync(downloader, archive, entries("a", "b", "c", "d", "e"))
+    assert state.full
+    assert state.added == ["a", "b", "c", "d", "e"]
+    assert not state.stopped_early
+
+
+def test_newest_first_playlist_stops_at_known_entries(downloader, archive):
+    sync(downloader, archive, entries("c", "d", "e", "f", "g"))
+    # New entries on top: the playlist is learned to be newest-first
+    state = sync(downloader, archive, entries("a", "b", "c", "d", "e", "f", "g"))
+    assert state.added == ["a", "b"]
+    assert state.newest_first
+
+    state = sync(downloader, archive, entries("z", "a", "b", "c", "d", "e", "f", "g"))
+    assert not state.full
+    assert state.stopped_early
+    assert state.added == ["z"]
+    assert list(state.seen) == ["z", "a", "b", "c"]
+    assert "stopped after 4 entries" in state.summary()
+
+
+def test_unarchived_known_entry_keeps_the_walk_going(downloader, archive):
+    sync(downloader, archive, entries("c", "d", "e", "f", "g"))
+    sync(downloader, archive, entries("b", "c", "d", "e", "f", "g"))
+    # "c" was seen but its download never finished
+    archive._db.execute("DELETE FROM downloads WHERE archive_id = 'youtube c'")
+    state = sync(downloader, archive, entries("b", "c", "d", "e", "f", "g"))
+    assert state.stopped_early
+    assert list(state.seen) == ["b", "c", "d", "e", "f"]
+
+
+def test_full_sync_finds_removed_entries(downloader, archive):
+    sync(downloader, archive, entries("a", "b", "c"))
+    state = sync(downloader, archive, entries("a", "c"), force_full=True)
+    assert state.removed == ["b"]
+    assert archive.playlist_state(PLAYLIST)[0] == {"a": 1, "c": 2}
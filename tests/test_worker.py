@@ -0,0 +1,68 @@
+import os
+import time
+
+import pytest
+
+import worker
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return worker.LeaseQueue(tmp_path / "queue", lease_seconds=60)
+
+
+def add(queue, url):
+    item_id = worker.item_id(url, "1", None, None)
+    queue.add({"id": item_id, "url": url, "mode": "1"})
+    return item_id
+
+
+def age(queue, lease, seconds):
+    """Pretend the lease was last touched `seconds` ago"""
+    path = queue.leases / lease.name
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_adding_an_item_twice_is_a_no_op(queue):
+    add(queue, "https://youtu.be/a")
+    assert not queue.add({"id": worker.item_id("https://youtu.be/a", "1", None, None)})
+    assert len(os.listdir(queue.items)) == 1
+
+
+def test_each_item_is_claimed_by_one_host(queue):
+    first = add(queue, "https://youtu.be/a")
+    lease, item = queue.claim("host-a")
+    assert (lease.item_id, lease.generation) == (first, 1)
+    assert item["url"] == "https://youtu.be/a"
+    assert queue.claim("host-b") is None
+    assert queue.status()[0]["running"] == 1
+
+
+def test_expired_lease_moves_to_the_next_generation(queue):
+    add(queue, "https://youtu.be/a")
+    old, _ = queue.claim("host-a")
+    age(queue, old, 120)
+
+    new, _ = queue.claim("host-b")
+    assert new.generation == old.generation + 1
+    assert not (queue.leases / old.name).exists()
+    # The old owner finds out on its next refresh and gives the item up
+    assert not queue.renew(old)
+    assert queue.renew(new)
+
+
+def test_released_item_is_claimed_again(queue):
+    add(queue, "https://youtu.be/a")
+    lease, _ = queue.claim("host-a")
+    queue.release(lease)
+    assert queue.claim("host-b")[0].generation == 1
+
+
+def test_finished_items_are_not_claimed(queue):
+    add(queue, "https://youtu.be/a")
+    lease, _ = queue.claim("host-a")
+    queue.finish(lease, {"id": lease.item_id, "status": "success"})
+    assert queue.claim("host-b") is None
+    assert queue.all_done()
+    assert queue.status()[0] == {"queued": 0, "running": 0, "done": 1, "failed": 0}